@@ -0,0 +1,927 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Medical AI Voice Assistant Backend
+Measures hot-path latency of query processing against synthetic catalogs
+
+Usage:
+    python benchmark_medical_ai.py              # run every benchmark
+    python benchmark_medical_ai.py fuzzy_match  # run selected benchmarks
+    python benchmark_medical_ai.py --memory-worker MODE CATALOG  # used by fork_memory
+"""
+
+import asyncio
+import gc
+import io
+import json
+import logging
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import medical_ai_asgi
+import medical_ai_backend
+from medical_ai_backend import (
+    FuzzyNameIndex, InteractionGraph, KeywordAutomaton, MedicalKnowledgeBase, MedicalQuery,
+    MedicalResponseGenerator, QueryTypeClassifier, SymptomIndex
+)
+from medical_json import BACKEND as JSON_BACKEND, _plain, dumps, dumps_stdlib
+from medical_kb_snapshot import build_snapshot
+from medical_kb_sqlite import build_database
+from medical_llm import CircuitBreaker, LLMClient
+from medical_semantic_cache import SemanticCache
+
+def make_synthetic_names(count, seed=42):
+    """Generate pronounceable, unique brand-like names"""
+    rng = random.Random(seed)
+    consonants = 'bcdfghklmnprstvz'
+    vowels = 'aeiou'
+    names = set()
+    while len(names) < count:
+        syllables = rng.randint(2, 4)
+        names.add(''.join(rng.choice(consonants) + rng.choice(vowels) for _ in range(syllables)) + rng.choice(['', 'n', 'x', 'l']))
+    return sorted(names)
+
+def make_synthetic_catalog(count, seed=42):
+    """Catalog dict with count synthetic medicines modelled on the real entries"""
+    rng = random.Random(seed)
+    with open(medical_ai_backend.KNOWLEDGE_BASE_PATH, encoding='utf-8') as f:
+        catalog = json.load(f)
+    templates = list(catalog['medicines'].values())
+    names = make_synthetic_names(count * 3, seed=seed)
+    catalog['medicines'] = {}
+    for i in range(count):
+        entry = json.loads(json.dumps(rng.choice(templates)))
+        entry['names'] = names[i * 3:i * 3 + 3]
+        catalog['medicines'][entry['names'][0]] = entry
+    return catalog
+
+def make_synthetic_knowledge_base(count, seed=42):
+    """Knowledge base whose catalog is replaced by count synthetic medicines"""
+    kb = MedicalKnowledgeBase()
+    kb.medicines = make_synthetic_catalog(count, seed)['medicines']
+    kb.refresh()
+    return kb
+
+def misspell(word, rng):
+    """Apply a single random edit to a word"""
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+def timed(func, repeat):
+    """Return average seconds per call over repeat runs"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def benchmark_fuzzy_match():
+    """Compare the linear SequenceMatcher scan with the prebuilt name index"""
+    print("\n🔎 Fuzzy medicine name matching")
+    rng = random.Random(7)
+    for size in (100, 1000, 10000):
+        names = make_synthetic_names(size)
+        entries = [(name, name) for name in names]
+        build_start = time.perf_counter()
+        index = FuzzyNameIndex(entries)
+        build_time = time.perf_counter() - build_start
+        words = [misspell(rng.choice(names), rng) for _ in range(20)]
+
+        def linear():
+            for word in words:
+                best, best_ratio = None, 0.6
+                for name, value in entries:
+                    ratio = SequenceMatcher(None, word, name).ratio()
+                    if ratio > best_ratio:
+                        best, best_ratio = value, ratio
+
+        def indexed():
+            for word in words:
+                index.lookup(word)
+
+        linear_time = timed(linear, 1) / len(words)
+        indexed_time = timed(indexed, 5) / len(words)
+        print(f"   {size:>6} names: linear {linear_time * 1e3:8.3f} ms/word, "
+              f"indexed {indexed_time * 1e3:8.3f} ms/word, build {build_time * 1e3:8.1f} ms")
+
+def benchmark_keyword_scan():
+    """Compare per-keyword substring checks with the keyword automaton"""
+    print("\n🚨 Keyword extraction (danger keywords, names, symptoms)")
+    query = "i took too many pills and now have a severe headache and chest pain after crocin"
+    for size in (30, 300, 3000):
+        keywords = make_synthetic_names(size, seed=size)
+        automaton = KeywordAutomaton((keyword, 'symptom', keyword, rank) for rank, keyword in enumerate(keywords))
+
+        def substring():
+            return [keyword for keyword in keywords if keyword in query.lower()]
+
+        per_keyword = timed(substring, 200)
+        single_pass = timed(lambda: automaton.scan(query), 200)
+        print(f"   {size:>6} keywords: substring {per_keyword * 1e6:8.1f} µs/query, "
+              f"automaton {single_pass * 1e6:8.1f} µs/query")
+
+def legacy_query_type(query):
+    """The if/elif substring chain the classifier replaced"""
+    if any(word in query for word in ['side effect', 'adverse', 'reaction']):
+        return 'side_effects'
+    elif any(word in query for word in ['dosage', 'dose', 'how much', 'how many']):
+        return 'dosage'
+    elif any(word in query for word in ['use', 'for', 'treat', 'help']):
+        return 'uses'
+    elif any(word in query for word in ['warning', 'caution', 'safe', 'danger']):
+        return 'warnings'
+    elif any(word in query for word in ['interaction', 'together', 'with']):
+        return 'interactions'
+    return 'general'
+
+def make_query_corpus(count, seed=11):
+    """Synthetic voice-style queries across every query type"""
+    rng = random.Random(seed)
+    templates = [
+        "what is {} used for", "side effects of {} please", "can i take {} with food",
+        "is {} safe in pregnancy", "how much {} should i take daily", "tell me about {}",
+        "what are the warnings for {}", "any interactions between warfarin and {}",
+        "what dose of {} for a child", "does {} help with headache"
+    ]
+    medicines = ['paracetamol', 'ibuprofen', 'aspirin', 'cetirizine', 'omeprazole', 'metformin']
+    return [rng.choice(templates).format(rng.choice(medicines)) for _ in range(count)]
+
+def benchmark_query_type():
+    """Compare the substring chain with batch keyword-table classification"""
+    print("\n🏷️  Query type classification")
+    corpus = make_query_corpus(20000)
+    classifier = QueryTypeClassifier()
+    chain_time = timed(lambda: [legacy_query_type(query.lower()) for query in corpus], 3)
+    batch_time = timed(lambda: classifier.classify_batch(corpus), 3)
+    print(f"   {len(corpus)} queries: chain {len(corpus) / chain_time:10.0f} q/s, "
+          f"classifier {len(corpus) / batch_time:10.0f} q/s")
+
+def benchmark_batch_endpoint():
+    """Compare one POST per query with the batch endpoint"""
+    print("\n📦 Batch query endpoint")
+    corpus = make_query_corpus(100, seed=3)
+    client = medical_ai_backend.app.test_client()
+
+    def single():
+        for query in corpus:
+            client.post('/api/medical-query', data=json.dumps({'query': query}), content_type='application/json')
+
+    def batch():
+        client.post('/api/medical-query/batch', data=json.dumps({'queries': corpus}), content_type='application/json')
+
+    single_time = timed(single, 3)
+    print(f"   single requests:     {len(corpus) / single_time:8.0f} queries/s")
+    for executor in ('thread', 'process'):
+        medical_ai_backend.BATCH_EXECUTOR = executor
+        medical_ai_backend._batch_executor = None
+        batch()  # warm the pool
+        batch_time = timed(batch, 3)
+        print(f"   batch ({executor:>7} pool): {len(corpus) / batch_time:8.0f} queries/s")
+        medical_ai_backend._batch_executor.shutdown()
+        medical_ai_backend._batch_executor = None
+
+def benchmark_response_templates():
+    """Report template build time and memory, and the per-response saving"""
+    print("\n🧾 Pre-rendered medicine responses")
+    for size in (6, 1000, 10000):
+        kb = make_synthetic_knowledge_base(size)
+        generator = MedicalResponseGenerator(kb, cache_size=0)
+        on_demand = MedicalResponseGenerator(kb, cache_size=0, precompile=False)
+        report = generator.template_report
+        queries = [MedicalQuery("", "", "medicine_info", medicine, [], query_type, 0.9, [])
+                   for medicine in list(kb.medicines)[:50]
+                   for query_type in MedicalResponseGenerator.MEDICINE_QUERY_TYPES]
+        rendered = timed(lambda: [on_demand.generate_response(query) for query in queries], 5) / len(queries)
+        looked_up = timed(lambda: [generator.generate_response(query) for query in queries], 5) / len(queries)
+        print(f"   {size:>6} medicines: build {report['build_ms']:8.1f} ms, "
+              f"{report['bytes'] / 1024 / 1024:7.2f} MiB, "
+              f"render {rendered * 1e6:6.1f} µs vs template {looked_up * 1e6:6.1f} µs")
+
+def benchmark_snapshot_load():
+    """Compare opening the knowledge base from the JSON catalog and from a binary snapshot
+    
+    Snapshots build their indexes on first use, so the first query is timed
+    separately: that is where a snapshot-backed worker pays for them.
+    """
+    print("\n💾 Knowledge base loading (20k medicines)")
+    catalog = make_synthetic_catalog(20000)
+    keys = random.Random(5).sample(list(catalog['medicines']), 100)
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'catalog.json')
+        snapshot_path = os.path.join(directory, 'catalog.mkb')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f)
+        build_snapshot(catalog, snapshot_path)
+
+        def load(path):
+            kb = MedicalKnowledgeBase(path)
+            [kb.medicines[key] for key in keys]
+            return kb
+
+        def first_query(kb):
+            medical_ai_backend.MedicalQueryProcessor(kb).analyze_query('what is the dosage of ibuprofen')
+
+        for label, path in (('json', json_path), ('snapshot', snapshot_path)):
+            tracemalloc.start()
+            first_query(load(path))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            start = time.perf_counter()
+            kb = load(path)
+            opened = time.perf_counter() - start
+            first_query(kb)
+            queried = time.perf_counter() - start - opened
+            print(f"   {label:>8}: load + 100 lookups {opened * 1e3:8.1f} ms, first query {queried * 1e3:8.1f} ms, "
+                  f"heap peak {peak / 1024 / 1024:7.2f} MiB, file {os.path.getsize(path) / 1024 / 1024:6.2f} MiB")
+
+def benchmark_sqlite_engine():
+    """Compare the in-memory engine with the SQLite engine on a large catalog"""
+    print("\n🗄️  SQLite knowledge base engine (20k medicines)")
+    catalog = make_synthetic_catalog(20000)
+    rng = random.Random(9)
+    names = [name for entry in catalog['medicines'].values() for name in entry['names']]
+    queries = [f"what is {misspell(rng.choice(names), rng)} used for" for _ in range(50)]
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'catalog.json')
+        sqlite_path = os.path.join(directory, 'catalog.sqlite')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f)
+        build_database(catalog, sqlite_path)
+
+        for label, path in (('memory', json_path), ('sqlite', sqlite_path)):
+            tracemalloc.start()
+            load_start = time.perf_counter()
+            kb = medical_ai_backend.load_knowledge_base(path)
+            load_time = time.perf_counter() - load_start
+            heap = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            processor = medical_ai_backend.MedicalQueryProcessor(kb, correction_cache_size=0)
+            per_query = timed(lambda: [processor.analyze_query(query) for query in queries], 1) / len(queries)
+            print(f"   {label:>6}: open {load_time * 1e3:8.1f} ms, heap {heap / 1024 / 1024:7.2f} MiB, "
+                  f"analyze {per_query * 1e3:7.2f} ms/query")
+
+def benchmark_hot_reload():
+    """Request latency percentiles under load, with and without reloads running"""
+    print("\n♻️  Hot reload under load (2k medicines, 4 client threads)")
+    corpus = make_query_corpus(200, seed=13)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'catalog.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_synthetic_catalog(2000), f)
+        reloader = medical_ai_backend.KnowledgeBaseReloader(path)
+
+        def measure(reload_count):
+            latencies, stop = [], threading.Event()
+
+            def client():
+                while not stop.is_set():
+                    for query in corpus:
+                        start = time.perf_counter()
+                        state = reloader.state
+                        state.response_generator.generate_response(state.query_processor.analyze_query(query))
+                        latencies.append(time.perf_counter() - start)
+
+            threads = [threading.Thread(target=client) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            elapsed = time.perf_counter()
+            if reload_count:
+                for _ in range(reload_count):
+                    reloader.reload(wait=True)
+            else:
+                time.sleep(2)
+            elapsed = time.perf_counter() - elapsed
+            stop.set()
+            for thread in threads:
+                thread.join()
+            latencies.sort()
+            p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+            print(f"   {reload_count} reloads: {len(latencies) / elapsed:8.0f} q/s, "
+                  f"p50 {p50 * 1e3:6.2f} ms, p99 {p99 * 1e3:6.2f} ms, max {latencies[-1] * 1e3:7.1f} ms")
+
+        measure(0)
+        measure(3)
+
+def benchmark_symptom_rank():
+    """Compare per-symptom lookups plus a full sort with the inverted index top-k"""
+    print("\n🩺 Multi-symptom ranking (5k symptoms, 10k medicines)")
+    rng = random.Random(21)
+    medicines = make_synthetic_names(10000, seed=21)
+    symptoms = {f"symptom {i}": rng.sample(medicines, rng.randint(5, 200)) for i in range(5000)}
+    index = SymptomIndex(symptoms, medicines)
+    queries = [rng.sample(list(symptoms), rng.randint(2, 6)) for _ in range(500)]
+
+    def per_symptom():
+        for query in queries:
+            coverage = {}
+            for symptom in query:
+                for position, medicine in enumerate(symptoms.get(symptom, [])):
+                    count, positions = coverage.get(medicine, (0, 0))
+                    coverage[medicine] = (count + 1, positions + position)
+            sorted(coverage, key=lambda medicine: (-coverage[medicine][0], coverage[medicine][1]))[:5]
+
+    def indexed():
+        for query in queries:
+            index.rank(query, 5)
+
+    naive_time = timed(per_symptom, 3) / len(queries)
+    indexed_time = timed(indexed, 3) / len(queries)
+    print(f"   per-symptom + sort {naive_time * 1e6:8.1f} µs/query, inverted index top-5 {indexed_time * 1e6:8.1f} µs/query")
+
+def benchmark_interactions():
+    """Compare scanning interaction text per pair with the interaction graph"""
+    print("\n💊 Interaction check (10k medicines, 25 medications per request)")
+    rng = random.Random(17)
+    catalog = make_synthetic_catalog(10000)
+    keys = list(catalog['medicines'])
+    for entry in catalog['medicines'].values():
+        entry['interactions'] = [f"{other.capitalize()}: synthetic effect" for other in rng.sample(keys, 8)]
+    medicines = catalog['medicines']
+    build_start = time.perf_counter()
+    graph = InteractionGraph(medicines)
+    build_time = time.perf_counter() - build_start
+    lists = [rng.sample(keys, 25) for _ in range(200)]
+
+    def string_scan():
+        for medication_list in lists:
+            for i, first in enumerate(medication_list):
+                for second in medication_list[i + 1:]:
+                    for source, other in ((first, second), (second, first)):
+                        [text for text in medicines[source]['interactions'] if text.lower().startswith(other + ':')]
+
+    def indexed():
+        for medication_list in lists:
+            graph.find([graph.resolve(name) for name in medication_list])
+
+    scan_time = timed(string_scan, 1) / len(lists)
+    graph_time = timed(indexed, 3) / len(lists)
+    print(f"   graph build {build_time * 1e3:.0f} ms for {graph.interaction_count} interactions")
+    print(f"   string scan {scan_time * 1e6:8.1f} µs/request, graph {graph_time * 1e6:8.1f} µs/request "
+          f"({1 / graph_time:8.0f} requests/s per core)")
+
+def benchmark_medicines_listing():
+    """Time and peak memory of /api/medicines: full list, one page, streamed export"""
+    print("\n📚 /api/medicines listing (50k medicines)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'catalog.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_synthetic_catalog(50000), f)
+        reloader = medical_ai_backend.KnowledgeBaseReloader(path)
+        previous, medical_ai_backend.serving = medical_ai_backend.serving, reloader
+        client = medical_ai_backend.app.test_client()
+        medicines = reloader.state.knowledge_base.medicines
+
+        def full_list():
+            # What the endpoint did before pagination: every medicine in one body
+            with medical_ai_backend.app.app_context():
+                return medical_ai_backend.jsonify({'medicines': [
+                    {'name': medicine, 'category': data['category'], 'uses': data['uses'][:3], 'names': data['names']}
+                    for medicine, data in medicines.items()
+                ]}).get_data()
+
+        def last_page():
+            cursor = medical_ai_backend._encode_cursor(reloader.state.knowledge_base.catalog_index.keys[-101])
+            return client.get(f'/api/medicines?cursor={cursor}').get_data()
+
+        def export():
+            response = client.get('/api/medicines?format=jsonl', buffered=False)
+            for _ in response.response:
+                pass
+            response.close()
+
+        try:
+            for label, func in (('full list', full_list), ('last page', last_page), ('jsonl export', export)):
+                tracemalloc.start()
+                func()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                elapsed = timed(func, 3)
+                print(f"   {label:>12}: {elapsed * 1e3:8.1f} ms/request, heap peak {peak / 1024 / 1024:7.2f} MiB")
+        finally:
+            medical_ai_backend.serving = previous
+
+def benchmark_etag_polling():
+    """Cost of polling /api/medicines: rebuilt, cached body, and 304 revalidation"""
+    print("\n🏷️  Polling /api/medicines (1000-medicine page)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'catalog.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_synthetic_catalog(5000), f)
+        previous, medical_ai_backend.serving = medical_ai_backend.serving, medical_ai_backend.KnowledgeBaseReloader(path)
+        client = medical_ai_backend.app.test_client()
+        url = '/api/medicines?limit=1000&fields=name,category,uses,dosage,warnings'
+        etag = client.get(url).headers['ETag']
+
+        def rebuilt():
+            medical_ai_backend.body_cache.clear()
+            client.get(url)
+
+        try:
+            for label, func in (
+                ('rebuilt', rebuilt),
+                ('cached body', lambda: client.get(url)),
+                ('304', lambda: client.get(url, headers={'If-None-Match': etag})),
+            ):
+                elapsed = timed(func, 50)
+                print(f"   {label:>12}: {elapsed * 1e6:8.1f} µs/request")
+        finally:
+            medical_ai_backend.serving = previous
+
+def benchmark_json_encode():
+    """Encode time per query response: Flask's stdlib encoder, the fallback and the fast encoder"""
+    print(f"\n🔣 JSON encoding per response (fast encoder: {JSON_BACKEND})")
+    processor, generator = medical_ai_backend.query_processor, medical_ai_backend.response_generator
+    results = []
+    for query_text in make_query_corpus(200, seed=5):
+        query = processor.analyze_query(query_text)
+        result = medical_ai_backend._serialize_result(query, generator.generate_response(query))
+        result['timestamp'] = '2024-01-01T00:00:00.000000'
+        results.append(result)
+    plain = [json.loads(dumps(result)) for result in results]
+
+    def flask_default(items):
+        return [json.dumps(item, default=_plain, sort_keys=True, separators=(',', ':')) for item in items]
+
+    cases = [
+        ('flask default', lambda: flask_default(plain)),
+        ('stdlib', lambda: [dumps_stdlib(item) for item in plain]),
+        ('stdlib + fragments', lambda: [dumps_stdlib(item) for item in results]),
+    ]
+    if JSON_BACKEND != 'json':
+        cases += [
+            (f'{JSON_BACKEND}', lambda: [dumps(item) for item in plain]),
+            (f'{JSON_BACKEND} + fragments', lambda: [dumps(item) for item in results]),
+        ]
+    size = sum(len(dumps(result)) for result in results) / len(results)
+    print(f"   average body: {size:.0f} bytes")
+    for label, func in cases:
+        elapsed = timed(func, 20) / len(results)
+        print(f"   {label:>22}: {elapsed * 1e6:6.2f} µs/response")
+
+def benchmark_asgi_concurrency():
+    """Concurrent slow clients: threaded WSGI workers against the ASGI app"""
+    requests, delay, threads = 2000, 0.05, 32
+    print(f"\n🔀 {requests} concurrent clients, each taking {delay * 1000:.0f} ms to send its query")
+    body = json.dumps({'query': 'ibuprofen side effects'}).encode('utf-8')
+    scope = {'type': 'http', 'method': 'POST', 'path': '/api/medical-query', 'query_string': b'',
+             'headers': [(b'content-type', b'application/json')], 'server': ('benchmark', 80)}
+
+    class SlowInput(io.BytesIO):
+        def read(self, *args):
+            time.sleep(delay)
+            return super().read(*args)
+
+    def wsgi_request():
+        environ = medical_ai_asgi.wsgi_environ(scope, body)
+        environ['wsgi.input'] = SlowInput(body)
+        return b''.join(medical_ai_backend.app(environ, lambda status, headers, exc_info=None: None))
+
+    def threaded():
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(lambda _: wsgi_request(), range(requests)))
+
+    async def asgi_request(asgi_app):
+        async def receive():
+            await asyncio.sleep(delay)
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            pass
+
+        await asgi_app(scope, receive, send)
+
+    async def concurrent():
+        asgi_app = medical_ai_asgi.MedicalASGIApp(threads=threads)
+        await asyncio.gather(*(asgi_request(asgi_app) for _ in range(requests)))
+
+    logging_level = medical_ai_backend.logger.level
+    medical_ai_backend.logger.setLevel('WARNING')
+    medical_ai_asgi.logger.setLevel('WARNING')
+    try:
+        wsgi_time = timed(threaded, 1)
+        asgi_time = timed(lambda: asyncio.run(concurrent()), 1)
+    finally:
+        medical_ai_backend.logger.setLevel(logging_level)
+        medical_ai_asgi.logger.setLevel(logging_level)
+    print(f"   WSGI ({threads} threads): {wsgi_time:6.2f} s, {requests / wsgi_time:8.0f} requests/s")
+    print(f"   ASGI (event loop):  {asgi_time:6.2f} s, {requests / asgi_time:8.0f} requests/s")
+
+def benchmark_llm_fallback():
+    """Knowledge base hit latency on an 8-thread server while the model upstream hangs"""
+    print("\n🤖 LLM fallback with a hanging upstream (8 worker threads, 200 requests/s, 1 in 5 unknown)")
+
+    class HangingUpstream(BaseHTTPRequestHandler):
+        def do_POST(self):
+            time.sleep(5)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), HangingUpstream)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/v1/chat/completions'
+    client = medical_ai_backend.app.test_client()
+    hits = ['paracetamol dosage', 'ibuprofen side effects', 'what helps with headache', 'aspirin warnings']
+
+    def run(llm_client):
+        medical_ai_backend.llm_client = llm_client
+        latencies, start = [], time.perf_counter()
+
+        def request(query, scheduled):
+            client.post('/api/medical-query', data=json.dumps({'query': query}), content_type='application/json')
+            if not query.startswith('what is drug'):
+                latencies.append(time.perf_counter() - scheduled)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for i in range(400):
+                scheduled = start + i * 0.005
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                query = f'what is drug{i}' if i % 5 == 0 else hits[i % len(hits)]
+                executor.submit(request, query, scheduled)
+        latencies.sort()
+        return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+    previous = medical_ai_backend.llm_client
+    level = medical_ai_backend.logger.level
+    medical_ai_backend.logger.setLevel('ERROR')
+    logging.getLogger('medical_llm').setLevel('ERROR')
+    try:
+        for label, llm_client in (
+            ('fallback disabled', None),
+            ('deadline only', LLMClient(url, timeout=0.5, breaker=CircuitBreaker(failure_threshold=10 ** 9))),
+            ('deadline + breaker', LLMClient(url, timeout=0.5, breaker=CircuitBreaker(failure_threshold=5))),
+        ):
+            p50, p99 = run(llm_client)
+            print(f"   {label:>18}: knowledge base hits p50 {p50 * 1e3:7.2f} ms, p99 {p99 * 1e3:7.2f} ms")
+    finally:
+        medical_ai_backend.llm_client = previous
+        medical_ai_backend.logger.setLevel(level)
+        server.shutdown()
+
+# Phrasings of the same question about an unknown medicine
+SEMANTIC_TOPICS = {
+    'side effects': ['what are the side effects of {}', '{} side effects', 'side effects of {} please',
+                     'tell me about {} side effects', 'what side effects does {} have', 'any side effects from {}?'],
+    'dosage': ['what is the dosage of {}', '{} dosage', 'dosage of {} please', 'what dosage of {} should I take',
+               'how much {} should I take'],
+    'pregnancy': ['is {} safe in pregnancy', '{} safe in pregnancy?', 'is {} safe during pregnancy',
+                  'can I take {} while pregnant'],
+    'uses': ['what is {} used for', 'what is {} for', 'uses of {}', '{} uses'],
+}
+
+def make_question_log(count, medicines=400, typo_rate=0.15, seed=5):
+    """Zipf-distributed questions about unknown medicines, with rewording and typos"""
+    rng = random.Random(seed)
+    names = [name for name in make_synthetic_names(medicines * 2, seed=seed) if len(name) >= 6][:medicines]
+    intents = [(name, topic) for name in names for topic in SEMANTIC_TOPICS]
+    rng.shuffle(intents)
+    weights = [1 / rank for rank in range(1, len(intents) + 1)]
+    log = []
+    for name, topic in rng.choices(intents, weights, k=count):
+        spelled = misspell(name, rng) if rng.random() < typo_rate else name
+        log.append((rng.choice(SEMANTIC_TOPICS[topic]).format(spelled), (name, topic)))
+    return log
+
+def benchmark_semantic_cache():
+    """Model calls saved by the semantic cache on a replayed question log"""
+    print("\n🧠 Semantic cache on 20,000 Zipf-distributed questions about 400 unknown medicines")
+    processor = medical_ai_backend.query_processor
+    generator = medical_ai_backend.response_generator
+    replay = []
+    for text, intent in make_question_log(20000):
+        query = processor.analyze_query(text)
+        if medical_ai_backend.needs_llm_answer(query, generator.generate_response(query)):
+            replay.append((query, intent))
+    print(f"   {len(replay)} questions reach the language model fallback")
+
+    previous = medical_ai_backend.semantic_cache
+    try:
+        for size in (256, 1024, 4096):
+            exact = medical_ai_backend.LRUCache(size)
+            exact_hits = 0
+            for query, intent in replay:
+                key = ' '.join(query.original_text.lower().split())
+                if exact.get(key) is not None:
+                    exact_hits += 1
+                else:
+                    exact.put(key, intent)
+
+            medical_ai_backend.semantic_cache = SemanticCache(
+                size, medical_ai_backend.SEMANTIC_CACHE_THRESHOLD,
+                ignored_words=medical_ai_backend.SEMANTIC_CACHE_IGNORED_WORDS
+            )
+            false_hits, lookup_time = 0, 0.0
+            for query, intent in replay:
+                start = time.perf_counter()
+                answer = medical_ai_backend.cached_llm_answer(query)
+                lookup_time += time.perf_counter() - start
+                if answer is None:
+                    medical_ai_backend.remember_llm_answer(query, intent)
+                elif answer != intent:
+                    false_hits += 1
+            stats = medical_ai_backend.semantic_cache.stats()
+            print(f"   capacity {size:>4}: exact-text hit rate {exact_hits / len(replay):6.1%}, "
+                  f"semantic hit rate {stats['hit_rate']:6.1%} ({false_hits} wrong answers), "
+                  f"lookup {lookup_time / len(replay) * 1e6:5.1f} µs")
+    finally:
+        medical_ai_backend.semantic_cache = previous
+
+def _private_memory_kib():
+    """Private (unshared) memory of this process in KiB, from /proc"""
+    with open('/proc/self/smaps_rollup') as f:
+        return sum(int(line.split()[1]) for line in f if line.startswith('Private_'))
+
+def memory_worker(mode, path):
+    """Load a catalog, fork a worker that uses it, and print the worker's private memory"""
+    if mode == 'dicts':
+        # The nested dict and list layout the catalog used before MedicineRecord
+        medical_ai_backend.compact_catalog = lambda catalog: catalog
+    gc.collect()
+    tracemalloc.start()
+    kb = MedicalKnowledgeBase(path)
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    if mode == 'frozen':
+        medical_ai_backend.freeze_for_fork()
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        before = _private_memory_kib()
+        # Serve from every entry, then let the collector run as a busy worker would
+        for medicine, data in kb.medicines.items():
+            for field_name in data:
+                len(data[field_name])
+        gc.collect()
+        os.write(write_fd, json.dumps({'worker_kib': _private_memory_kib() - before}).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        result = json.loads(f.read())
+    os.waitpid(pid, 0)
+    result['heap_mib'] = heap / 1024 / 1024
+    print(json.dumps(result))
+
+def benchmark_fork_memory():
+    """Per-worker private memory after fork for dict, record and GC-frozen catalogs"""
+    print("\n🧠 Catalog memory per forked worker (20k medicines)")
+    if not os.path.exists('/proc/self/smaps_rollup') or not hasattr(os, 'fork'):
+        print("   skipped: needs Linux /proc and os.fork")
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'catalog.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_synthetic_catalog(20000), f)
+        for mode in ('dicts', 'records', 'frozen'):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--memory-worker', mode, path],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"   {mode:>8}: catalog + indexes {result['heap_mib']:7.1f} MiB, "
+                  f"worker private after use + gc {result['worker_kib'] / 1024:7.1f} MiB")
+
+def _cold_start(source, preload=''):
+    """Startup timings of a fresh interpreter importing the backend"""
+    code = ("import json, time; started = time.perf_counter(); " + preload +
+            "import medical_ai_backend as m; "
+            "print(json.dumps(dict(m.STARTUP_TIMINGS, wall=(time.perf_counter() - started) * 1e3)))")
+    output = subprocess.run([sys.executable, '-c', code], env=dict(os.environ, MEDICAL_AI_KNOWLEDGE_BASE=source),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def _import_breakdown():
+    """Cumulative milliseconds of each module the backend imports directly"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import medical_ai_backend'],
+                            capture_output=True, text=True, check=True).stderr
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            if name.strip() == 'medical_ai_backend':
+                return sorted(children, key=lambda child: -child[1])
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), int(cumulative) / 1e3))
+    return []
+
+def benchmark_cold_start():
+    """Backend import and serving state time in fresh interpreters, with and without a prebuilt state"""
+    print("\n🧊 Cold start of the backend module (median of 5 fresh interpreters)")
+    breakdown = ', '.join(f"{name} {ms:.0f} ms" for name, ms in _import_breakdown()[:6])
+    print(f"   largest direct imports: {breakdown}")
+
+    def median(runs, key):
+        return sorted(run[key] for run in runs)[len(runs) // 2]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, catalog in (('shipped catalog', None), ('5000 medicines', make_synthetic_catalog(5000))):
+            source = os.path.join(directory, f'{len(label)}.json')
+            if catalog is None:
+                with open(medical_ai_backend.KNOWLEDGE_BASE_PATH, encoding='utf-8') as f:
+                    catalog = json.load(f)
+            with open(source, 'w', encoding='utf-8') as f:
+                json.dump(catalog, f)
+
+            # The eager openai and requests imports the module had before
+            before = [_cold_start(source, 'import openai, requests; ') for _ in range(5)]
+            built = [_cold_start(source) for _ in range(5)]
+            medical_ai_backend.save_serving_state(source=source)
+            prebuilt = [_cold_start(source) for _ in range(5)]
+            print(f"   {label}:")
+            for name, runs in (('before', before), ('built', built), ('prebuilt', prebuilt)):
+                print(f"   {name:>12}: total {median(runs, 'wall'):6.0f} ms, imports {median(runs, 'imports'):6.0f} ms, "
+                      f"serving state {median(runs, 'serving_state'):6.0f} ms")
+
+def benchmark_cloud_function():
+    """Per-invocation overhead of the Cloud Functions adapter: copied request context against direct dispatch"""
+    from flask import Flask, request
+    from werkzeug.datastructures import Headers
+    from werkzeug.test import EnvironBuilder
+
+    print("\n☁️  Cloud Functions dispatch (outer Flask app like functions_framework, best of 3)")
+    app = medical_ai_backend.app
+
+    def copied(incoming):
+        # The adapter main.py used before; Werkzeug 3 needs the headers copied
+        with app.test_request_context(path=incoming.path, method=incoming.method, headers=Headers(incoming.headers),
+                                      data=incoming.get_data(), query_string=incoming.query_string):
+            return app.full_dispatch_request()
+
+    adapter = {}
+    runtime = Flask('functions_framework')
+    runtime.add_url_rule('/<path:path>', 'run', lambda path: adapter['function'](request), methods=['GET', 'POST'])
+
+    def per_request(wsgi_app, request_args, count=2000):
+        environ = EnvironBuilder(headers={'Origin': 'https://mediquick.example'}, **request_args).get_environ()
+        body = environ['wsgi.input'].read()
+        best = float('inf')
+        for _ in range(3):
+            environs = [dict(environ, **{'wsgi.input': io.BytesIO(body)}) for _ in range(count)]
+            start = time.perf_counter()
+            for item in environs:
+                result = wsgi_app(item, lambda status, headers, exc_info=None: None)
+                b''.join(result)
+                result.close()
+            best = min(best, (time.perf_counter() - start) / count)
+        return best
+
+    query = json.dumps({'query': 'paracetamol dosage'})
+    cases = (('GET /api/health', {'path': '/api/health'}),
+             ('POST /api/medical-query', {'path': '/api/medical-query', 'method': 'POST', 'data': query,
+                                          'content_type': 'application/json'}))
+    logging_level = medical_ai_backend.logger.level
+    medical_ai_backend.logger.setLevel('WARNING')
+    try:
+        for label, request_args in cases:
+            bare = per_request(app.wsgi_app, request_args)
+            adapter['function'] = copied
+            before = per_request(runtime.wsgi_app, request_args)
+            adapter['function'] = medical_ai_backend.forward_request
+            after = per_request(runtime.wsgi_app, request_args)
+            print(f"   {label}: app alone {bare * 1e6:5.0f} µs, copied context {before * 1e6:5.0f} µs "
+                  f"(+{(before - bare) * 1e6:.0f}), direct dispatch {after * 1e6:5.0f} µs (+{(after - bare) * 1e6:.0f})")
+    finally:
+        medical_ai_backend.logger.setLevel(logging_level)
+
+def benchmark_streaming():
+    """Time and bytes until a voice client can start speaking: JSON response against JSON lines"""
+    from werkzeug.test import EnvironBuilder
+
+    link = 256e3  # bits per second of a slow mobile connection
+    print(f"\n🔊 Time to first speakable text (median of 500, transfer estimated at {link / 1e3:.0f} kbit/s)")
+    app = medical_ai_backend.app
+
+    def first_text(path, body, streamed):
+        environ = EnvironBuilder(path=path, method='POST', data=body, content_type='application/json').get_environ()
+        start = time.perf_counter()
+        result = app.wsgi_app(environ, lambda status, headers, exc_info=None: None)
+        received = b''
+        try:
+            for chunk in result:
+                received += chunk
+                if streamed and b'"event":"section"' in chunk:
+                    break
+        finally:
+            result.close()
+        if not streamed:
+            json.loads(received)
+        return time.perf_counter() - start, len(received)
+
+    logging_level = medical_ai_backend.logger.level
+    medical_ai_backend.logger.setLevel('WARNING')
+    try:
+        for query_text in ('aspirin dosage', 'metformin side effects', 'I took an overdose'):
+            body = json.dumps({'query': query_text})
+            print(f"   {query_text}:")
+            for label, path, streamed in (('JSON', '/api/medical-query', False),
+                                          ('JSON lines', '/api/medical-query?format=jsonl', True)):
+                runs = sorted(first_text(path, body, streamed) for _ in range(500))
+                elapsed, size = runs[len(runs) // 2]
+                print(f"   {label:>12}: {elapsed * 1e6:6.0f} µs, {size:5d} bytes before the first text, "
+                      f"{(elapsed + size * 8 / link) * 1e3:5.1f} ms with transfer")
+    finally:
+        medical_ai_backend.logger.setLevel(logging_level)
+
+def benchmark_partial_transcripts():
+    """Analyzing partial transcripts: re-analysis of every prefix against an incremental session"""
+    # The shipped catalog, since synthetic medicine names attract spelling corrections of ordinary words
+    processor = medical_ai_backend.query_processor
+    rng = random.Random(11)
+    names = [name for data in processor.kb.medicines.values() for name in data['names']]
+    fillers = ['um', 'so', 'like', 'you know', 'I think', 'please', 'my', 'and', 'also', 'the']
+    utterances = []
+    for _ in range(200):
+        words = ' '.join(rng.choice(fillers) for _ in range(rng.randint(4, 16))).split()
+        words.insert(rng.randrange(len(words)), rng.choice(names))
+        words.insert(rng.randrange(len(words)), rng.choice(['side effects', 'dosage', 'headache', 'fever']))
+        words.insert(rng.randrange(len(words) // 2, len(words)), rng.choice(['overdose', 'chest pain']))
+        utterances.append(' '.join(words).split())
+    print(f"\n🎙️  Partial transcripts: 200 utterances of {min(map(len, utterances))}-{max(map(len, utterances))} words")
+
+    def reanalyze():
+        for words in utterances:
+            for i in range(1, len(words) + 1):
+                processor.analyze_query(' '.join(words[:i]))
+
+    def incremental():
+        for words in utterances:
+            session = processor.session(on_danger=lambda keyword: None)
+            for word in words:
+                session.append(word)
+            session.analyze()
+
+    words_total = sum(map(len, utterances))
+    for label, func in (('re-analyze each prefix', reanalyze), ('incremental session', incremental)):
+        elapsed = timed(func, 5)
+        print(f"   {label:>22}: {elapsed / words_total * 1e6:7.2f} µs/word")
+
+    # Sessions with a callback correct the held back words as they arrive
+    sessions = []
+    for words in utterances:
+        session = processor.session(on_danger=lambda keyword: None)
+        for word in words:
+            session.append(word)
+        sessions.append(session)
+    full = timed(lambda: [processor.analyze_query(' '.join(words)) for words in utterances], 20) / len(utterances)
+    final = timed(lambda: [session.analyze() for session in sessions], 20) / len(sessions)
+    print(f"   final analysis: analyze_query {full * 1e6:6.1f} µs, session.analyze() {final * 1e6:6.1f} µs")
+
+    early = []
+    for words in utterances:
+        alerts = []
+        session = processor.session(on_danger=alerts.append)
+        for i, word in enumerate(words):
+            session.append(word)
+            if alerts:
+                early.append(len(words) - i - 1)
+                break
+    print(f"   danger alerts: {len(early)}/{len(utterances)} utterances, on average "
+          f"{sum(early) / len(early):.1f} words before the utterance ends")
+
+BENCHMARKS = {
+    'fuzzy_match': benchmark_fuzzy_match,
+    'keyword_scan': benchmark_keyword_scan,
+    'query_type': benchmark_query_type,
+    'batch_endpoint': benchmark_batch_endpoint,
+    'response_templates': benchmark_response_templates,
+    'snapshot_load': benchmark_snapshot_load,
+    'sqlite_engine': benchmark_sqlite_engine,
+    'hot_reload': benchmark_hot_reload,
+    'fork_memory': benchmark_fork_memory,
+    'symptom_rank': benchmark_symptom_rank,
+    'interactions': benchmark_interactions,
+    'medicines_listing': benchmark_medicines_listing,
+    'etag_polling': benchmark_etag_polling,
+    'json_encode': benchmark_json_encode,
+    'asgi_concurrency': benchmark_asgi_concurrency,
+    'llm_fallback': benchmark_llm_fallback,
+    'semantic_cache': benchmark_semantic_cache,
+    'cold_start': benchmark_cold_start,
+    'cloud_function': benchmark_cloud_function,
+    'streaming': benchmark_streaming,
+    'partial_transcripts': benchmark_partial_transcripts,
+}
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--memory-worker']:
+        memory_worker(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    print("⏱️  Medical AI Backend Benchmarks")
+    print("=" * 60)
+    for name in selected:
+        BENCHMARKS[name]()
@@ -188,7 +188,7 @@ def test_api_endpoints():
         response = requests.get(f"{API_BASE}/api/medicines")
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Medicines Endpoint: {len(data['medicines'])} medicines available")
+            print(f"✅ Medicines Endpoint: {data['total']} medicines available")
         else:
             print(f"❌ Medicines Endpoint Failed: {response.status_code}")
     except Exception as e:
@@ -1,23 +1,35 @@
 #!/usr/bin/env python3
 """
 Cloud Functions entry point for Medical AI Backend
+
+Usage:
+    python main.py                  # local development server
+    python main.py --build-state    # prebuild the serving state so cold starts skip index building
 """
 
+import sys
+import time
+
+_started = time.perf_counter()
 import functions_framework
-from medical_ai_backend import app
+_framework_loaded = time.perf_counter()
+from medical_ai_backend import STARTUP_TIMINGS, app, forward_request, logger, save_serving_state, serving
+
+STARTUP_TIMINGS['functions_framework'] = (_framework_loaded - _started) * 1e3
+STARTUP_TIMINGS['entry_point'] = (time.perf_counter() - _started) * 1e3
+logger.info(f"Entry point ready in {STARTUP_TIMINGS['entry_point']:.0f} ms "
+            f"(functions_framework {STARTUP_TIMINGS['functions_framework']:.0f} ms)")
 
 @functions_framework.http
 def medical_ai_function(request):
     """HTTP Cloud Function entry point"""
-    with app.test_request_context(
-        path=request.path,
-        method=request.method,
-        headers=request.headers,
-        data=request.get_data(),
-        query_string=request.query_string
-    ):
-        return app.full_dispatch_request()
+    return forward_request(request)
 
 # For local development
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8080) 
\ No newline at end of file
+    if sys.argv[1:2] == ['--build-state']:
+        # The import above already built (or loaded) the state for this knowledge base
+        state = save_serving_state(source=serving.source, state=serving.state)
+        print(f"Prebuilt serving state for knowledge base version {state.knowledge_base.version}")
+    else:
+        app.run(debug=True, host='0.0.0.0', port=8080) 
\ No newline at end of file
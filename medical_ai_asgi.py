@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+ASGI serving mode for the Medical AI Voice Assistant Backend
+Serves the Flask app's routes from an event loop, sharing its processor and generator
+
+Usage:
+    pip install uvicorn
+    uvicorn medical_ai_asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import medical_ai_backend
+from medical_ai_backend import (
+    ERROR_RESPONSE, SQLITE_SUFFIXES, STREAM_ERROR_LINE, MedicalQuery, MedicalResponse, ServingState,
+    _analysis_line, _query_result, _response_lines, cached_llm_answer, llm_response, needs_llm_answer,
+    remember_llm_answer
+)
+from medical_json import dumps
+
+logger = logging.getLogger(__name__)
+
+# Threads running delegated Flask routes and disk-backed knowledge base reads
+ASGI_THREADS = int(os.environ.get('MEDICAL_AI_ASGI_THREADS', '32'))
+
+# Largest request body accepted before a thread is involved
+MAX_BODY_SIZE = int(os.environ.get('MEDICAL_AI_ASGI_MAX_BODY', str(1024 * 1024)))
+
+Headers = List[Tuple[bytes, bytes]]
+
+class ClientDisconnected(Exception):
+    """The client went away before its request body was read"""
+
+class RequestTooLarge(Exception):
+    """The request body exceeds MAX_BODY_SIZE"""
+
+async def read_body(receive, limit: int = MAX_BODY_SIZE) -> bytes:
+    """Collect the request body without holding a thread while it arrives"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise RequestTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+def wsgi_environ(scope: Dict, body: bytes) -> Dict:
+    """Build the WSGI environ for an ASGI HTTP scope and its body"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = client[0], str(client[1])
+    for name, value in scope.get('headers', []):
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+def _header(scope: Dict, name: bytes) -> Optional[bytes]:
+    for key, value in scope.get('headers', []):
+        if key.lower() == name:
+            return value
+    return None
+
+def _query_param(scope: Dict, name: str) -> Optional[str]:
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get(name)
+    return values[0] if values else None
+
+def _cors_headers(scope: Dict) -> Headers:
+    """The headers Flask-CORS adds with the app's CORS(app) defaults"""
+    origin = _header(scope, b'origin')
+    if origin is None:
+        return [(b'access-control-allow-origin', b'*')]
+    return [(b'access-control-allow-origin', origin), (b'vary', b'Origin')]
+
+def _answer(state: ServingState, query_text: str):
+    query = state.query_processor.analyze_query(query_text)
+    return query, state.response_generator.generate_response(query)
+
+async def _ask(client, question: str) -> Optional[str]:
+    """Await a language model answer within the client's deadline, holding no thread"""
+    future = client.submit(question)
+    if future is None:
+        return None
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), client.timeout)
+    except asyncio.TimeoutError:
+        client.record_timeout()
+        return None
+    except Exception:
+        return None
+
+class MedicalASGIApp:
+    """ASGI application serving the medical query API from an event loop
+
+    ``POST /api/medical-query``, also streamed as JSON lines with
+    ``format=jsonl``, and ``GET /api/health`` are handled on the loop: query
+    analysis and template lookups are CPU-light and run inline, while
+    knowledge bases that read from disk are queried on the thread pool and
+    language model answers are awaited without a thread. Every other route
+    runs the Flask view itself on the thread pool through a WSGI bridge, so
+    both serving modes expose the same API.
+    Request bodies are read asynchronously, so slow clients hold no thread.
+    """
+
+    def __init__(self, wsgi_app=None, threads: int = ASGI_THREADS):
+        self.wsgi_app = wsgi_app or medical_ai_backend.app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='medical-asgi')
+        self.routes = {
+            ('POST', '/api/medical-query'): self.medical_query,
+            ('GET', '/api/health'): self.health_check,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        try:
+            body = await read_body(receive)
+        except ClientDisconnected:
+            return
+        except RequestTooLarge:
+            await self._send_json(scope, send, 413, {'error': 'Request body too large'})
+            return
+
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler == self.medical_query and _query_param(scope, 'format') == 'jsonl':
+            await self.stream_medical_query(scope, body, send)
+            return
+        if handler is None:
+            await self._call_wsgi(scope, body, send)
+            return
+        status, data = await handler(body)
+        await self._send_json(scope, send, status, data)
+
+    async def medical_query(self, body: bytes) -> Tuple[int, Dict]:
+        """Process medical query and return response"""
+        try:
+            data = json.loads(body)
+            query_text = data.get('query', '')
+
+            if not query_text:
+                return 400, {'error': 'No query provided'}
+
+            logger.info(f"Processing medical query: {query_text[:50]}...")
+
+            # Process query against one consistent snapshot of the knowledge base
+            state = medical_ai_backend.serving.state
+            query, response = await self._run(state, _answer, state, query_text)
+            response = await self._llm_response(query, response)
+
+            return 200, _query_result(state, query, response)
+
+        except Exception as e:
+            logger.error(f"Error processing medical query: {str(e)}")
+            return 500, {
+                'error': 'Internal server error',
+                'response': ERROR_RESPONSE
+            }
+
+    async def stream_medical_query(self, scope: Dict, body: bytes, send):
+        """Process medical query and stream the result as JSON lines, like the Flask route"""
+        try:
+            query_text = json.loads(body).get('query', '')
+            if not query_text:
+                await self._send_json(scope, send, 400, {'error': 'No query provided'})
+                return
+
+            logger.info(f"Processing medical query: {query_text[:50]}...")
+            state = medical_ai_backend.serving.state
+            query = await self._run(state, state.query_processor.analyze_query, query_text)
+        except Exception as e:
+            logger.error(f"Error processing medical query: {str(e)}")
+            await self._send_json(scope, send, 500, {'error': 'Internal server error', 'response': ERROR_RESPONSE})
+            return
+
+        headers = [(b'content-type', b'application/x-ndjson')] + _cors_headers(scope)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': _analysis_line(query), 'more_body': True})
+        try:
+            response = await self._run(state, state.response_generator.generate_response, query)
+            lines = _response_lines(await self._llm_response(query, response))
+        except Exception as e:
+            logger.error(f"Error processing medical query: {str(e)}")
+            lines = [STREAM_ERROR_LINE]
+        for line in lines:
+            await send({'type': 'http.response.body', 'body': line, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _run(self, state: ServingState, func, *args):
+        """Call func inline, or on the thread pool when the knowledge base reads from disk"""
+        if state.knowledge_base.source.endswith(SQLITE_SUFFIXES):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        return func(*args)
+
+    async def _llm_response(self, query: MedicalQuery, response: MedicalResponse) -> MedicalResponse:
+        """Replace a canned response with a language model answer where one is wanted"""
+        client = medical_ai_backend.llm_client
+        if client is None or not needs_llm_answer(query, response):
+            return response
+        answer = cached_llm_answer(query)
+        if answer is None:
+            answer = remember_llm_answer(query, await _ask(client, query.original_text))
+        return llm_response(answer, response)
+
+    async def health_check(self, body: bytes) -> Tuple[int, Dict]:
+        """Health check endpoint"""
+        return 200, {
+            'status': 'healthy',
+            'timestamp': datetime.now().isoformat(),
+            'version': '1.0.0'
+        }
+
+    async def _send_json(self, scope: Dict, send, status: int, data: Dict):
+        body = dumps(data) + b'\n'
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('ascii'))]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers + _cors_headers(scope)})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _call_wsgi(self, scope: Dict, body: bytes, send):
+        """Run the Flask app for this request on the thread pool"""
+        environ = wsgi_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'], started['headers'] = status, headers
+            return lambda data: None
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            result = self.wsgi_app(environ, start_response)
+            try:
+                chunks = iter(result)
+                chunk = next(chunks, b'')
+                start = {
+                    'type': 'http.response.start',
+                    'status': int(started['status'].split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in started['headers']]
+                }
+                # Sized responses are sent from the loop. Streams are sent from
+                # this thread, since stream_with_context generators must finish
+                # on the thread that started them
+                if any(name.lower() == 'content-length' for name, _ in started['headers']):
+                    return start, chunk + b''.join(chunks)
+                send_from_thread(start)
+                for following in chunks:
+                    if chunk:
+                        send_from_thread({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = following
+                send_from_thread({'type': 'http.response.body', 'body': chunk})
+                return None, None
+            finally:
+                close = getattr(result, 'close', None)
+                if close is not None:
+                    close()
+
+        start, body = await loop.run_in_executor(self.executor, run)
+        if start is not None:
+            await send(start)
+            await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+app = MedicalASGIApp()
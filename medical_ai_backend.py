@@ -4,25 +4,116 @@ Medical AI Voice Assistant Backend
 Advanced medical query processing with safety checks and comprehensive responses
 """
 
+import base64
+import contextvars
+import gc
+import hashlib
+import heapq
+import hmac
 import json
+import os
 import re
+import sys
 import logging
+import pickle
+import threading
+import time
+
+_import_started = time.perf_counter()
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from operator import itemgetter
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
-from flask import Flask, request, jsonify
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, replace
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from types import MappingProxyType
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import openai
-import requests
-from difflib import SequenceMatcher
+from medical_kb_index import (
+    INTERACTION_MATCH_RATIO, PHRASE_MATCH_RATIO, SYMPTOM_TOP_K, FuzzyNameIndex, Interaction, KeywordHit,
+    NormalizedQuery, SymptomMatch, _TOKEN_PATTERN, best_fuzzy_match, parse_interactions
+)
+from medical_kb_snapshot import SNAPSHOT_SUFFIX, KnowledgeBaseSnapshot, catalog_version
+from medical_json import BACKEND as JSON_BACKEND, MedicalJSONProvider, PreEncoded, dumps as dump_json
+from medical_llm import CircuitBreaker, LLMClient
+from medical_semantic_cache import STOP_WORDS, SemanticCache
+
+# Cold start breakdown in milliseconds, reported by /api/metrics
+STARTUP_TIMINGS: Dict[str, float] = {'imports': (time.perf_counter() - _import_started) * 1e3}
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = MedicalJSONProvider(app)
 CORS(app)
 
+KNOWLEDGE_BASE_PATH = os.environ.get(
+    'MEDICAL_AI_KNOWLEDGE_BASE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'medical_knowledge_base.json')
+)
+
+CORRECTION_CACHE_SIZE = int(os.environ.get('MEDICAL_AI_CORRECTION_CACHE_SIZE', '4096'))
+RESPONSE_CACHE_SIZE = int(os.environ.get('MEDICAL_AI_RESPONSE_CACHE_SIZE', '1024'))
+RESPONSE_CACHE_TTL = float(os.environ.get('MEDICAL_AI_RESPONSE_CACHE_TTL', '300'))
+PRECOMPILE_RESPONSES = os.environ.get('MEDICAL_AI_PRECOMPILE_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+
+# Move the catalog loaded at import out of the cyclic GC so forked workers
+# (gunicorn --preload) do not dirty its copy-on-write pages during collections
+GC_FREEZE = os.environ.get('MEDICAL_AI_GC_FREEZE', 'false').lower() in ('1', 'true', 'yes')
+
+BATCH_EXECUTOR = os.environ.get('MEDICAL_AI_BATCH_EXECUTOR', 'thread')
+BATCH_WORKERS = int(os.environ.get('MEDICAL_AI_BATCH_WORKERS', '4'))
+MAX_BATCH_SIZE = int(os.environ.get('MEDICAL_AI_MAX_BATCH_SIZE', '100'))
+
+# Largest medication list accepted by the interaction checker
+MAX_MEDICATIONS = int(os.environ.get('MEDICAL_AI_MAX_MEDICATIONS', '50'))
+
+# /api/medicines page sizes
+MEDICINES_PAGE_SIZE = int(os.environ.get('MEDICAL_AI_MEDICINES_PAGE_SIZE', '100'))
+MAX_MEDICINES_PAGE_SIZE = int(os.environ.get('MEDICAL_AI_MAX_MEDICINES_PAGE_SIZE', '1000'))
+
+# Serialized bodies of endpoints that only change with the knowledge base
+BODY_CACHE_SIZE = int(os.environ.get('MEDICAL_AI_BODY_CACHE_SIZE', '256'))
+
+# Hot reload: the admin endpoint is disabled unless a token is configured, and
+# the file watcher only runs with a positive polling interval in seconds
+ADMIN_TOKEN = os.environ.get('MEDICAL_AI_ADMIN_TOKEN', '')
+RELOAD_INTERVAL = float(os.environ.get('MEDICAL_AI_RELOAD_INTERVAL', '0'))
+
+# Serving state prebuilt by `python main.py --build-state` and loaded at startup
+# instead of building the indexes; defaults to the knowledge base path + .state
+STATE_SUFFIX = '.state'
+STATE_SNAPSHOT_PATH = os.environ.get('MEDICAL_AI_STATE_SNAPSHOT', '')
+STATE_FORMAT = 1
+
+# Optional language model answers for questions the knowledge base cannot
+# answer, from any OpenAI-compatible chat completions endpoint
+LLM_FALLBACK = os.environ.get('MEDICAL_AI_LLM_FALLBACK', 'false').lower() in ('1', 'true', 'yes')
+LLM_URL = os.environ.get('MEDICAL_AI_LLM_URL', 'https://api.openai.com/v1/chat/completions')
+LLM_MODEL = os.environ.get('MEDICAL_AI_LLM_MODEL', 'gpt-3.5-turbo')
+LLM_TIMEOUT = float(os.environ.get('MEDICAL_AI_LLM_TIMEOUT', '2.0'))
+LLM_MAX_CONCURRENT = int(os.environ.get('MEDICAL_AI_LLM_MAX_CONCURRENT', '4'))
+LLM_BREAKER_FAILURES = int(os.environ.get('MEDICAL_AI_LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET = float(os.environ.get('MEDICAL_AI_LLM_BREAKER_RESET', '30'))
+# General answers are replaced only for analyses below this confidence
+LLM_CONFIDENCE_THRESHOLD = float(os.environ.get('MEDICAL_AI_LLM_CONFIDENCE_THRESHOLD', '0.7'))
+# Language model answers reused for reworded questions; a size of 0 disables it
+SEMANTIC_CACHE_SIZE = int(os.environ.get('MEDICAL_AI_SEMANTIC_CACHE_SIZE', '4096'))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('MEDICAL_AI_SEMANTIC_CACHE_THRESHOLD', '0.7'))
+SEMANTIC_CACHE_TTL = float(os.environ.get('MEDICAL_AI_SEMANTIC_CACHE_TTL', '3600'))
+
+_MISSING = object()
+
+# Knowledge base files served by the SQLite engine in medical_kb_sqlite
+SQLITE_SUFFIXES = ('.sqlite', '.sqlite3', '.db')
+
 @dataclass
 class MedicalQuery:
     """Structure for medical query analysis"""
@@ -45,337 +136,737 @@ class MedicalResponse:
     warnings: List[str]
     disclaimer: str
 
-class MedicalKnowledgeBase:
-    """Comprehensive medical knowledge base with safety checks"""
-    
-    def __init__(self):
-        self.medicines = {
-            'paracetamol': {
-                'names': ['paracetamol', 'acetaminophen', 'tylenol', 'panadol', 'crocin'],
-                'category': 'Analgesic/Antipyretic',
-                'uses': [
-                    'Pain relief (mild to moderate)',
-                    'Fever reduction',
-                    'Headache relief',
-                    'Muscle aches',
-                    'Arthritis pain',
-                    'Cold and flu symptoms'
-                ],
-                'dosage': {
-                    'adult': '500-1000mg every 4-6 hours, maximum 4g daily',
-                    'child': '10-15mg/kg every 4-6 hours, maximum 60mg/kg daily',
-                    'elderly': 'Reduce dose if liver/kidney problems'
-                },
-                'side_effects': [
-                    'Rare: liver damage with overdose',
-                    'Skin rash (uncommon)',
-                    'Nausea (rare)',
-                    'Blood disorders (very rare)'
-                ],
-                'warnings': [
-                    'Do not exceed recommended dose',
-                    'Avoid alcohol consumption',
-                    'Check other medications for paracetamol content',
-                    'Consult doctor if symptoms persist >3 days',
-                    'Liver disease patients: use with caution'
-                ],
-                'contraindications': [
-                    'Severe liver disease',
-                    'Known hypersensitivity to paracetamol'
-                ],
-                'interactions': [
-                    'Warfarin: may enhance anticoagulant effect',
-                    'Alcohol: increased risk of liver damage'
-                ]
-            },
-            'ibuprofen': {
-                'names': ['ibuprofen', 'advil', 'motrin', 'brufen', 'nurofen'],
-                'category': 'NSAID (Non-Steroidal Anti-Inflammatory Drug)',
-                'uses': [
-                    'Pain relief',
-                    'Inflammation reduction',
-                    'Fever reduction',
-                    'Arthritis',
-                    'Muscle strains',
-                    'Dental pain'
-                ],
-                'dosage': {
-                    'adult': '200-400mg every 4-6 hours, maximum 1.2g daily',
-                    'child': '5-10mg/kg every 6-8 hours',
-                    'elderly': 'Use lowest effective dose'
-                },
-                'side_effects': [
-                    'Stomach upset',
-                    'Heartburn',
-                    'Dizziness',
-                    'Increased bleeding risk',
-                    'Kidney problems (long-term use)',
-                    'High blood pressure'
-                ],
-                'warnings': [
-                    'Take with food to reduce stomach irritation',
-                    'Not suitable for stomach ulcer patients',
-                    'Avoid if allergic to aspirin',
-                    'Monitor blood pressure with long-term use',
-                    'Increased cardiovascular risk with prolonged use'
-                ],
-                'contraindications': [
-                    'Active peptic ulcer',
-                    'Severe heart failure',
-                    'Severe kidney disease',
-                    'Third trimester of pregnancy',
-                    'Aspirin allergy'
-                ],
-                'interactions': [
-                    'Warfarin: increased bleeding risk',
-                    'ACE inhibitors: reduced effectiveness',
-                    'Lithium: increased lithium levels'
-                ]
-            },
-            'aspirin': {
-                'names': ['aspirin', 'acetylsalicylic acid', 'bayer', 'disprin'],
-                'category': 'NSAID/Antiplatelet',
-                'uses': [
-                    'Pain relief',
-                    'Fever reduction',
-                    'Heart attack prevention',
-                    'Stroke prevention',
-                    'Blood clot prevention',
-                    'Anti-inflammatory'
-                ],
-                'dosage': {
-                    'adult_pain': '300-900mg every 4-6 hours',
-                    'adult_cardio': '75-100mg once daily',
-                    'child': 'Not recommended under 16 years'
-                },
-                'side_effects': [
-                    'Stomach irritation',
-                    'Increased bleeding risk',
-                    'Tinnitus (ringing in ears)',
-                    'Nausea',
-                    'Allergic reactions'
-                ],
-                'warnings': [
-                    'Not for children under 16 (Reye\'s syndrome risk)',
-                    'Take with food',
-                    'Monitor for bleeding',
-                    'Stop before surgery',
-                    'Avoid in pregnancy (third trimester)'
-                ],
-                'contraindications': [
-                    'Children under 16 years',
-                    'Active bleeding',
-                    'Severe kidney disease',
-                    'Aspirin allergy',
-                    'Third trimester pregnancy'
-                ],
-                'interactions': [
-                    'Warfarin: major bleeding risk',
-                    'Methotrexate: increased toxicity',
-                    'Diabetes medications: enhanced effect'
-                ]
-            },
-            'cetirizine': {
-                'names': ['cetirizine', 'zyrtec', 'reactine'],
-                'category': 'Antihistamine (H1 receptor antagonist)',
-                'uses': [
-                    'Allergic rhinitis (hay fever)',
-                    'Urticaria (hives)',
-                    'Allergic conjunctivitis',
-                    'Itching',
-                    'Eczema symptoms'
-                ],
-                'dosage': {
-                    'adult': '10mg once daily',
-                    'child_6_12': '5mg once daily',
-                    'child_2_6': '2.5mg once daily',
-                    'elderly': 'May need dose reduction'
-                },
-                'side_effects': [
-                    'Drowsiness',
-                    'Dry mouth',
-                    'Fatigue',
-                    'Headache',
-                    'Dizziness'
-                ],
-                'warnings': [
-                    'May cause drowsiness',
-                    'Avoid alcohol',
-                    'Reduce dose in kidney problems',
-                    'Use caution when driving'
-                ],
-                'contraindications': [
-                    'Severe kidney disease',
-                    'Known hypersensitivity'
-                ],
-                'interactions': [
-                    'Alcohol: enhanced sedation',
-                    'CNS depressants: additive effects'
-                ]
-            },
-            'omeprazole': {
-                'names': ['omeprazole', 'prilosec', 'losec'],
-                'category': 'Proton Pump Inhibitor (PPI)',
-                'uses': [
-                    'Gastroesophageal reflux disease (GERD)',
-                    'Peptic ulcers',
-                    'Heartburn',
-                    'Zollinger-Ellison syndrome',
-                    'H. pylori eradication (with antibiotics)'
-                ],
-                'dosage': {
-                    'adult': '20-40mg once daily before breakfast',
-                    'maintenance': '10-20mg daily',
-                    'h_pylori': '20mg twice daily with antibiotics'
-                },
-                'side_effects': [
-                    'Headache',
-                    'Stomach pain',
-                    'Nausea',
-                    'Diarrhea',
-                    'Vitamin B12 deficiency (long-term use)'
-                ],
-                'warnings': [
-                    'Take on empty stomach',
-                    'Complete prescribed course',
-                    'May affect vitamin B12 absorption',
-                    'Increased infection risk with long-term use',
-                    'May mask stomach cancer symptoms'
-                ],
-                'contraindications': [
-                    'Known hypersensitivity to PPIs'
-                ],
-                'interactions': [
-                    'Clopidogrel: reduced effectiveness',
-                    'Warfarin: may increase INR',
-                    'Digoxin: increased levels'
-                ]
-            },
-            'metformin': {
-                'names': ['metformin', 'glucophage', 'fortamet'],
-                'category': 'Antidiabetic (Biguanide)',
-                'uses': [
-                    'Type 2 diabetes mellitus',
-                    'Polycystic ovary syndrome (PCOS)',
-                    'Prediabetes prevention'
-                ],
-                'dosage': {
-                    'adult_starting': '500mg twice daily with meals',
-                    'adult_maintenance': '1000-2000mg daily in divided doses',
-                    'maximum': '2550mg daily'
-                },
-                'side_effects': [
-                    'Nausea',
-                    'Diarrhea',
-                    'Stomach upset',
-                    'Metallic taste',
-                    'Lactic acidosis (rare but serious)'
-                ],
-                'warnings': [
-                    'Prescription only medication',
-                    'Regular blood sugar monitoring required',
-                    'Avoid alcohol',
-                    'Stop before contrast procedures',
-                    'Monitor kidney function'
-                ],
-                'contraindications': [
-                    'Severe kidney disease',
-                    'Acute heart failure',
-                    'Severe liver disease',
-                    'Diabetic ketoacidosis',
-                    'Metabolic acidosis'
-                ],
-                'interactions': [
-                    'Alcohol: increased lactic acidosis risk',
-                    'Contrast agents: kidney damage risk',
-                    'Insulin: enhanced glucose-lowering effect'
-                ]
+class LRUCache:
+    """Thread-safe bounded mapping with least-recently-used eviction and hit stats
+
+    Entries optionally expire ``ttl`` seconds after they were stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it as recently used"""
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached entry, keeping the counters"""
+        with self._lock:
+            self._data.clear()
+
+    def __getstate__(self):
+        # Entries and counters belong to the running process; a copy starts empty
+        return {'maxsize': self.maxsize, 'ttl': self.ttl}
+
+    def __setstate__(self, state):
+        self.__init__(state['maxsize'], state['ttl'])
+
+    def stats(self) -> Dict[str, float]:
+        """Snapshot of size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
             }
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton matching every catalog keyword in one pass
+
+    Entries are ``(keyword, category, value, rank)`` tuples. ``value`` is what
+    the keyword stands for (e.g. the medicine a brand name belongs to) and
+    ``rank`` orders hits within a category the way the catalog lists them.
+    Matching is plain substring matching on lowercase text.
+    """
+
+    def __init__(self, entries):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[Tuple[Tuple[str, str, str, int], ...]] = [()]
+
+        for keyword, category, value, rank in entries:
+            keyword = keyword.lower()
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append(())
+                state = next_state
+            self._outputs[state] += ((keyword, category, value, rank),)
+
+        # Breadth-first pass to wire failure links and inherit their outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._outputs[next_state] += self._outputs[self._fail[next_state]]
+
+    def scan(self, text: str) -> List[KeywordHit]:
+        """Return every keyword occurrence in text, in order of end position"""
+        return self.feed(None, text)[1]
+    
+    def feed(self, state: Optional[int], text: str, offset: int = 0) -> Tuple[int, List[KeywordHit]]:
+        """Continue a scan over text, returning the new state and the hits ending in text
+        
+        Start with ``None`` and pass each returned state on with the text that
+        follows; ``offset`` is where text starts in everything scanned so far.
+        """
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        hits = []
+        state = state or 0
+        for position, char in enumerate(text, offset):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword, category, value, rank in outputs[state]:
+                hits.append(KeywordHit(category, keyword, value, rank, position + 1 - len(keyword), position + 1))
+        return state, hits
+
+class _RankingMemo(dict):
+    """Memo of rankings keyed on the tuple of matched keywords"""
+
+    def __init__(self, rank, maxsize: int):
+        super().__init__()
+        self._rank = rank
+        self._maxsize = maxsize
+
+    def __missing__(self, matches):
+        ranking = self._rank(matches)
+        if len(self) < self._maxsize:
+            self[matches] = ranking
+        return ranking
+
+class QueryTypeClassifier:
+    """Compiled query type classifier scoring every type in one pass
+
+    All keywords are compiled into one word-bounded regular expression. Each
+    keyword carries a weight for one or more query types; the weights of every
+    match are summed and the types ranked, with ties broken by the order of the
+    keyword table. Rankings are memoized on the matched keywords, which repeat
+    heavily across real traffic.
+    """
+
+    KEYWORDS = {
+        'side_effects': {
+            'side effect': 3, 'side effects': 3, 'adverse': 3, 'reaction': 2, 'reactions': 2
+        },
+        'dosage': {
+            'dosage': 3, 'dose': 3, 'doses': 3, 'dosing': 3, 'how much': 3, 'how many': 3
+        },
+        'uses': {
+            'use': 2, 'used': 2, 'uses': 2, 'treat': 2, 'treats': 2, 'treating': 2,
+            'help': 2, 'helps': 2, 'for': 1
+        },
+        'warnings': {
+            'warning': 3, 'warnings': 3, 'caution': 3, 'precaution': 3, 'precautions': 3,
+            'danger': 3, 'dangerous': 3, 'safe': 2, 'safety': 2
+        },
+        'interactions': {
+            'interaction': 3, 'interactions': 3, 'interact': 3, 'together': 2, 'with': 1
         }
+    }
+
+    def __init__(self, keywords: Optional[Dict[str, Dict[str, int]]] = None, memo_size: int = 4096):
+        keywords = keywords or self.KEYWORDS
+        self.query_types = tuple(keywords)
+        self._table: Dict[str, Tuple[Tuple[int, int], ...]] = {}
+        for type_id, query_type in enumerate(self.query_types):
+            for keyword, weight in keywords[query_type].items():
+                self._table[keyword] = self._table.get(keyword, ()) + ((type_id, weight),)
+        self.vocabulary = frozenset(word for keyword in self._table for word in keyword.split())
+        self.max_keyword_length = max(map(len, self._table), default=0)
+
+        # Longest keywords first so "side effects" wins over "side effect"
+        alternatives = sorted(self._table, key=len, reverse=True)
+        self._pattern = re.compile(
+            r"\b(?:" + '|'.join(re.escape(keyword).replace(r'\ ', r'\s+') for keyword in alternatives) + r")\b"
+        )
+        self._rankings = _RankingMemo(self._rank_matches, memo_size)
+
+    def _rank_matches(self, matches: Tuple[str, ...]) -> Tuple[Tuple[str, int], ...]:
+        scores: Dict[int, int] = {}
+        for keyword in matches:
+            weights = self._table.get(keyword) or self._table[' '.join(keyword.split())]
+            for type_id, weight in weights:
+                scores[type_id] = scores.get(type_id, 0) + weight
+        if not scores:
+            return (('general', 0),)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return tuple((self.query_types[type_id], score) for type_id, score in ranked)
+
+    def rank(self, text: str) -> Tuple[Tuple[str, int], ...]:
+        """Return matching query types with scores, best first, for lowercase text"""
+        return self._rankings[tuple(self._pattern.findall(text))]
+
+    def rank_matches(self, matches: List[str]) -> Tuple[Tuple[str, int], ...]:
+        """Return query types with scores, best first, for keywords found by find_keywords"""
+        return self._rankings[tuple(matches)]
+    
+    def find_keywords(self, text: str, pos: int = 0, final: bool = True) -> Tuple[List[str], int]:
+        """Keywords of text from pos onwards, and the position to resume from
         
-        self.symptoms_to_medicines = {
-            'pain': ['paracetamol', 'ibuprofen', 'aspirin'],
-            'headache': ['paracetamol', 'ibuprofen', 'aspirin'],
-            'fever': ['paracetamol', 'ibuprofen', 'aspirin'],
-            'inflammation': ['ibuprofen', 'aspirin'],
-            'allergy': ['cetirizine'],
-            'hay fever': ['cetirizine'],
-            'heartburn': ['omeprazole'],
-            'acid reflux': ['omeprazole'],
-            'diabetes': ['metformin'],
-            'blood sugar': ['metformin']
+        For text scanned in pieces, as rank() would scan it whole: resuming at
+        the returned position, with at least the character before it kept in
+        text, finds the following keywords. Unless final, matches that text
+        appended later could change are left for the next call.
+        """
+        limit = len(text) if final else len(text) - self.max_keyword_length
+        keywords = []
+        for match in self._pattern.finditer(text, pos):
+            if match.start() >= limit:
+                break
+            keywords.append(match.group())
+            pos = match.end()
+        return keywords, max(pos, limit)
+    
+    def classify(self, query: NormalizedQuery) -> Tuple[Tuple[str, int], ...]:
+        """Rank query types for an already normalized query"""
+        return self.rank(query.text)
+
+    def classify_batch(self, queries: List[str]) -> List[Tuple[Tuple[str, int], ...]]:
+        """Rank query types for many raw query strings"""
+        find, rankings = self._pattern.findall, self._rankings
+        return [rankings[tuple(find(query.lower()))] for query in queries]
+
+def _freeze_value(value):
+    """Interned, immutable copy of a catalog value"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_value(item) for item in value)
+    if isinstance(value, Mapping):
+        return MappingProxyType({sys.intern(key): _freeze_value(item) for key, item in value.items()})
+    return value
+
+class MedicineRecord(Mapping):
+    """Immutable catalog entry stored in slots instead of a per-entry dict
+    
+    Strings are interned and lists become tuples, so text repeated across
+    medicines (categories, common warnings, dosage keys) is stored once.
+    Records still read like the JSON entries: ``record['uses']`` and
+    ``record.get('interactions', [])`` work as before.
+    """
+    
+    __slots__ = ('names', 'category', 'uses', 'dosage', 'side_effects',
+                 'warnings', 'contraindications', 'interactions')
+    
+    def __init__(self, entry: Mapping):
+        unknown = set(entry) - set(self.__slots__)
+        if unknown:
+            raise ValueError(f"Unknown medicine fields: {', '.join(sorted(unknown))}")
+        for name in self.__slots__:
+            object.__setattr__(self, name, _freeze_value(entry[name]) if name in entry else None)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+    
+    __delattr__ = __setattr__
+    
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        if value is None:
+            raise KeyError(key)
+        return value
+    
+    def __iter__(self):
+        return (name for name in self.__slots__ if getattr(self, name) is not None)
+    
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+    
+    def __reduce__(self):
+        # Interned strings and tuples pickle as shared objects already; only the
+        # read-only mapping views need rebuilding when loaded
+        values = (getattr(self, name) for name in self.__slots__)
+        return _restore_record, (type(self), tuple(dict(value) if isinstance(value, Mapping) else value for value in values))
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    def to_dict(self) -> Dict:
+        """Plain JSON-style copy of the entry"""
+        return {
+            name: dict(value) if isinstance(value, Mapping) else list(value) if isinstance(value, tuple) else value
+            for name, value in self.items()
+        }
+
+def _restore_record(cls, values: Tuple) -> MedicineRecord:
+    record = cls.__new__(cls)
+    for name, value in zip(cls.__slots__, values):
+        object.__setattr__(record, name, MappingProxyType(value) if isinstance(value, dict) else value)
+    return record
+
+def compact_catalog(catalog: Dict) -> Dict:
+    """Convert a JSON catalog to MedicineRecord entries with interned keys and tuples"""
+    return {
+        'medicines': {sys.intern(key): MedicineRecord(entry) for key, entry in catalog['medicines'].items()},
+        'symptoms_to_medicines': {
+            sys.intern(symptom): _freeze_value(medicines)
+            for symptom, medicines in catalog['symptoms_to_medicines'].items()
+        },
+        'danger_keywords': _freeze_value(catalog['danger_keywords'])
+    }
+
+def freeze_for_fork() -> int:
+    """Collect garbage, then move every surviving object into the permanent generation
+    
+    Call once in the parent process after the knowledge base is loaded and
+    before workers fork. Frozen objects are never traversed by the cyclic
+    collector, so workers stop writing to the shared pages holding the catalog.
+    Returns the number of frozen objects.
+    """
+    gc.collect()
+    gc.freeze()
+    return gc.get_freeze_count()
+
+class SymptomIndex:
+    """Inverted index from symptoms to the medicines that treat them
+    
+    Ranking order is most query symptoms covered, then the lowest summed
+    position in those symptoms' lists, then catalog order. The three keys are
+    packed into one integer: every posting carries
+    ``COVERAGE_UNIT - (position << 24)`` and each medicine adds its catalog
+    tie-break once, so ``rank`` is a single pass of dict additions over the
+    query's posting lists followed by a heap selection of the top k.
+    """
+    
+    COVERAGE_UNIT = 1 << 48
+    
+    def __init__(self, symptoms_to_medicines: Mapping, medicines):
+        self._medicines: List[str] = list(medicines)
+        ids = {medicine: medicine_id for medicine_id, medicine in enumerate(self._medicines)}
+        self._tie_break = [(1 << 24) - 1 - medicine_id for medicine_id in range(len(self._medicines))]
+        self._postings: Dict[str, Dict[int, int]] = {
+            symptom: {
+                ids[medicine]: self.COVERAGE_UNIT - (position << 24)
+                for position, medicine in enumerate(treatments) if medicine in ids
+            }
+            for symptom, treatments in symptoms_to_medicines.items()
         }
+    
+    def __len__(self) -> int:
+        return len(self._postings)
+    
+    def rank(self, symptoms: List[str], k: int = SYMPTOM_TOP_K) -> List[SymptomMatch]:
+        """Top k medicines for the symptoms, best coverage first"""
+        symptoms = [symptom for symptom in dict.fromkeys(symptoms) if symptom in self._postings]
+        tie_break = self._tie_break
+        scores: Dict[int, int] = {}
+        get = scores.get
+        for symptom in symptoms:
+            for medicine_id, weight in self._postings[symptom].items():
+                scores[medicine_id] = get(medicine_id, tie_break[medicine_id]) + weight
         
-        self.danger_keywords = [
-            'overdose', 'suicide', 'kill', 'death', 'emergency',
-            'chest pain', 'heart attack', 'stroke', 'bleeding',
-            'severe allergic reaction', 'anaphylaxis', 'unconscious',
-            'too many pills', 'too much medicine', 'poisoning',
-            'can\'t breathe', 'difficulty breathing', 'choking',
-            'severe pain', 'blood in vomit', 'blood in stool',
-            'seizure', 'convulsions', 'loss of consciousness'
+        best = heapq.nlargest(k, scores.items(), key=itemgetter(1))
+        return [
+            SymptomMatch(
+                self._medicines[medicine_id],
+                tuple(symptom for symptom in symptoms if medicine_id in self._postings[symptom])
+            )
+            for medicine_id, _ in best
         ]
 
+class InteractionGraph:
+    """Undirected interaction graph over catalog medicines and the agents they list
+    
+    Built once from the catalog. Nodes are catalog keys or lowercased agent
+    names; each node maps its neighbours to the interactions between them, so
+    checking a medication list intersects each node's neighbours with the
+    list instead of scanning interaction text.
+    """
+    
+    def __init__(self, medicines: Mapping):
+        aliases, interactions = parse_interactions(medicines)
+        self._aliases = aliases
+        self._names = FuzzyNameIndex(aliases.items(), min_ratio=INTERACTION_MATCH_RATIO)
+        edges: Dict[str, Dict[str, list]] = {}
+        for interaction in interactions:
+            first, second = interaction.medicines
+            edges.setdefault(first, {}).setdefault(second, []).append(interaction)
+            edges.setdefault(second, {}).setdefault(first, []).append(interaction)
+        self._edges: Dict[str, Dict[str, Tuple[Interaction, ...]]] = {
+            node: {other: tuple(found) for other, found in neighbours.items()}
+            for node, neighbours in edges.items()
+        }
+        self.interaction_count = len(interactions)
+    
+    def resolve(self, name: str) -> Optional[str]:
+        """Graph node for a medicine or brand name, tolerating misspellings"""
+        name = ' '.join(name.lower().split())
+        return self._aliases.get(name) or self._names.lookup(name)
+    
+    def find(self, nodes: List[str]) -> List[Interaction]:
+        """Every interaction between any two of the nodes, in list order"""
+        position: Dict[str, int] = {}
+        for node in nodes:
+            position.setdefault(node, len(position))
+        
+        found = []
+        for node, index in position.items():
+            neighbours = self._edges.get(node)
+            if not neighbours:
+                continue
+            for other in sorted(neighbours.keys() & position.keys(), key=position.__getitem__):
+                if position[other] > index:
+                    found.extend(neighbours[other])
+        return found
+
+class CatalogIndex:
+    """Catalog order and category postings for paging through medicines
+    
+    Keeps the medicine keys in catalog order, each key's position, and for
+    every (case-insensitive) category the sorted positions of its medicines.
+    ``entries`` resumes after any key without scanning the entries before it
+    and yields records one at a time, so listing pages cost the same no
+    matter how large the catalog is.
+    """
+    
+    def __init__(self, medicines: Mapping, categories: Optional[Iterable[str]] = None):
+        self._medicines = medicines
+        self.keys: Tuple[str, ...] = tuple(medicines)
+        self.position: Dict[str, int] = {key: position for position, key in enumerate(self.keys)}
+        if categories is None:
+            categories = (data['category'] for data in medicines.values())
+        postings: Dict[str, List[int]] = {}
+        for position, category in enumerate(categories):
+            postings.setdefault(category.lower(), []).append(position)
+        self.categories: Dict[str, Tuple[int, ...]] = {
+            category: tuple(positions) for category, positions in postings.items()
+        }
+    
+    def count(self, category: Optional[str] = None) -> int:
+        """Number of medicines, optionally within one category"""
+        if category is None:
+            return len(self.keys)
+        return len(self.categories.get(category.lower(), ()))
+    
+    def entries(self, category: Optional[str] = None, after: Optional[str] = None) -> Iterator[Tuple[str, Mapping]]:
+        """Yield (key, record) in catalog order, starting after the given key
+        
+        Raises KeyError when ``after`` is not in the catalog.
+        """
+        start = self.position[after] + 1 if after is not None else 0
+        if category is None:
+            positions = range(start, len(self.keys))
+        else:
+            postings = self.categories.get(category.lower(), ())
+            positions = islice(postings, bisect_left(postings, start), None)
+        keys, medicines = self.keys, self._medicines
+        return ((keys[position], medicines[keys[position]]) for position in positions)
+
+# Serializes first-use index builds so concurrent requests build each index once
+_index_build_lock = threading.RLock()
+
+class MedicalKnowledgeBase:
+    """Comprehensive medical knowledge base with safety checks
+    
+    The catalog is loaded from a JSON source file into compact, immutable
+    MedicineRecord entries, or lazily from a compiled binary snapshot when
+    the path ends in ``.mkb``. JSON catalogs build every derived index up
+    front; snapshots build each index on first use, so opening one is cheap
+    but the first queries in each process pay for the indexes they touch.
+    """
+    
+    # Whether records are read from storage on each access; per-record work
+    # such as response precompilation is skipped for such engines
+    records_on_demand = False
+    
+    # Derived indexes, each built by the matching ``_build_<name>`` method
+    INDEXES = ('name_index', 'phrase_indexes', 'keywords', 'symptom_index', 'interactions', 'catalog_index')
+    
+    def __init__(self, source: Optional[str] = None):
+        source = source or KNOWLEDGE_BASE_PATH
+        self.source = source
+        
+        if source.endswith(SNAPSHOT_SUFFIX):
+            snapshot = KnowledgeBaseSnapshot(source)
+            self.medicines = snapshot.medicines
+            self.symptoms_to_medicines = snapshot.symptoms_to_medicines
+            self.danger_keywords = snapshot.danger_keywords
+            self._snapshot_version = snapshot.version
+            self.records_on_demand = True
+        else:
+            with open(source, encoding='utf-8') as f:
+                catalog = compact_catalog(json.load(f))
+            self.medicines = catalog['medicines']
+            self.symptoms_to_medicines = catalog['symptoms_to_medicines']
+            self.danger_keywords = catalog['danger_keywords']
+            self._snapshot_version = None
+        
+        self._build_indexes()
+    
+    def __getattr__(self, name):
+        # Only reached for indexes a snapshot-backed catalog has not built yet
+        if name not in MedicalKnowledgeBase.INDEXES:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        with _index_build_lock:
+            index = self.__dict__.get(name)
+            if index is None:
+                index = getattr(self, f'_build_{name}')()
+                self.__dict__[name] = index
+        return index
+    
+    def refresh(self):
+        """Rebuild derived indexes and the version after editing the catalog"""
+        self._build_indexes()
+    
+    def ensure_indexes(self):
+        """Build every derived index that has not been built yet
+        
+        Call before pickling a snapshot-backed state or forking workers, so
+        the indexes are saved or shared instead of rebuilt in each process.
+        """
+        for name in self.INDEXES:
+            getattr(self, name)
+        self._outline = None
+    
+    def _build_indexes(self):
+        """Set the version and build (or, for snapshots, defer) the derived indexes"""
+        # Content hash identifying this catalog for caches built on top of it;
+        # snapshots carry the hash computed when they were compiled
+        self.version = self._snapshot_version or catalog_version({
+            'medicines': self.medicines,
+            'symptoms_to_medicines': self.symptoms_to_medicines,
+            'danger_keywords': self.danger_keywords
+        })
+        
+        with _index_build_lock:
+            self._outline = None
+            for name in self.INDEXES:
+                self.__dict__.pop(name, None)
+        if not self.records_on_demand:
+            self.ensure_indexes()
+    
+    def _catalog_outline(self) -> Tuple[Dict[str, Dict[str, Tuple[str, ...]]], List[str]]:
+        """Names and interactions per medicine, and categories in catalog order
+        
+        Decoded in one pass and kept until every index is built; snapshot
+        records are decoded on each access, so the indexes read this instead.
+        """
+        if self._outline is None:
+            outline: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+            categories = []
+            for medicine, data in self.medicines.items():
+                outline[medicine] = {'names': data['names'], 'interactions': data.get('interactions', ())}
+                categories.append(data['category'])
+            self._outline = (outline, categories)
+        return self._outline
+    
+    def _build_name_index(self) -> FuzzyNameIndex:
+        outline, _ = self._catalog_outline()
+        return FuzzyNameIndex((name, medicine) for medicine, data in outline.items() for name in data['names'])
+    
+    def _build_phrase_indexes(self) -> Dict[int, FuzzyNameIndex]:
+        # Multi-word names, symptoms and danger phrases, one index per word count
+        # so a phrase correction never swallows or invents neighbouring words
+        outline, _ = self._catalog_outline()
+        phrases: Dict[int, List[Tuple[str, str]]] = {}
+        for medicine, data in outline.items():
+            for name in data['names']:
+                phrases.setdefault(len(name.split()), []).append((name, medicine))
+        for phrase in list(self.symptoms_to_medicines) + list(self.danger_keywords):
+            phrases.setdefault(len(phrase.split()), []).append((phrase, phrase))
+        return {
+            size: FuzzyNameIndex(entries, min_ratio=PHRASE_MATCH_RATIO)
+            for size, entries in phrases.items()
+            if 1 < size <= NormalizedQuery.MAX_NGRAM
+        }
+    
+    def _build_keywords(self) -> KeywordAutomaton:
+        outline, _ = self._catalog_outline()
+        entries = [(keyword, 'danger', keyword, rank) for rank, keyword in enumerate(self.danger_keywords)]
+        for rank, (medicine, data) in enumerate(outline.items()):
+            entries.extend((name, 'medicine', medicine, rank) for name in data['names'])
+        entries.extend((symptom, 'symptom', symptom, rank) for rank, symptom in enumerate(self.symptoms_to_medicines))
+        return KeywordAutomaton(entries)
+    
+    def _build_symptom_index(self) -> SymptomIndex:
+        outline, _ = self._catalog_outline()
+        return SymptomIndex(self.symptoms_to_medicines, outline)
+    
+    def _build_interactions(self) -> InteractionGraph:
+        outline, _ = self._catalog_outline()
+        return InteractionGraph(outline)
+    
+    def _build_catalog_index(self) -> CatalogIndex:
+        _, categories = self._catalog_outline()
+        return CatalogIndex(self.medicines, categories)
+
 class MedicalQueryProcessor:
     """Advanced medical query processing with NLP and safety checks"""
     
-    def __init__(self, knowledge_base: MedicalKnowledgeBase):
+    FILLER_WORDS = frozenset(['um', 'uh', 'like', 'well', 'so', 'actually'])
+    FILLER_PHRASES = frozenset([('you', 'know')])
+    
+    def __init__(self, knowledge_base: MedicalKnowledgeBase, correction_cache_size: int = CORRECTION_CACHE_SIZE):
         self.kb = knowledge_base
+        self.correction_cache = LRUCache(correction_cache_size)
+        self.classifier = QueryTypeClassifier()
+        # Words of danger keywords and symptoms are kept as typed, so "choking"
+        # is never rewritten into a medicine name and loses its emergency flag
+        self.protected_words = frozenset(
+            word
+            for phrase in list(knowledge_base.danger_keywords) + list(knowledge_base.symptoms_to_medicines)
+            for word in phrase.lower().split()
+        ) | self.classifier.vocabulary
         
     def clean_query(self, query: str) -> str:
         """Clean and normalize the input query"""
-        # Remove filler words
-        filler_words = ['um', 'uh', 'like', 'you know', 'well', 'so', 'actually']
-        words = query.lower().split()
-        cleaned_words = [word for word in words if word not in filler_words]
-        
-        # Medical term corrections using fuzzy matching
-        corrected_words = []
-        for word in cleaned_words:
-            best_match = self._find_best_medicine_match(word)
-            corrected_words.append(best_match if best_match else word)
+        return self.normalize_query(query).text
+    
+    def normalize_query(self, query: str) -> NormalizedQuery:
+        """Clean, spell-correct and tokenize the query once for every analysis stage"""
+        raw = NormalizedQuery.from_text(query)
+        cleaned_words, _ = self._remove_fillers(raw.tokens)
+        corrected_words, _ = self._correct_words(cleaned_words)
+        normalized = NormalizedQuery.from_tokens(corrected_words)
         
-        return ' '.join(corrected_words)
+        # Match danger keywords, medicine names and symptoms in a single pass
+        normalized.hits = self.kb.keywords.scan(normalized.text)
+        return normalized
     
-    def _find_best_medicine_match(self, word: str) -> Optional[str]:
-        """Find the best matching medicine name using fuzzy matching"""
-        best_match = None
-        best_ratio = 0.6  # Minimum similarity threshold
+    def _remove_fillers(self, tokens: List[str], final: bool = True) -> Tuple[List[str], int]:
+        """Remove filler words and phrases, returning the kept words and the tokens consumed
         
-        for medicine, data in self.kb.medicines.items():
-            for name in data['names']:
-                ratio = SequenceMatcher(None, word.lower(), name.lower()).ratio()
-                if ratio > best_ratio:
-                    best_ratio = ratio
-                    best_match = medicine
+        Unless final, the last token is left alone while the next one could
+        make it part of a filler phrase.
+        """
+        cleaned_words = []
+        i = 0
+        while i < len(tokens) and (final or i + 1 < len(tokens)):
+            if tuple(tokens[i:i + 2]) in self.FILLER_PHRASES:
+                i += 2
+                continue
+            if tokens[i] not in self.FILLER_WORDS:
+                cleaned_words.append(tokens[i])
+            i += 1
+        return cleaned_words, i
+    
+    def _correct_words(self, words: List[str], final: bool = True) -> Tuple[List[str], int]:
+        """Medical term corrections using fuzzy matching, longest phrases first
         
-        return best_match
+        Returns the corrected words and the number of words consumed. Unless
+        final, words are left alone while a longer phrase could still start at them.
+        """
+        phrase_sizes = sorted(self.kb.phrase_indexes, reverse=True)
+        lookahead = phrase_sizes[0] if phrase_sizes and not final else 1
+        corrected_words = []
+        i = 0
+        while i + lookahead <= len(words):
+            for size in phrase_sizes:
+                if i + size <= len(words):
+                    phrase_match = self._find_best_phrase_match(' '.join(words[i:i + size]), size)
+                    if phrase_match:
+                        corrected_words.extend(phrase_match.split())
+                        i += size
+                        break
+            else:
+                # Query-type keywords such as "dose" and danger or symptom words are
+                # never rewritten into medicine names
+                word = words[i]
+                best_match = None if word in self.protected_words else self._find_best_medicine_match(word)
+                corrected_words.append(best_match if best_match else word)
+                i += 1
+        return corrected_words, i
+    
+    def _find_best_medicine_match(self, word: str) -> Optional[str]:
+        """Find the best matching medicine name using the prebuilt name index"""
+        word = word.lower()
+        match = self.correction_cache.get(word, _MISSING)
+        if match is _MISSING:
+            match = self.kb.name_index.lookup(word)
+            self.correction_cache.put(word, match)
+        return match
+    
+    def _find_best_phrase_match(self, phrase: str, size: int) -> Optional[str]:
+        """Find the best matching multi-word phrase with the same number of words"""
+        match = self.correction_cache.get(phrase, _MISSING)
+        if match is _MISSING:
+            match = self.kb.phrase_indexes[size].lookup(phrase)
+            self.correction_cache.put(phrase, match)
+        return match
+    
+    def session(self, on_danger=None) -> 'AnalysisSession':
+        """Start an incremental analysis of a transcript that arrives word by word"""
+        return AnalysisSession(self, on_danger)
     
     def analyze_query(self, query: str) -> MedicalQuery:
         """Analyze the medical query and extract relevant information"""
-        cleaned_query = self.clean_query(query)
+        normalized = self.normalize_query(query)
         
         # Check for safety flags
-        safety_flags = self._check_safety_flags(cleaned_query)
+        safety_flags = self._check_safety_flags(normalized)
         
         # Extract medicine names
-        medicine = self._extract_medicine(cleaned_query)
+        medicine = self._extract_medicine(normalized)
         
         # Extract symptoms
-        symptoms = self._extract_symptoms(cleaned_query)
+        symptoms = self._extract_symptoms(normalized)
         
         # Determine query type
-        query_type = self._determine_query_type(cleaned_query)
+        query_type = self._determine_query_type(normalized)
         
         # Determine intent
-        intent = self._determine_intent(cleaned_query, medicine, symptoms)
+        intent = self._determine_intent(normalized, medicine, symptoms)
         
         # Calculate confidence
         confidence = self._calculate_confidence(medicine, symptoms, query_type)
         
         return MedicalQuery(
             original_text=query,
-            cleaned_text=cleaned_query,
+            cleaned_text=normalized.text,
             intent=intent,
             medicine=medicine,
             symptoms=symptoms,
@@ -384,46 +875,33 @@ class MedicalQueryProcessor:
             safety_flags=safety_flags
         )
     
-    def _check_safety_flags(self, query: str) -> List[str]:
+    @staticmethod
+    def _ranked_values(hits: List[KeywordHit], category: str) -> List[str]:
+        """Distinct hit values of a category in catalog order"""
+        ranked = {}
+        for hit in hits:
+            if hit.category == category:
+                ranked.setdefault(hit.value, hit.rank)
+        return sorted(ranked, key=ranked.get)
+    
+    def _check_safety_flags(self, query: NormalizedQuery) -> List[str]:
         """Check for dangerous keywords that require immediate medical attention"""
-        flags = []
-        for keyword in self.kb.danger_keywords:
-            if keyword in query.lower():
-                flags.append(keyword)
-        return flags
+        return self._ranked_values(query.hits, 'danger')
     
-    def _extract_medicine(self, query: str) -> Optional[str]:
+    def _extract_medicine(self, query: NormalizedQuery) -> Optional[str]:
         """Extract medicine name from query"""
-        for medicine, data in self.kb.medicines.items():
-            for name in data['names']:
-                if name in query.lower():
-                    return medicine
-        return None
+        medicines = self._ranked_values(query.hits, 'medicine')
+        return medicines[0] if medicines else None
     
-    def _extract_symptoms(self, query: str) -> List[str]:
+    def _extract_symptoms(self, query: NormalizedQuery) -> List[str]:
         """Extract symptoms from query"""
-        symptoms = []
-        for symptom in self.kb.symptoms_to_medicines.keys():
-            if symptom in query.lower():
-                symptoms.append(symptom)
-        return symptoms
+        return self._ranked_values(query.hits, 'symptom')
     
-    def _determine_query_type(self, query: str) -> str:
+    def _determine_query_type(self, query: NormalizedQuery) -> str:
         """Determine the type of query"""
-        if any(word in query for word in ['side effect', 'adverse', 'reaction']):
-            return 'side_effects'
-        elif any(word in query for word in ['dosage', 'dose', 'how much', 'how many']):
-            return 'dosage'
-        elif any(word in query for word in ['use', 'for', 'treat', 'help']):
-            return 'uses'
-        elif any(word in query for word in ['warning', 'caution', 'safe', 'danger']):
-            return 'warnings'
-        elif any(word in query for word in ['interaction', 'together', 'with']):
-            return 'interactions'
-        else:
-            return 'general'
+        return self.classifier.classify(query)[0][0]
     
-    def _determine_intent(self, query: str, medicine: Optional[str], symptoms: List[str]) -> str:
+    def _determine_intent(self, query: NormalizedQuery, medicine: Optional[str], symptoms: List[str]) -> str:
         """Determine the user's intent"""
         if medicine:
             return 'medicine_info'
@@ -445,14 +923,188 @@ class MedicalQueryProcessor:
         
         return min(confidence, 1.0)
 
+class AnalysisSession:
+    """Incremental analysis of a transcript growing word by word
+    
+    Speech recognizers emit partial transcripts long before an utterance
+    ends. Each stage of the analysis holds back only the last few words it
+    may still rewrite: a possible filler phrase, a possible misspelled
+    phrase, a possible query type keyword. Everything before them is final
+    and is never looked at again, so appending a word takes amortized
+    constant time and analyze() is cheap at any point, including when the
+    utterance is complete.
+    
+    ``on_danger`` is called with each danger keyword as soon as the analysis
+    of the words so far contains it, which may be before the user stops
+    talking. The analysis always equals ``analyze_query`` of the appended
+    texts joined with spaces.
+    """
+    
+    def __init__(self, processor: MedicalQueryProcessor, on_danger=None):
+        self.processor = processor
+        self.on_danger = on_danger
+        self.alerted: List[str] = []
+        self._texts: List[str] = []
+        self._tokens: List[str] = []
+        self._words: List[str] = []
+        self._corrected: List[str] = []
+        self._length = 0
+        self._scan_state = None
+        self._ranked: Dict[str, Dict[str, int]] = {'danger': {}, 'medicine': {}, 'symptom': {}}
+        self._type_text = ''
+        self._type_pos = 0
+        self._type_keywords: List[str] = []
+        self._tail_result: Optional[Tuple[List[str], str, List[KeywordHit]]] = None
+    
+    def append(self, text: str):
+        """Add the next words of the transcript"""
+        self._texts.append(text)
+        self._tail_result = None
+        self._tokens.extend(_TOKEN_PATTERN.findall(text.lower().replace('\u2019', "'")))
+        cleaned, used = self.processor._remove_fillers(self._tokens, final=False)
+        del self._tokens[:used]
+        self._words.extend(cleaned)
+        corrected, used = self.processor._correct_words(self._words, final=False)
+        del self._words[:used]
+        
+        hits = self._commit(corrected)
+        if self.on_danger is not None:
+            # Words held back count too, so a danger phrase alerts on its last word
+            for hit in hits + self._tail()[2]:
+                if hit.category == 'danger' and hit.value not in self.alerted:
+                    self.alerted.append(hit.value)
+                    self.on_danger(hit.value)
+    
+    def _commit(self, words: List[str]) -> List[KeywordHit]:
+        """Extend the final part of the normalized text, returning its new keyword hits"""
+        if not words:
+            return []
+        text = ' '.join(words)
+        if self._corrected:
+            text = ' ' + text
+        self._corrected.extend(words)
+        self._scan_state, hits = self.processor.kb.keywords.feed(self._scan_state, text, self._length)
+        self._length += len(text)
+        for hit in hits:
+            self._ranked[hit.category].setdefault(hit.value, hit.rank)
+        
+        # Keep the query type scan window to the keywords that may still match
+        keywords, pos = self.processor.classifier.find_keywords(self._type_text + text, self._type_pos, final=False)
+        self._type_keywords.extend(keywords)
+        self._type_text = (self._type_text + text)[max(pos - 1, 0):]
+        self._type_pos = min(pos, 1)
+        return hits
+    
+    def _tail(self) -> Tuple[List[str], str, List[KeywordHit]]:
+        """Words held back, corrected as if the utterance ended now, with their text and keyword hits"""
+        if self._tail_result is None:
+            cleaned, _ = self.processor._remove_fillers(self._tokens)
+            words, _ = self.processor._correct_words(self._words + cleaned)
+            text = ' '.join(words)
+            if text and self._corrected:
+                text = ' ' + text
+            _, hits = self.processor.kb.keywords.feed(self._scan_state, text, self._length)
+            self._tail_result = (words, text, hits)
+        return self._tail_result
+    
+    def analyze(self) -> MedicalQuery:
+        """Analysis of the transcript so far"""
+        words, text, hits = self._tail()
+        ranked = {category: dict(values) for category, values in self._ranked.items()}
+        for hit in hits:
+            ranked[hit.category].setdefault(hit.value, hit.rank)
+        safety_flags, medicines, symptoms = (
+            sorted(ranked[category], key=ranked[category].get) for category in ('danger', 'medicine', 'symptom')
+        )
+        keywords, _ = self.processor.classifier.find_keywords(self._type_text + text, self._type_pos)
+        query_type = self.processor.classifier.rank_matches(self._type_keywords + keywords)[0][0]
+        medicine = medicines[0] if medicines else None
+        
+        return MedicalQuery(
+            original_text=' '.join(self._texts),
+            cleaned_text=' '.join(self._corrected + words),
+            intent=self.processor._determine_intent(None, medicine, symptoms),
+            medicine=medicine,
+            symptoms=symptoms,
+            query_type=query_type,
+            confidence=self.processor._calculate_confidence(medicine, symptoms, query_type),
+            safety_flags=safety_flags
+        )
+
+# Fixed response texts; the API sends them as pre-encoded JSON fragments
+EMERGENCY_TEXT = """
+        🚨 MEDICAL EMERGENCY DETECTED 🚨
+        
+        If you are experiencing a medical emergency, please:
+        1. Call emergency services immediately (911 in US, 999 in UK, 112 in EU)
+        2. Contact your local poison control center if this involves overdose
+        3. Seek immediate medical attention at the nearest hospital
+        
+        This AI assistant cannot provide emergency medical care. Please contact healthcare professionals immediately.
+        """
+
+EMERGENCY_DISCLAIMER = 'This is an emergency situation requiring immediate professional medical care.'
+
+STANDARD_DISCLAIMER = """
+        ⚠️ MEDICAL DISCLAIMER: This information is for educational purposes only and is not a substitute for professional medical advice, diagnosis, or treatment. Always seek the advice of your physician or other qualified health provider with any questions you may have regarding a medical condition. Never disregard professional medical advice or delay in seeking it because of something you have read here.
+        """
+
 class MedicalResponseGenerator:
     """Generate comprehensive medical responses with safety checks"""
     
-    def __init__(self, knowledge_base: MedicalKnowledgeBase):
+    MEDICINE_QUERY_TYPES = ('uses', 'dosage', 'side_effects', 'warnings', 'interactions', 'general')
+    
+    def __init__(self, knowledge_base: MedicalKnowledgeBase,
+                 cache_size: int = RESPONSE_CACHE_SIZE, cache_ttl: Optional[float] = RESPONSE_CACHE_TTL,
+                 precompile: bool = PRECOMPILE_RESPONSES):
         self.kb = knowledge_base
+        self.precompile = precompile
+        self.response_cache = LRUCache(cache_size, ttl=cache_ttl)
+        self._cache_version = knowledge_base.version
+        self._compile_templates()
         
     def generate_response(self, query: MedicalQuery) -> MedicalResponse:
-        """Generate a comprehensive medical response"""
+        """Generate a comprehensive medical response
+        
+        Responses are cached on the analysis signature and shared between
+        callers, so they must be treated as read-only.
+        """
+        if self._cache_version != self.kb.version:
+            self.response_cache.clear()
+            self._compile_templates()
+            self._cache_version = self.kb.version
+        
+        signature = (
+            query.intent, query.medicine, query.query_type,
+            tuple(query.symptoms), tuple(query.safety_flags), query.confidence
+        )
+        response = self.response_cache.get(signature)
+        if response is None:
+            response = self._render_response(query)
+            self.response_cache.put(signature, response)
+        return response
+    
+    def _compile_templates(self):
+        """Pre-render the answer body for every medicine and query type"""
+        if not self.precompile:
+            self._templates = {}
+            self.template_report = {'enabled': False, 'templates': 0, 'build_ms': 0.0, 'bytes': 0}
+            return
+        
+        start = time.perf_counter()
+        templates = {}
+        for medicine, data in self.kb.medicines.items():
+            for query_type in self.MEDICINE_QUERY_TYPES:
+                templates[(medicine, query_type)] = '\n'.join(self._render_medicine_sections(medicine, data, query_type))
+        build_ms = (time.perf_counter() - start) * 1000
+        
+        # Strings plus the key tuples and the dict itself; medicine names are shared with the catalog
+        size = sys.getsizeof(templates) + sum(sys.getsizeof(key) + sys.getsizeof(text) for key, text in templates.items())
+        self._templates = templates
+        self.template_report = {'enabled': True, 'templates': len(templates), 'build_ms': round(build_ms, 3), 'bytes': size}
+    
+    def _render_response(self, query: MedicalQuery) -> MedicalResponse:
+        """Render the response for an analyzed query"""
         
         # Handle emergency situations first
         if query.safety_flags:
@@ -468,24 +1120,13 @@ class MedicalResponseGenerator:
     
     def _generate_emergency_response(self, query: MedicalQuery) -> MedicalResponse:
         """Generate emergency response for dangerous queries"""
-        emergency_text = """
-        🚨 MEDICAL EMERGENCY DETECTED 🚨
-        
-        If you are experiencing a medical emergency, please:
-        1. Call emergency services immediately (911 in US, 999 in UK, 112 in EU)
-        2. Contact your local poison control center if this involves overdose
-        3. Seek immediate medical attention at the nearest hospital
-        
-        This AI assistant cannot provide emergency medical care. Please contact healthcare professionals immediately.
-        """
-        
         return MedicalResponse(
-            text=emergency_text,
+            text=EMERGENCY_TEXT,
             response_type='emergency',
             confidence=1.0,
             sources=['Emergency Protocol'],
             warnings=['SEEK IMMEDIATE MEDICAL ATTENTION'],
-            disclaimer='This is an emergency situation requiring immediate professional medical care.'
+            disclaimer=EMERGENCY_DISCLAIMER
         )
     
     def _generate_medicine_response(self, query: MedicalQuery) -> MedicalResponse:
@@ -495,35 +1136,51 @@ class MedicalResponseGenerator:
             return self._generate_unknown_medicine_response(query)
         
         medicine_name = query.medicine.capitalize()
-        response_parts = []
+        response_text = self._templates.get((query.medicine, query.query_type))
+        if response_text is None:
+            response_text = '\n'.join(self._render_medicine_sections(query.medicine, medicine_data, query.query_type))
+        
+        return MedicalResponse(
+            text=response_text,
+            response_type='medicine_info',
+            confidence=query.confidence,
+            sources=[f'Medical Database - {medicine_name}'],
+            warnings=list(medicine_data['warnings'][:2]),
+            disclaimer=self._get_standard_disclaimer()
+        )
+    
+    def _render_medicine_sections(self, medicine: str, medicine_data: Dict, query_type: str) -> Tuple[str, ...]:
+        """Render the header, query-specific and contraindication sections about a medicine"""
+        medicine_name = medicine.capitalize()
         
         # Basic information
-        response_parts.append(f"**{medicine_name}** ({medicine_data['category']})")
+        sections = [f"**{medicine_name}** ({medicine_data['category']})"]
+        response_parts = []
         
         # Query-specific information
-        if query.query_type == 'uses':
+        if query_type == 'uses':
             response_parts.append(f"\n**Uses:** {medicine_name} is commonly used for:")
             for use in medicine_data['uses']:
                 response_parts.append(f"• {use}")
                 
-        elif query.query_type == 'dosage':
+        elif query_type == 'dosage':
             response_parts.append(f"\n**Dosage Information:**")
             for age_group, dosage in medicine_data['dosage'].items():
                 response_parts.append(f"• {age_group.replace('_', ' ').title()}: {dosage}")
             response_parts.append("\n⚠️ Always follow your doctor's instructions or package directions.")
             
-        elif query.query_type == 'side_effects':
+        elif query_type == 'side_effects':
             response_parts.append(f"\n**Possible Side Effects:**")
             for effect in medicine_data['side_effects']:
                 response_parts.append(f"• {effect}")
             response_parts.append("\n⚠️ Contact your healthcare provider if you experience severe side effects.")
             
-        elif query.query_type == 'warnings':
+        elif query_type == 'warnings':
             response_parts.append(f"\n**Important Warnings:**")
             for warning in medicine_data['warnings']:
                 response_parts.append(f"• {warning}")
                 
-        elif query.query_type == 'interactions':
+        elif query_type == 'interactions':
             response_parts.append(f"\n**Drug Interactions:**")
             for interaction in medicine_data.get('interactions', []):
                 response_parts.append(f"• {interaction}")
@@ -533,39 +1190,36 @@ class MedicalResponseGenerator:
             response_parts.append(f"\n**Uses:** {', '.join(medicine_data['uses'][:3])}")
             response_parts.append(f"\n**Typical Dosage:** {list(medicine_data['dosage'].values())[0]}")
             response_parts.append(f"\n**Key Warnings:** {medicine_data['warnings'][0]}")
+        sections.append('\n'.join(response_parts))
         
         # Contraindications
         if medicine_data.get('contraindications'):
-            response_parts.append(f"\n**Contraindications:** Do not use if you have:")
+            contraindications = [f"\n**Contraindications:** Do not use if you have:"]
             for contra in medicine_data['contraindications']:
-                response_parts.append(f"• {contra}")
+                contraindications.append(f"• {contra}")
+            sections.append('\n'.join(contraindications))
         
-        response_text = '\n'.join(response_parts)
-        
-        return MedicalResponse(
-            text=response_text,
-            response_type='medicine_info',
-            confidence=query.confidence,
-            sources=[f'Medical Database - {medicine_name}'],
-            warnings=medicine_data['warnings'][:2],
-            disclaimer=self._get_standard_disclaimer()
-        )
+        return tuple(sections)
     
     def _generate_symptom_response(self, query: MedicalQuery) -> MedicalResponse:
         """Generate response for symptom-based queries"""
         response_parts = []
         response_parts.append("Based on your symptoms, here are some treatment options:")
         
-        all_medicines = set()
-        for symptom in query.symptoms:
-            medicines = self.kb.symptoms_to_medicines.get(symptom, [])
-            all_medicines.update(medicines)
-            
-            if medicines:
-                response_parts.append(f"\n**For {symptom}:**")
-                for medicine in medicines:
-                    medicine_data = self.kb.medicines[medicine]
-                    response_parts.append(f"• {medicine.capitalize()} - {medicine_data['category']}")
+        matches = self.kb.symptom_index.rank(query.symptoms, SYMPTOM_TOP_K)
+        if len(query.symptoms) == 1:
+            if matches:
+                response_parts.append(f"\n**For {query.symptoms[0]}:**")
+            for match in matches:
+                medicine_data = self.kb.medicines[match.medicine]
+                response_parts.append(f"• {match.medicine.capitalize()} - {medicine_data['category']}")
+        elif matches:
+            response_parts.append("\n**Best matches for your symptoms:**")
+            for match in matches:
+                medicine_data = self.kb.medicines[match.medicine]
+                response_parts.append(
+                    f"• {match.medicine.capitalize()} - {medicine_data['category']} (for {', '.join(match.symptoms)})"
+                )
         
         # Add general advice
         response_parts.append(f"\n**General Advice:**")
@@ -640,14 +1294,493 @@ class MedicalResponseGenerator:
     
     def _get_standard_disclaimer(self) -> str:
         """Get standard medical disclaimer"""
-        return """
-        ⚠️ MEDICAL DISCLAIMER: This information is for educational purposes only and is not a substitute for professional medical advice, diagnosis, or treatment. Always seek the advice of your physician or other qualified health provider with any questions you may have regarding a medical condition. Never disregard professional medical advice or delay in seeking it because of something you have read here.
-        """
+        return STANDARD_DISCLAIMER
 
 # Initialize components
-knowledge_base = MedicalKnowledgeBase()
-query_processor = MedicalQueryProcessor(knowledge_base)
-response_generator = MedicalResponseGenerator(knowledge_base)
+def load_knowledge_base(source: Optional[str] = None):
+    """Open a knowledge base with the engine matching the source file type
+    
+    ``.sqlite``/``.db`` files are served by the SQLite engine, which queries the
+    catalog on demand; JSON and ``.mkb`` snapshots use MedicalKnowledgeBase.
+    """
+    source = source or KNOWLEDGE_BASE_PATH
+    if source.endswith(SQLITE_SUFFIXES):
+        from medical_kb_sqlite import SQLiteKnowledgeBase
+        return SQLiteKnowledgeBase(source)
+    return MedicalKnowledgeBase(source)
+
+@dataclass(frozen=True)
+class ServingState:
+    """Knowledge base and the processor and generator built on it, swapped as one unit"""
+    knowledge_base: MedicalKnowledgeBase
+    query_processor: MedicalQueryProcessor
+    response_generator: MedicalResponseGenerator
+    loaded_at: str
+    
+    @classmethod
+    def load(cls, source: Optional[str] = None) -> 'ServingState':
+        """Build a knowledge base and every derived index and template
+        
+        Templates are rendered on demand for engines that read records from
+        storage, so workers never hold the rendered catalog.
+        """
+        kb = load_knowledge_base(source)
+        generator = MedicalResponseGenerator(kb, precompile=PRECOMPILE_RESPONSES and not kb.records_on_demand)
+        return cls(kb, MedicalQueryProcessor(kb), generator, datetime.now().isoformat())
+
+def _file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _state_header(source: str) -> Dict:
+    """What a prebuilt state must have been built from to be loaded for source"""
+    modules = (__file__, sys.modules[KnowledgeBaseSnapshot.__module__].__file__,
+               sys.modules[FuzzyNameIndex.__module__].__file__)
+    return {
+        'format': STATE_FORMAT,
+        'python': list(sys.version_info[:2]),
+        'source': _file_digest(source),
+        'code': [_file_digest(path) for path in modules]
+    }
+
+def save_serving_state(path: Optional[str] = None, source: Optional[str] = None,
+                       state: Optional[ServingState] = None) -> ServingState:
+    """Build the serving state for source and write it to path for fast startup
+    
+    Pass ``state`` to write a state already built for source instead. The
+    file is a pickle checked against the source and code it was built from;
+    build it in the deployment pipeline and load only your own files.
+    """
+    source = source or KNOWLEDGE_BASE_PATH
+    path = path or STATE_SNAPSHOT_PATH or source + STATE_SUFFIX
+    if source.endswith(SQLITE_SUFFIXES):
+        raise ValueError("SQLite knowledge bases hold a connection and cannot be prebuilt")
+    state = state or ServingState.load(source)
+    state.knowledge_base.ensure_indexes()
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(_state_header(source), f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+    return state
+
+def load_prebuilt_state(source: Optional[str] = None, path: Optional[str] = None) -> Optional[ServingState]:
+    """The serving state prebuilt for source, or None when there is none or it is stale"""
+    source = source or KNOWLEDGE_BASE_PATH
+    path = path or STATE_SNAPSHOT_PATH or source + STATE_SUFFIX
+    try:
+        with open(path, 'rb') as f:
+            if pickle.load(f) != _state_header(source):
+                logger.warning(f"Prebuilt state {path} does not match {source} or the code, building instead")
+                return None
+            # Loading allocates every index at once; collections would only rescan them
+            collecting = gc.isenabled()
+            gc.disable()
+            try:
+                state = pickle.load(f)
+            finally:
+                if collecting:
+                    gc.enable()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not load prebuilt state {path}, building instead: {e}")
+        return None
+    return replace(state, loaded_at=datetime.now().isoformat())
+
+class KnowledgeBaseReloader:
+    """Owns the current serving state and replaces it without blocking requests
+    
+    A reload builds a complete new ServingState on a background thread and
+    publishes it with a single reference assignment. Requests read ``state``
+    once and keep using that object, so in-flight work finishes on the old
+    snapshot while new requests see the new one. Only one reload runs at a time.
+    The first state comes from a matching prebuilt state file when there is one.
+    """
+    
+    def __init__(self, source: Optional[str] = None):
+        self.source = source or KNOWLEDGE_BASE_PATH
+        state = load_prebuilt_state(self.source)
+        self.prebuilt = state is not None
+        self.state = state or ServingState.load(self.source)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._watch_interval: Optional[float] = None
+        self._stop_watching = threading.Event()
+        self._source_stamp = self._stamp()
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+    
+    def add_listener(self, listener):
+        """Call listener(state) after every successful swap"""
+        self._listeners.append(listener)
+    
+    @property
+    def reloading(self) -> bool:
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+    
+    def reload(self, wait: bool = False) -> bool:
+        """Start a background reload; False if one is already running
+        
+        With ``wait`` the call blocks until the reload has finished, which
+        is what tests and command line tools want.
+        """
+        with self._lock:
+            if self.reloading:
+                started = False
+            else:
+                self._thread = threading.Thread(target=self._reload, name='medical-kb-reload', daemon=True)
+                self._thread.start()
+                started = True
+            thread = self._thread
+        if wait:
+            thread.join()
+        return started
+    
+    def _reload(self):
+        stamp = self._stamp()
+        started = time.perf_counter()
+        try:
+            state = ServingState.load(self.source)
+        except Exception as e:
+            # Keep serving the previous catalog when the update is broken
+            self.last_error = str(e)
+            logger.error(f"Knowledge base reload failed, keeping version {self.state.knowledge_base.version}: {e}")
+            return
+        
+        previous = self.state
+        self.state = state
+        self._source_stamp = stamp
+        self.reloads += 1
+        self.last_error = None
+        for listener in self._listeners:
+            listener(state)
+        logger.info(f"Knowledge base reloaded in {(time.perf_counter() - started) * 1e3:.0f} ms: "
+                    f"version {previous.knowledge_base.version} -> {state.knowledge_base.version}")
+    
+    def _stamp(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(self.source)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+    
+    def watch(self, interval: float):
+        """Poll the source file and reload when its modification time or size changes
+        
+        Threads do not survive a fork, so processes forked from this one
+        (``gunicorn --preload`` workers) start their own watcher.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        if self._watch_interval is None and hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        self._watch_interval = interval
+        
+        def poll():
+            while not self._stop_watching.wait(interval):
+                stamp = self._stamp()
+                if stamp is not None and stamp != self._source_stamp and not self.reloading:
+                    logger.info(f"Knowledge base source changed: {self.source}")
+                    self.reload()
+        
+        self._watcher = threading.Thread(target=poll, name='medical-kb-watcher', daemon=True)
+        self._watcher.start()
+    
+    def stop(self):
+        """Stop the file watcher"""
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        self._stop_watching.clear()
+        self._watch_interval = 0
+    
+    def _after_fork(self):
+        # The child only keeps the forking thread: replace the inherited lock,
+        # event and thread handles, then restart the watcher if one was running
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        if self._watch_interval:
+            self.watch(self._watch_interval)
+    
+    def status(self) -> Dict:
+        state = self.state
+        return {
+            'source': self.source,
+            'version': state.knowledge_base.version,
+            'loaded_at': state.loaded_at,
+            'reloading': self.reloading,
+            'reloads': self.reloads,
+            'watching': self._watcher is not None and self._watcher.is_alive(),
+            'last_error': self.last_error
+        }
+
+_state_started = time.perf_counter()
+serving = KnowledgeBaseReloader()
+STARTUP_TIMINGS['serving_state'] = (time.perf_counter() - _state_started) * 1e3
+
+# Module-level aliases of the current state, kept for scripts and tests that
+# import them; request handlers read serving.state instead
+knowledge_base = serving.state.knowledge_base
+query_processor = serving.state.query_processor
+response_generator = serving.state.response_generator
+
+def _publish_state(state: ServingState):
+    global knowledge_base, query_processor, response_generator
+    knowledge_base = state.knowledge_base
+    query_processor = state.query_processor
+    response_generator = state.response_generator
+
+serving.add_listener(_publish_state)
+if GC_FREEZE:
+    if isinstance(knowledge_base, MedicalKnowledgeBase):
+        knowledge_base.ensure_indexes()
+    logger.info(f"Froze {freeze_for_fork()} objects out of the garbage collector")
+if RELOAD_INTERVAL > 0:
+    serving.watch(RELOAD_INTERVAL)
+
+ERROR_RESPONSE = PreEncoded({
+    'text': 'I apologize, but I encountered an error processing your question. Please try again or consult a healthcare professional.',
+    'type': 'error',
+    'confidence': 0.0,
+    'warnings': ['System error occurred'],
+    'disclaimer': 'Please consult a healthcare professional for medical advice.'
+})
+
+# Constant texts sent with most responses, encoded once at import
+PRE_ENCODED_TEXT = {
+    text: PreEncoded(text) for text in (STANDARD_DISCLAIMER, EMERGENCY_DISCLAIMER, EMERGENCY_TEXT)
+}
+
+LLM_SYSTEM_PROMPT = (
+    "You are a careful medical information assistant. Answer briefly and factually in plain language "
+    "for a general audience. Do not diagnose or prescribe, and recommend consulting a pharmacist or "
+    "doctor where appropriate."
+)
+
+def create_llm_client() -> Optional[LLMClient]:
+    """Language model client from the environment, or None when the fallback is disabled"""
+    if not LLM_FALLBACK:
+        return None
+    return LLMClient(
+        LLM_URL, api_key=os.environ.get('OPENAI_API_KEY', ''), model=LLM_MODEL,
+        system_prompt=LLM_SYSTEM_PROMPT, timeout=LLM_TIMEOUT, max_concurrent=LLM_MAX_CONCURRENT,
+        breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+    )
+
+llm_client = create_llm_client()
+# Answer scopes carry the query type, so the words that decide it ("uses",
+# "treat", "side effects", "dose") are left out of question matching
+SEMANTIC_CACHE_IGNORED_WORDS = STOP_WORDS | frozenset(
+    word for keywords in QueryTypeClassifier.KEYWORDS.values() for keyword in keywords for word in keyword.split()
+)
+semantic_cache = SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL,
+                               ignored_words=SEMANTIC_CACHE_IGNORED_WORDS)
+
+def needs_llm_answer(query: MedicalQuery, response: MedicalResponse) -> bool:
+    """Whether a canned response may be replaced by a language model answer
+    
+    Only low-confidence general answers qualify. The analyzer names catalog
+    medicines only, so questions about other drugs arrive here as general
+    questions; knowledge base answers and emergencies never wait on the model.
+    """
+    return response.response_type == 'general' and query.confidence < LLM_CONFIDENCE_THRESHOLD
+
+def _answer_scope(query: MedicalQuery) -> Tuple:
+    # Similar wording never carries an answer to another medicine or question
+    # type. Questions are matched as asked, since spelling correction may turn
+    # an unknown drug name into a known one.
+    return (query.intent, query.medicine, query.query_type)
+
+def cached_llm_answer(query: MedicalQuery) -> Optional[str]:
+    """Language model answer already given to this or a reworded question"""
+    return semantic_cache.get(query.original_text, _answer_scope(query))
+
+def remember_llm_answer(query: MedicalQuery, answer: Optional[str]) -> Optional[str]:
+    """Store a language model answer for reworded repeats of the question"""
+    if answer is not None:
+        semantic_cache.put(query.original_text, answer, _answer_scope(query))
+    return answer
+
+def ask_llm(query: MedicalQuery) -> Optional[str]:
+    """Answer from the semantic cache, calling the language model on a miss"""
+    answer = cached_llm_answer(query)
+    if answer is None:
+        answer = remember_llm_answer(query, llm_client.ask(query.original_text))
+    return answer
+
+def llm_response(answer: Optional[str], canned: MedicalResponse) -> MedicalResponse:
+    """Wrap a language model answer, keeping the canned response when there is none"""
+    if answer is None:
+        return canned
+    return MedicalResponse(
+        text=answer,
+        response_type='llm_answer',
+        confidence=0.5,
+        sources=[f'Language model ({LLM_MODEL})'],
+        warnings=['AI-generated answer: confirm with a pharmacist or doctor'],
+        disclaimer=STANDARD_DISCLAIMER
+    )
+
+def _serialize_response(response: MedicalResponse) -> Dict:
+    """Shape a response for the API"""
+    return {
+        'text': PRE_ENCODED_TEXT.get(response.text, response.text),
+        'type': response.response_type,
+        'confidence': response.confidence,
+        'warnings': response.warnings,
+        'disclaimer': PRE_ENCODED_TEXT.get(response.disclaimer, response.disclaimer)
+    }
+
+def _serialize_analysis(query: MedicalQuery) -> Dict:
+    """Shape a query analysis for the API"""
+    return {
+        'intent': query.intent,
+        'medicine': query.medicine,
+        'symptoms': query.symptoms,
+        'query_type': query.query_type,
+        'safety_flags': query.safety_flags
+    }
+
+def _serialize_result(query: MedicalQuery, response: MedicalResponse) -> Dict:
+    """Shape a query analysis and its response for the API"""
+    return {
+        'response': _serialize_response(response),
+        'analysis': _serialize_analysis(query)
+    }
+
+_SECTION_BREAK = re.compile(r'\n[ \t]*\n')
+
+def response_sections(text: str) -> List[str]:
+    """Split response text at blank lines into sections a voice client can speak in turn"""
+    sections = []
+    for section in _SECTION_BREAK.split(text):
+        lines = [line.strip() for line in section.splitlines()]
+        section = '\n'.join(line for line in lines if line)
+        if section:
+            sections.append(section)
+    return sections
+
+def _analysis_line(query: MedicalQuery) -> bytes:
+    """First line of a streamed /api/medical-query result"""
+    return dump_json({
+        'event': 'analysis',
+        'analysis': _serialize_analysis(query),
+        'timestamp': datetime.now().isoformat()
+    }) + b'\n'
+
+def _response_lines(response: MedicalResponse) -> Iterator[bytes]:
+    """JSON lines of a streamed response: each text section, then its warnings, then the disclaimer"""
+    for section in response_sections(response.text):
+        yield dump_json({'event': 'section', 'text': section}) + b'\n'
+    yield dump_json({
+        'event': 'warnings',
+        'type': response.response_type,
+        'confidence': response.confidence,
+        'warnings': response.warnings
+    }) + b'\n'
+    yield dump_json({
+        'event': 'disclaimer',
+        'disclaimer': PRE_ENCODED_TEXT.get(response.disclaimer, response.disclaimer)
+    }) + b'\n'
+
+STREAM_ERROR_LINE = dump_json({'event': 'error', 'error': 'Internal server error', 'response': ERROR_RESPONSE}) + b'\n'
+
+def _answer_batch_item(query_text, state: Optional[ServingState] = None) -> Dict:
+    """Analyze and answer one batch item, reporting failures in place"""
+    if not isinstance(query_text, str) or not query_text:
+        return {'error': 'No query provided'}
+    state = state or serving.state
+    try:
+        query = state.query_processor.analyze_query(query_text)
+        return _serialize_result(query, state.response_generator.generate_response(query))
+    except Exception as e:
+        logger.error(f"Error processing batch medical query: {str(e)}")
+        return {'error': 'Internal server error', 'response': ERROR_RESPONSE}
+
+_batch_executor: Optional[Executor] = None
+_batch_executor_lock = threading.Lock()
+
+def _get_batch_executor() -> Executor:
+    """Create the shared batch worker pool on first use"""
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            if BATCH_EXECUTOR == 'process':
+                from concurrent.futures import ProcessPoolExecutor
+                _batch_executor = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+            else:
+                _batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='medical-batch')
+        return _batch_executor
+
+body_cache = LRUCache(BODY_CACHE_SIZE)
+
+def _versioned_etag(version: str, key: tuple) -> str:
+    return f"{version}-{hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]}"
+
+def _versioned_body(version: str, key: tuple, build) -> Tuple[str, Optional[bytes]]:
+    """Strong ETag for key under a knowledge base version, and its cached body
+    
+    The body is None when the client already holds this version
+    (If-None-Match), so callers can answer 304 without building anything.
+    Otherwise ``build()`` runs at most once per knowledge-base version and key;
+    it must read the same serving state the version was taken from.
+    """
+    etag = _versioned_etag(version, key)
+    if etag in request.if_none_match:
+        return etag, None
+    body = body_cache.get((version, key))
+    if body is None:
+        body = dump_json(build()) + b'\n'
+        body_cache.put((version, key), body)
+    return etag, body
+
+def _static_json(version: str, key: tuple, build) -> Response:
+    """JSON response served from the versioned body cache, with ETag and 304"""
+    etag, body = _versioned_body(version, key, build)
+    response = Response(body, status=304 if body is None else 200, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _query_result(state: ServingState, query: MedicalQuery, response: MedicalResponse) -> Dict:
+    """Shape a /api/medical-query result, shared by the WSGI and ASGI apps"""
+    result = _serialize_result(query, response)
+    result['timestamp'] = datetime.now().isoformat()
+    
+    # The general answer is the same for every query, so it is encoded
+    # once per knowledge base version and only the analysis is new
+    if response.response_type == 'general':
+        cache_key = (state.knowledge_base.version, 'general-response')
+        fragment = body_cache.get(cache_key)
+        if fragment is None:
+            fragment = PreEncoded(result['response'])
+            body_cache.put(cache_key, fragment)
+        result['response'] = fragment
+    return result
+
+def _stream_query_result(state: ServingState, query: MedicalQuery) -> Iterator[bytes]:
+    """Stream a /api/medical-query result as JSON lines
+    
+    The analysis is sent before the response is generated, so a voice
+    client can react to it, and can start speaking the first section
+    while the rest of the answer is still on its way.
+    """
+    yield _analysis_line(query)
+    try:
+        response = state.response_generator.generate_response(query)
+        if llm_client is not None and needs_llm_answer(query, response):
+            response = llm_response(ask_llm(query), response)
+    except Exception as e:
+        logger.error(f"Error processing medical query: {str(e)}")
+        yield STREAM_ERROR_LINE
+        return
+    yield from _response_lines(response)
 
 @app.route('/api/medical-query', methods=['POST'])
 def process_medical_query():
@@ -662,57 +1795,226 @@ def process_medical_query():
         # Log query (without sensitive data)
         logger.info(f"Processing medical query: {query_text[:50]}...")
         
-        # Process query
-        query = query_processor.analyze_query(query_text)
-        response = response_generator.generate_response(query)
-        
-        # Prepare response
-        result = {
-            'response': {
-                'text': response.text,
-                'type': response.response_type,
-                'confidence': response.confidence,
-                'warnings': response.warnings,
-                'disclaimer': response.disclaimer
-            },
-            'analysis': {
-                'intent': query.intent,
-                'medicine': query.medicine,
-                'symptoms': query.symptoms,
-                'query_type': query.query_type,
-                'safety_flags': query.safety_flags
-            },
-            'timestamp': datetime.now().isoformat()
-        }
+        # Process query against one consistent snapshot of the knowledge base
+        state = serving.state
+        query = state.query_processor.analyze_query(query_text)
+        if request.args.get('format') == 'jsonl':
+            return Response(stream_with_context(_stream_query_result(state, query)), mimetype='application/x-ndjson')
+        response = state.response_generator.generate_response(query)
+        if llm_client is not None and needs_llm_answer(query, response):
+            response = llm_response(ask_llm(query), response)
         
-        return jsonify(result)
+        return jsonify(_query_result(state, query, response))
         
     except Exception as e:
         logger.error(f"Error processing medical query: {str(e)}")
         return jsonify({
             'error': 'Internal server error',
-            'response': {
-                'text': 'I apologize, but I encountered an error processing your question. Please try again or consult a healthcare professional.',
-                'type': 'error',
-                'confidence': 0.0,
-                'warnings': ['System error occurred'],
-                'disclaimer': 'Please consult a healthcare professional for medical advice.'
-            }
+            'response': ERROR_RESPONSE
         }), 500
 
-@app.route('/api/medicines', methods=['GET'])
-def get_medicines():
-    """Get list of available medicines"""
-    medicines_list = []
-    for medicine, data in knowledge_base.medicines.items():
-        medicines_list.append({
+@app.route('/api/medical-query/batch', methods=['POST'])
+def process_medical_query_batch():
+    """Process many medical queries in one request, returning results in order"""
+    try:
+        data = request.get_json(silent=True)
+        queries = data.get('queries') if isinstance(data, dict) else None
+        
+        if not isinstance(queries, list) or not queries:
+            return jsonify({'error': 'No queries provided'}), 400
+        if len(queries) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Batch size exceeds limit of {MAX_BATCH_SIZE} queries'}), 400
+        
+        logger.info(f"Processing batch of {len(queries)} medical queries")
+        
+        # Worker processes answer from their own copy of the knowledge base,
+        # threads share the snapshot this request started with
+        answer = _answer_batch_item if BATCH_EXECUTOR == 'process' else partial(_answer_batch_item, state=serving.state)
+        if BATCH_WORKERS <= 1 or len(queries) == 1:
+            results = [answer(query_text) for query_text in queries]
+        else:
+            chunksize = max(1, len(queries) // (BATCH_WORKERS * 4))
+            results = list(_get_batch_executor().map(answer, queries, chunksize=chunksize))
+        
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error processing medical query batch: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/interactions', methods=['POST'])
+def check_interactions():
+    """Report every pairwise interaction within a patient's medication list"""
+    try:
+        data = request.get_json(silent=True)
+        medications = data.get('medications') if isinstance(data, dict) else None
+        
+        if not isinstance(medications, list) or not medications or \
+                not all(isinstance(name, str) and name.strip() for name in medications):
+            return jsonify({'error': 'No medications provided'}), 400
+        if len(medications) > MAX_MEDICATIONS:
+            return jsonify({'error': f'Medication list exceeds limit of {MAX_MEDICATIONS} entries'}), 400
+        
+        graph = serving.state.knowledge_base.interactions
+        resolved = [graph.resolve(name) for name in medications]
+        interactions = graph.find([node for node in resolved if node])
+        
+        return jsonify({
+            'medications': [{'input': name, 'resolved': node} for name, node in zip(medications, resolved)],
+            'interactions': [
+                {
+                    'medications': list(interaction.medicines),
+                    'source': interaction.source,
+                    'description': interaction.description
+                }
+                for interaction in interactions
+            ],
+            'count': len(interactions),
+            'unrecognized': [name for name, node in zip(medications, resolved) if not node],
+            'disclaimer': 'Interaction data may be incomplete. Always confirm with a pharmacist or doctor.',
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error checking interactions: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+MEDICINE_FIELDS = ('name',) + MedicineRecord.__slots__
+
+def _encode_cursor(key: str) -> str:
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor: str) -> str:
+    return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+
+def _project_medicine(medicine: str, data: Mapping, fields: Optional[Tuple[str, ...]]) -> Dict:
+    """Shape one catalog entry for the medicines list
+    
+    Without ``fields`` this is the summary the endpoint has always returned;
+    requested fields are copied in full.
+    """
+    if fields is None:
+        return {
             'name': medicine,
             'category': data['category'],
             'uses': data['uses'][:3],  # First 3 uses
             'names': data['names']
-        })
+        }
+    item = {}
+    for name in fields:
+        if name == 'name':
+            item['name'] = medicine
+        elif name in data:
+            value = data[name]
+            item[name] = dict(value) if isinstance(value, Mapping) else value
+    return item
+
+@app.route('/api/medicines', methods=['GET'])
+def get_medicines():
+    """Get list of available medicines
+    
+    Query parameters: ``limit`` and ``cursor`` for pagination, ``category``
+    to filter, ``fields`` (comma separated) to project, and ``format=jsonl``
+    to stream every matching medicine as JSON lines.
+    """
+    fields = None
+    if request.args.get('fields'):
+        fields = tuple(dict.fromkeys(name.strip() for name in request.args['fields'].split(',') if name.strip()))
+        unknown = [name for name in fields if name not in MEDICINE_FIELDS]
+        if unknown or not fields:
+            return jsonify({
+                'error': f"Unknown fields: {', '.join(unknown)}",
+                'fields': list(MEDICINE_FIELDS)
+            }), 400
+    
+    try:
+        limit = int(request.args.get('limit', MEDICINES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if not 1 <= limit <= MAX_MEDICINES_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_MEDICINES_PAGE_SIZE}'}), 400
     
-    return jsonify({'medicines': medicines_list})
+    category = request.args.get('category') or None
+    kb = serving.state.knowledge_base
+    index = kb.catalog_index
+    try:
+        after = _decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        entries = index.entries(category, after)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    key = ('medicines', fields, category.lower() if category else None, request.args.get('cursor'))
+    if request.args.get('format') == 'jsonl':
+        etag = _versioned_etag(kb.version, key)
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            def stream():
+                for medicine, data in entries:
+                    yield dump_json(_project_medicine(medicine, data, fields)) + b'\n'
+            response = Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+        response.set_etag(etag)
+        return response
+    
+    def build_page():
+        page = list(islice(entries, limit))
+        has_more = next(entries, None) is not None
+        return {
+            'medicines': [_project_medicine(medicine, data, fields) for medicine, data in page],
+            'count': len(page),
+            'total': index.count(category),
+            'next_cursor': _encode_cursor(page[-1][0]) if has_more else None
+        }
+    
+    return _static_json(kb.version, key + (limit,), build_page)
+
+@app.route('/api/general-info', methods=['GET'])
+def get_general_info():
+    """What the assistant can help with, as answered to general questions"""
+    state = serving.state
+    def build():
+        return {'response': _serialize_response(state.response_generator._generate_general_response(None))}
+    return _static_json(state.knowledge_base.version, ('general-info',), build)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Cache and index statistics"""
+    state = serving.state
+    return jsonify({
+        'correction_cache': state.query_processor.correction_cache.stats(),
+        'response_cache': state.response_generator.response_cache.stats(),
+        'response_templates': state.response_generator.template_report,
+        'body_cache': body_cache.stats(),
+        'json_encoder': JSON_BACKEND,
+        'llm_fallback': llm_client.status() if llm_client is not None else None,
+        'semantic_cache': semantic_cache.stats(),
+        'knowledge_base_version': state.knowledge_base.version,
+        'knowledge_base': serving.status(),
+        'startup': dict(STARTUP_TIMINGS, prebuilt_state=serving.prebuilt),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_knowledge_base():
+    """Rebuild the knowledge base in the background and swap it in when ready"""
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    wait = bool(data.get('wait')) if isinstance(data, dict) else False
+    started = serving.reload(wait=wait)
+    
+    status = serving.status()
+    status['started'] = started
+    status['timestamp'] = datetime.now().isoformat()
+    if wait and status['last_error']:
+        return jsonify(status), 500
+    return jsonify(status), 200 if wait else 202
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -723,11 +2025,53 @@ def health_check():
         'version': '1.0.0'
     })
 
+class _ContextIterator:
+    """Response body iterated, and closed, inside the context that produced it"""
+
+    def __init__(self, context: contextvars.Context, body):
+        self._context = context
+        self._iterator = context.run(iter, body)
+        self._close = getattr(body, 'close', None)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._context.run(next, self._iterator)
+
+    def close(self):
+        if self._close is not None:
+            self._context.run(self._close)
+
+def forward_request(request) -> Response:
+    """Serve a request received by another WSGI app, such as the Cloud Functions runtime
+
+    The app runs on the incoming request's own WSGI environ and reads the
+    body from its input stream, so neither the body nor the headers are
+    copied. CORS headers, error handlers and streamed responses behave as
+    when the app is served directly.
+    """
+    # The outer app pops its request context before the body is iterated,
+    # which would unwind this app's contexts too; they get a context of their own
+    context = contextvars.Context()
+    response = context.run(Response.from_app, app.wsgi_app, request.environ)
+    response.response = _ContextIterator(context, response.response)
+    return response
+
+STARTUP_TIMINGS['total'] = (time.perf_counter() - _import_started) * 1e3
+logger.info(f"Backend loaded in {STARTUP_TIMINGS['total']:.0f} ms: imports {STARTUP_TIMINGS['imports']:.0f} ms, "
+            f"{'prebuilt' if serving.prebuilt else 'built'} serving state {STARTUP_TIMINGS['serving_state']:.0f} ms")
+
 if __name__ == '__main__':
     print("🏥 Medical AI Voice Assistant Backend Starting...")
     print("📋 Available endpoints:")
     print("   POST /api/medical-query - Process medical queries")
+    print("   POST /api/medical-query/batch - Process a list of medical queries")
+    print("   POST /api/interactions - Check a medication list for interactions")
     print("   GET  /api/medicines - Get available medicines")
+    print("   GET  /api/general-info - What the assistant can answer")
+    print("   GET  /api/metrics - Cache statistics")
+    print("   POST /api/admin/reload - Reload the knowledge base (requires X-Admin-Token)")
     print("   GET  /api/health - Health check")
     print("\n🔒 Safety features enabled:")
     print("   ✓ Emergency detection")
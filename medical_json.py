@@ -0,0 +1,123 @@
+"""
+JSON serialization for the medical AI API
+Encodes with orjson when it is installed and with the standard library otherwise
+
+Output is compact with sorted keys, like Flask's jsonify. The standard
+library fallback produces exactly the bytes jsonify always did (ASCII with
+escapes); orjson writes the same documents as UTF-8 text.
+"""
+
+import json
+from collections.abc import Mapping
+from typing import Dict
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+# orjson 3.9+ embeds already-encoded JSON natively
+_Fragment = getattr(orjson, 'Fragment', None)
+
+class PreEncoded:
+    """A constant JSON value encoded once and spliced into later documents
+
+    Large fixed values such as the medical disclaimer appear in nearly every
+    response. Wrapping them skips re-encoding them on each request; the
+    encoded bytes are copied into the output instead. Older orjson releases
+    cannot embed raw JSON and encode the value itself, which is faster there
+    than splicing.
+    """
+
+    __slots__ = ('value', 'data', '_stdlib_data', '_marker', '_fragment')
+
+    def __init__(self, value):
+        self.value = value
+        self.data = dumps(value)
+        self._stdlib_data = self.data if dumps is dumps_stdlib else dumps_stdlib(value)
+        # Stands in for the value during stdlib encoding and is then replaced
+        # by its encoded bytes. A string in the document equal to the marker
+        # encodes to the same bytes, so dumps_stdlib checks the marker count.
+        self._marker = f"\x00pre-encoded:{id(self)}\x00"
+        self._fragment = _Fragment(self.data) if _Fragment is not None else value
+
+    def __reduce__(self):
+        # Markers are per object, so a copy in another process re-encodes
+        return (PreEncoded, (self.value,))
+
+    def __repr__(self):
+        return f"PreEncoded({self.value!r})"
+
+def _default(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    return DefaultJSONProvider.default(value)
+
+def dumps_stdlib(obj) -> bytes:
+    """Serialize obj with the standard library, splicing in PreEncoded values"""
+    fragments: Dict[bytes, bytes] = {}
+    uses: Dict[bytes, int] = {}
+
+    def default(value):
+        if isinstance(value, PreEncoded):
+            marker = json.dumps(value._marker).encode('ascii')
+            fragments[marker] = value._stdlib_data
+            uses[marker] = uses.get(marker, 0) + 1
+            return value._marker
+        return _default(value)
+
+    data = json.dumps(obj, default=default, sort_keys=True, separators=(',', ':')).encode('ascii')
+    for marker, fragment in fragments.items():
+        if data.count(marker) != uses[marker]:
+            # A string in obj (or a fragment spliced so far) reads like the
+            # marker: encode the plain values instead
+            return json.dumps(obj, default=_plain, sort_keys=True, separators=(',', ':')).encode('ascii')
+        data = data.replace(marker, fragment)
+    return data
+
+if orjson is not None:
+    # Dates and dataclasses go through the same default hook as the stdlib encoder
+    _ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS |
+                       orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    def _orjson_default(value):
+        if isinstance(value, PreEncoded):
+            return value._fragment
+        return _default(value)
+
+    def dumps(obj) -> bytes:
+        """Serialize obj to compact, key-sorted JSON"""
+        return orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS)
+else:
+    dumps = dumps_stdlib
+
+class MedicalJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider routing ``jsonify`` through dumps
+
+    Debug-mode pretty printing and explicit keyword arguments still go
+    through the standard library, as in DefaultJSONProvider.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            kwargs.setdefault('default', _plain)
+            kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(obj)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+
+def _plain(value):
+    """Default hook for the standard library when pretty printing"""
+    if isinstance(value, PreEncoded):
+        return value.value
+    return _default(value)
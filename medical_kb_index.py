@@ -0,0 +1,195 @@
+"""
+Catalog index primitives shared by the knowledge base engines
+Tokenizing, fuzzy name matching and interaction parsing, with no side effects at import
+
+Used by medical_ai_backend and by medical_kb_sqlite, whose build command must
+not start the Flask app or load the configured knowledge base.
+"""
+
+import os
+import re
+import sys
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+# Stricter than the single-word threshold so everyday word pairs are not
+# rewritten into danger or symptom phrases
+PHRASE_MATCH_RATIO = 0.85
+
+# Medication lists name many drugs the catalog does not know; only near-exact
+# spellings may resolve to a known one (tramadol must not become panadol)
+INTERACTION_MATCH_RATIO = 0.85
+
+# Medicines listed in a multi-symptom answer
+SYMPTOM_TOP_K = int(os.environ.get('MEDICAL_AI_SYMPTOM_TOP_K', '5'))
+
+_TOKEN_PATTERN = re.compile(r"[\w']+")
+
+@dataclass
+class NormalizedQuery:
+    """Lowercased query with tokens computed once
+
+    ``hits`` holds the keyword matches found in ``text`` and is filled in
+    by the query processor.
+    """
+    text: str
+    tokens: List[str]
+    hits: List['KeywordHit'] = field(default_factory=list)
+
+    # Longest phrase, in words, that spelling correction matches as a unit
+    MAX_NGRAM = 3
+
+    @classmethod
+    def from_text(cls, text: str) -> 'NormalizedQuery':
+        """Lowercase and tokenize raw text, dropping punctuation"""
+        lowered = text.lower().replace('\u2019', "'")
+        tokens = _TOKEN_PATTERN.findall(lowered)
+        return cls(lowered, tokens)
+
+    @classmethod
+    def from_tokens(cls, tokens: List[str]) -> 'NormalizedQuery':
+        """Build a normalized query whose text is the space-joined tokens"""
+        return cls(' '.join(tokens), list(tokens))
+
+@dataclass(frozen=True)
+class KeywordHit:
+    """A keyword occurrence found by the keyword automaton"""
+    category: str
+    keyword: str
+    value: str
+    rank: int
+    start: int
+    end: int
+
+def best_fuzzy_match(word: str, candidates, min_ratio: float) -> Optional[str]:
+    """Score ``(name, value)`` candidates with SequenceMatcher and return the best value
+    
+    Only ratios above ``min_ratio`` count, and the earliest candidate wins ties.
+    """
+    best_match = None
+    best_ratio = min_ratio
+    matcher = SequenceMatcher(None, word, '')
+    for name, value in candidates:
+        matcher.set_seq2(name)
+        if matcher.real_quick_ratio() <= best_ratio or matcher.quick_ratio() <= best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best_ratio = ratio
+            best_match = value
+    return best_match
+
+class FuzzyNameIndex:
+    """Bigram index for approximate name lookup with SequenceMatcher scoring
+
+    Candidates are gathered from the padded bigram postings of the query word,
+    restricted to the name lengths that can still clear ``min_ratio``, and only
+    the strongest ``max_candidates`` are scored with SequenceMatcher. Ties keep
+    the first name in insertion order, matching a linear scan with ``>``.
+    """
+
+    def __init__(self, entries, min_ratio: float = 0.6, max_candidates: int = 64):
+        self.min_ratio = min_ratio
+        self.max_candidates = max_candidates
+        self._names: List[str] = []
+        self._values: List[str] = []
+        self._exact: Dict[str, int] = {}
+        postings: Dict[str, List[int]] = {}
+
+        for name, value in entries:
+            name = name.lower()
+            name_id = len(self._names)
+            self._names.append(name)
+            self._values.append(value)
+            self._exact.setdefault(name, name_id)
+            for gram in self._grams(name):
+                postings.setdefault(gram, []).append(name_id)
+
+        # Postings are sorted by name length so lookups can bisect to the
+        # window of lengths that is able to reach the similarity threshold
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for gram, ids in postings.items():
+            ids.sort(key=lambda name_id: (len(self._names[name_id]), name_id))
+            self._postings[gram] = ([len(self._names[name_id]) for name_id in ids], ids)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @staticmethod
+    def _grams(text: str) -> set:
+        padded = f" {text} "
+        return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+    def _length_window(self, length: int) -> Tuple[int, int]:
+        """Name lengths whose best possible ratio 2*min/(a+b) exceeds min_ratio"""
+        factor = self.min_ratio / (2 - self.min_ratio)
+        return int(length * factor) + 1, int(length / factor) if factor else length
+
+    def lookup(self, word: str) -> Optional[str]:
+        """Return the value of the best name with ratio above min_ratio"""
+        word = word.lower()
+        if not word:
+            return None
+
+        exact_id = self._exact.get(word)
+        if exact_id is not None:
+            return self._values[exact_id]
+
+        low, high = self._length_window(len(word))
+        shared: Dict[int, int] = {}
+        for gram in self._grams(word):
+            posting = self._postings.get(gram)
+            if not posting:
+                continue
+            lengths, ids = posting
+            for name_id in ids[bisect_left(lengths, low):bisect_right(lengths, high)]:
+                shared[name_id] = shared.get(name_id, 0) + 1
+
+        if not shared:
+            return None
+
+        candidates = sorted(shared, key=lambda name_id: (-shared[name_id], name_id))
+        return best_fuzzy_match(
+            word,
+            ((self._names[name_id], self._values[name_id]) for name_id in sorted(candidates[:self.max_candidates])),
+            self.min_ratio
+        )
+
+@dataclass(frozen=True)
+class SymptomMatch:
+    """A recommended medicine and the query symptoms it treats"""
+    medicine: str
+    symptoms: Tuple[str, ...]
+
+@dataclass(frozen=True)
+class Interaction:
+    """One documented interaction between two medicines or agents"""
+    medicines: Tuple[str, str]
+    source: str
+    description: str
+
+def parse_interactions(medicines: Mapping) -> Tuple[Dict[str, str], List[Interaction]]:
+    """Parse the free-text interaction lists of a catalog
+    
+    Entries look like ``'Warfarin: increased bleeding risk'``. Returns the
+    name aliases (every medicine name, plus each interacting agent that is
+    not a catalog medicine, lowercased) mapped to their node, and one
+    Interaction per listed entry between the source medicine and that node.
+    """
+    aliases: Dict[str, str] = {}
+    for medicine, data in medicines.items():
+        for name in data['names']:
+            aliases.setdefault(name.lower(), medicine)
+    
+    interactions = []
+    for medicine, data in medicines.items():
+        for text in data.get('interactions', ()):
+            agent, _, description = text.partition(':')
+            agent = agent.strip().lower()
+            node = aliases.setdefault(agent, sys.intern(agent))
+            if node != medicine:
+                interactions.append(Interaction((medicine, node), medicine, description.strip()))
+    return aliases, interactions
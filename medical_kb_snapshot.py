@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Compact binary snapshots of the medical knowledge base
+Compiles the JSON catalog into a memory-mapped file of string tables and offsets
+
+Usage:
+    python medical_kb_snapshot.py data/medical_knowledge_base.json data/medical_knowledge_base.mkb
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import ItemsView, Mapping
+from typing import Dict, List, Tuple
+
+SNAPSHOT_SUFFIX = '.mkb'
+MAGIC = b'MKBSNAP1'
+
+# magic, version, medicine count, string count, then the offsets of the string
+# index, string data, record index, record data, key order and metadata
+# sections, and the metadata length
+_HEADER = struct.Struct('<8s16sII7I')
+_U32 = struct.Struct('<I')
+_PAIR = struct.Struct('<II')
+
+# Field kinds inside a medicine record
+_KIND_STRING = 0
+_KIND_LIST = 1
+_KIND_MAP = 2
+
+def catalog_version(catalog: Dict) -> str:
+    """Content hash identifying a catalog, shared with MedicalKnowledgeBase"""
+    payload = json.dumps(
+        [catalog['medicines'], catalog['symptoms_to_medicines'], catalog['danger_keywords']],
+        sort_keys=True, default=dict
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+class _StringTable:
+    """Deduplicating string table used while writing a snapshot"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[bytes] = []
+
+    def add(self, text: str) -> int:
+        if not isinstance(text, str):
+            raise ValueError(f"Snapshot values must be strings, got {type(text).__name__}")
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.strings)
+            self.strings.append(text.encode('utf-8'))
+        return string_id
+
+def _encode_record(key: str, entry: Dict, strings: _StringTable) -> bytes:
+    """Encode one medicine entry as string ids grouped by field"""
+    parts = [_PAIR.pack(strings.add(key), len(entry))]
+    for field, value in entry.items():
+        if isinstance(value, str):
+            parts.append(struct.pack('<III', strings.add(field), _KIND_STRING, strings.add(value)))
+        elif isinstance(value, (list, tuple)):
+            parts.append(struct.pack('<III', strings.add(field), _KIND_LIST, len(value)))
+            parts.extend(_U32.pack(strings.add(item)) for item in value)
+        elif isinstance(value, Mapping):
+            parts.append(struct.pack('<III', strings.add(field), _KIND_MAP, len(value)))
+            parts.extend(_PAIR.pack(strings.add(k), strings.add(v)) for k, v in value.items())
+        else:
+            raise ValueError(f"Unsupported value for {key}.{field}: {type(value).__name__}")
+    return b''.join(parts)
+
+def build_snapshot(catalog: Dict, path: str) -> Dict[str, int]:
+    """Write a catalog dict to a snapshot file and return section sizes
+
+    The file is written next to path and renamed over it, so processes that
+    still map the previous snapshot keep reading the old file.
+    """
+    medicines = catalog['medicines']
+    strings = _StringTable()
+    records = [_encode_record(key, entry, strings) for key, entry in medicines.items()]
+    meta = json.dumps({
+        'symptoms_to_medicines': catalog['symptoms_to_medicines'],
+        'danger_keywords': catalog['danger_keywords']
+    }, default=dict).encode('utf-8')
+
+    string_index, position = [], 0
+    for data in strings.strings:
+        string_index.append(_PAIR.pack(position, len(data)))
+        position += len(data)
+    record_index, position = [], 0
+    for record in records:
+        record_index.append(_U32.pack(position))
+        position += len(record)
+    keys = list(medicines)
+    key_order = [_U32.pack(i) for i in sorted(range(len(keys)), key=keys.__getitem__)]
+
+    sections = [b''.join(string_index), b''.join(strings.strings), b''.join(record_index),
+                b''.join(records), b''.join(key_order), meta]
+    offsets, position = [], _HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+
+    header = _HEADER.pack(MAGIC, catalog_version(catalog).encode('ascii'), len(keys),
+                          len(strings.strings), *offsets, len(meta))
+    with open(path + '.tmp', 'wb') as f:
+        f.write(header)
+        for section in sections:
+            f.write(section)
+    os.replace(path + '.tmp', path)
+
+    return {'medicines': len(keys), 'strings': len(strings.strings), 'bytes': position}
+
+class KnowledgeBaseSnapshot:
+    """Read-only, memory-mapped view of a compiled knowledge base
+
+    Opening a snapshot only parses the header and the small metadata section;
+    medicine records are decoded from the shared mapping when accessed.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.medicine_count, self.string_count, self._string_index,
+         self._string_data, self._record_index, self._record_data, self._key_order,
+         meta_offset, meta_length) = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a knowledge base snapshot")
+
+        self.path = path
+        self.version = version.decode('ascii')
+        meta = json.loads(self._buffer[meta_offset:meta_offset + meta_length])
+        self.symptoms_to_medicines: Dict[str, List[str]] = meta['symptoms_to_medicines']
+        self.danger_keywords: List[str] = meta['danger_keywords']
+        self.medicines = SnapshotCatalog(self)
+
+    def string(self, string_id: int) -> str:
+        """Decode one entry of the string table"""
+        start, length = _PAIR.unpack_from(self._buffer, self._string_index + string_id * 8)
+        start += self._string_data
+        return self._buffer[start:start + length].decode('utf-8')
+
+    def record_key(self, index: int) -> str:
+        """Decode only the key of the record at index"""
+        offset = self._record_data + _U32.unpack_from(self._buffer, self._record_index + index * 4)[0]
+        return self.string(_U32.unpack_from(self._buffer, offset)[0])
+
+    def record(self, index: int) -> Tuple[str, Dict]:
+        """Decode the key and entry of the record at index"""
+        buffer, string = self._buffer, self.string
+        offset = self._record_data + _U32.unpack_from(buffer, self._record_index + index * 4)[0]
+        key_id, field_count = _PAIR.unpack_from(buffer, offset)
+        offset += 8
+        entry = {}
+        for _ in range(field_count):
+            field_id, kind, value = struct.unpack_from('<III', buffer, offset)
+            offset += 12
+            if kind == _KIND_STRING:
+                entry[string(field_id)] = string(value)
+            elif kind == _KIND_LIST:
+                ids = struct.unpack_from(f'<{value}I', buffer, offset)
+                offset += 4 * value
+                entry[string(field_id)] = [string(item) for item in ids]
+            else:
+                ids = struct.unpack_from(f'<{2 * value}I', buffer, offset)
+                offset += 8 * value
+                entry[string(field_id)] = {string(ids[i]): string(ids[i + 1]) for i in range(0, len(ids), 2)}
+        return string(key_id), entry
+
+    def find(self, key: str) -> int:
+        """Binary search the sorted key order, returning a record index or -1"""
+        low, high = 0, self.medicine_count
+        while low < high:
+            middle = (low + high) // 2
+            index = _U32.unpack_from(self._buffer, self._key_order + middle * 4)[0]
+            middle_key = self.record_key(index)
+            if middle_key == key:
+                return index
+            if middle_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return -1
+
+    def __reduce__(self):
+        # A pickled snapshot maps its file again when loaded
+        return (KnowledgeBaseSnapshot, (self.path,))
+
+    def close(self):
+        self._buffer.close()
+
+class _SnapshotItems(ItemsView):
+    def __iter__(self):
+        snapshot = self._mapping._snapshot
+        for index in range(len(self._mapping)):
+            yield snapshot.record(index)
+
+class SnapshotCatalog(Mapping):
+    """Lazy medicine mapping over a snapshot, iterating in catalog order"""
+
+    def __init__(self, snapshot: KnowledgeBaseSnapshot):
+        self._snapshot = snapshot
+
+    def __getitem__(self, key):
+        index = self._snapshot.find(key) if isinstance(key, str) else -1
+        if index < 0:
+            raise KeyError(key)
+        return self._snapshot.record(index)[1]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._snapshot.record_key(index)
+
+    def __len__(self) -> int:
+        return self._snapshot.medicine_count
+
+    def items(self):
+        return _SnapshotItems(self)
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    source, target = sys.argv[1], sys.argv[2]
+    with open(source, encoding='utf-8') as f:
+        report = build_snapshot(json.load(f), target)
+    print(f"📦 Wrote {target}: {report['medicines']} medicines, "
+          f"{report['strings']} strings, {report['bytes']} bytes")
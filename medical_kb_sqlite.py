@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+SQLite/FTS5 storage engine for the medical knowledge base
+Serves large catalogs from a local database instead of per-worker dicts
+
+Usage:
+    python medical_kb_sqlite.py data/medical_knowledge_base.json data/medical_knowledge_base.sqlite
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections.abc import ItemsView, Mapping
+from typing import Dict, List, Optional, Tuple
+
+from medical_kb_index import (
+    INTERACTION_MATCH_RATIO, PHRASE_MATCH_RATIO, SYMPTOM_TOP_K, FuzzyNameIndex, Interaction, KeywordHit,
+    NormalizedQuery, SymptomMatch, _TOKEN_PATTERN, best_fuzzy_match, parse_interactions
+)
+from medical_kb_snapshot import catalog_version
+
+STATEMENT_CACHE_SIZE = int(os.environ.get('MEDICAL_AI_SQLITE_STATEMENT_CACHE', '256'))
+
+# IN (...) lists are padded to these sizes so the statement cache sees a
+# handful of distinct SQL texts instead of one per query length
+_IN_LIST_SIZES = (8, 32, 128, 512)
+
+# Keywords are indexed on their first characters; a query looks up every
+# substring of this length and verifies the full keyword in Python
+HEAD_LENGTH = 3
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE medicines (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    category TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX medicines_category ON medicines (category COLLATE NOCASE, id);
+CREATE TABLE symptoms (id INTEGER PRIMARY KEY, symptom TEXT NOT NULL UNIQUE);
+CREATE TABLE symptom_medicines (
+    symptom_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    medicine_key TEXT NOT NULL,
+    PRIMARY KEY (symptom_id, position)
+);
+CREATE TABLE danger_keywords (id INTEGER PRIMARY KEY, keyword TEXT NOT NULL);
+CREATE TABLE keywords (
+    head TEXT NOT NULL,
+    phrase TEXT NOT NULL,
+    category TEXT NOT NULL,
+    value TEXT NOT NULL,
+    rank INTEGER NOT NULL
+);
+CREATE INDEX keywords_head ON keywords (head);
+CREATE TABLE fuzzy_entries (
+    id INTEGER PRIMARY KEY,
+    index_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX fuzzy_entries_name ON fuzzy_entries (index_key, name);
+CREATE TABLE fuzzy_grams (
+    index_key TEXT NOT NULL,
+    gram TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL,
+    PRIMARY KEY (index_key, gram, length, entry_id)
+) WITHOUT ROWID;
+CREATE TABLE interaction_aliases (alias TEXT PRIMARY KEY, node TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE interaction_edges (
+    node TEXT NOT NULL,
+    other TEXT NOT NULL,
+    interaction_id INTEGER NOT NULL,
+    first TEXT NOT NULL,
+    second TEXT NOT NULL,
+    source TEXT NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (node, interaction_id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE medicine_fts USING fts5(names, uses, category, tokenize='porter unicode61');
+"""
+
+INTERACTION_INDEX_KEY = 'interaction'
+
+def _phrase_index_key(size: int) -> str:
+    return f"phrase:{size}"
+
+def build_database(catalog: Dict, path: str) -> Dict[str, int]:
+    """Write a catalog dict to a new SQLite database with FTS5 indexes
+
+    The database is built next to path and renamed over it, so workers
+    reading the previous file never see a partly built one.
+    """
+    building = path + '.tmp'
+    if os.path.exists(building):
+        os.remove(building)
+    connection = sqlite3.connect(building)
+    try:
+        connection.executescript(SCHEMA)
+        medicines = catalog['medicines']
+        fuzzy_rows: List[Tuple[str, str, str]] = []
+
+        keyword_rows = [(keyword, 'danger', keyword, rank) for rank, keyword in enumerate(catalog['danger_keywords'])]
+        for medicine_id, (key, entry) in enumerate(medicines.items()):
+            connection.execute(
+                'INSERT INTO medicines (id, key, category, data) VALUES (?, ?, ?, ?)',
+                (medicine_id, key, entry['category'], json.dumps(entry, default=dict))
+            )
+            connection.execute(
+                'INSERT INTO medicine_fts (rowid, names, uses, category) VALUES (?, ?, ?, ?)',
+                (medicine_id, ' '.join(entry['names']), ' '.join(entry['uses']), entry['category'])
+            )
+            for name in entry['names']:
+                keyword_rows.append((name, 'medicine', key, medicine_id))
+                fuzzy_rows.append(('name', name.lower(), key))
+
+        for symptom_id, (symptom, symptom_medicines) in enumerate(catalog['symptoms_to_medicines'].items()):
+            connection.execute('INSERT INTO symptoms (id, symptom) VALUES (?, ?)', (symptom_id, symptom))
+            connection.executemany(
+                'INSERT INTO symptom_medicines (symptom_id, position, medicine_key) VALUES (?, ?, ?)',
+                [(symptom_id, position, medicine) for position, medicine in enumerate(symptom_medicines)]
+            )
+            keyword_rows.append((symptom, 'symptom', symptom, symptom_id))
+        connection.executemany(
+            'INSERT INTO danger_keywords (id, keyword) VALUES (?, ?)', enumerate(catalog['danger_keywords'])
+        )
+
+        # Multi-word names, symptoms and danger phrases, one index per word count,
+        # as in MedicalKnowledgeBase.phrase_indexes
+        phrases = [(name, value) for _, name, value in fuzzy_rows]
+        phrases.extend((phrase.lower(), phrase)
+                       for phrase in list(catalog['symptoms_to_medicines']) + list(catalog['danger_keywords']))
+        phrase_sizes = set()
+        for phrase, value in phrases:
+            size = len(phrase.split())
+            if 1 < size <= NormalizedQuery.MAX_NGRAM:
+                phrase_sizes.add(size)
+                fuzzy_rows.append((_phrase_index_key(size), phrase, value))
+
+        aliases, interactions = parse_interactions(medicines)
+        fuzzy_rows.extend((INTERACTION_INDEX_KEY, alias, node) for alias, node in aliases.items())
+        connection.executemany('INSERT INTO interaction_aliases VALUES (?, ?)', aliases.items())
+        connection.executemany('INSERT INTO interaction_edges VALUES (?, ?, ?, ?, ?, ?, ?)', [
+            (node, other, interaction_id, *interaction.medicines, interaction.source, interaction.description)
+            for interaction_id, interaction in enumerate(interactions)
+            for node, other in (interaction.medicines, interaction.medicines[::-1])
+        ])
+
+        connection.executemany(
+            'INSERT INTO keywords VALUES (?, ?, ?, ?, ?)', [(row[0][:HEAD_LENGTH],) + row for row in keyword_rows]
+        )
+        connection.executemany(
+            'INSERT INTO fuzzy_entries (id, index_key, name, value) VALUES (?, ?, ?, ?)',
+            [(entry_id,) + row for entry_id, row in enumerate(fuzzy_rows)]
+        )
+        connection.executemany('INSERT INTO fuzzy_grams VALUES (?, ?, ?, ?)', [
+            (index_key, gram, len(name), entry_id)
+            for entry_id, (index_key, name, _) in enumerate(fuzzy_rows)
+            for gram in FuzzyNameIndex._grams(name)
+        ])
+        connection.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ('version', catalog_version(catalog)),
+            ('phrase_sizes', json.dumps(sorted(phrase_sizes))),
+            ('interaction_count', str(len(interactions)))
+        ])
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(building, path)
+    return {'medicines': len(medicines), 'keywords': len(keyword_rows), 'fuzzy_entries': len(fuzzy_rows)}
+
+class _Connections:
+    """One read-only connection per thread, each with its own statement cache"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+            connection = sqlite3.connect(uri, uri=True, cached_statements=STATEMENT_CACHE_SIZE)
+            self._local.connection = connection
+        return connection
+
+    def query(self, sql: str, parameters=()) -> List[tuple]:
+        return self.get().execute(sql, parameters).fetchall()
+
+    def query_in(self, sql: str, values: List[str], prefix: tuple = (), suffix: tuple = ()) -> List[tuple]:
+        """Run a statement with one padded ``IN ({})`` list
+
+        Inputs longer than the largest list size are split into chunks, so
+        callers must not rely on aggregates across chunks.
+        """
+        rows = []
+        largest = _IN_LIST_SIZES[-1]
+        for start in range(0, len(values), largest):
+            chunk = list(values[start:start + largest])
+            size = next(size for size in _IN_LIST_SIZES if size >= len(chunk))
+            placeholders = ', '.join('?' * size)
+            parameters = (*prefix, *chunk, *[None] * (size - len(chunk)), *suffix)
+            rows.extend(self.query(sql.format(placeholders), parameters))
+        return rows
+
+class _CatalogItems(ItemsView):
+    def __iter__(self):
+        for key, data in self._mapping._connections.query('SELECT key, data FROM medicines ORDER BY id'):
+            yield key, json.loads(data)
+
+class SQLiteCatalog(Mapping):
+    """Medicine mapping that reads entries from SQLite on access"""
+
+    def __init__(self, connections: _Connections):
+        self._connections = connections
+
+    def __getitem__(self, key):
+        rows = self._connections.query('SELECT data FROM medicines WHERE key = ?', (key,))
+        if not rows:
+            raise KeyError(key)
+        return json.loads(rows[0][0])
+
+    def __contains__(self, key) -> bool:
+        return bool(self._connections.query('SELECT 1 FROM medicines WHERE key = ?', (key,)))
+
+    def __iter__(self):
+        for (key,) in self._connections.query('SELECT key FROM medicines ORDER BY id'):
+            yield key
+
+    def __len__(self) -> int:
+        return self._connections.query('SELECT count(*) FROM medicines')[0][0]
+
+    def items(self):
+        return _CatalogItems(self)
+
+class SQLiteCatalogIndex:
+    """Catalog paging with the ``CatalogIndex`` interface, using keyset queries"""
+
+    BATCH_SIZE = 256
+
+    def __init__(self, connections: _Connections):
+        self._connections = connections
+
+    def count(self, category: Optional[str] = None) -> int:
+        if category is None:
+            return self._connections.query('SELECT count(*) FROM medicines')[0][0]
+        return self._connections.query(
+            'SELECT count(*) FROM medicines WHERE category = ? COLLATE NOCASE', (category,)
+        )[0][0]
+
+    def entries(self, category: Optional[str] = None, after: Optional[str] = None):
+        start = -1
+        if after is not None:
+            rows = self._connections.query('SELECT id FROM medicines WHERE key = ?', (after,))
+            if not rows:
+                raise KeyError(after)
+            start = rows[0][0]
+        return self._batches(category, start)
+
+    def _batches(self, category: Optional[str], last_id: int):
+        # Each batch is a fresh keyset query, so no cursor stays open while
+        # a streaming response is being written
+        while True:
+            if category is None:
+                rows = self._connections.query(
+                    'SELECT id, key, data FROM medicines WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, self.BATCH_SIZE)
+                )
+            else:
+                rows = self._connections.query(
+                    'SELECT id, key, data FROM medicines WHERE category = ? COLLATE NOCASE AND id > ?'
+                    ' ORDER BY id LIMIT ?', (category, last_id, self.BATCH_SIZE)
+                )
+            for last_id, key, data in rows:
+                yield key, json.loads(data)
+            if len(rows) < self.BATCH_SIZE:
+                return
+
+class SQLiteSymptomIndex(Mapping):
+    """Symptom to medicines mapping backed by SQLite"""
+
+    def __init__(self, connections: _Connections):
+        self._connections = connections
+
+    def __getitem__(self, symptom):
+        rows = self._connections.query(
+            'SELECT sm.medicine_key FROM symptoms s JOIN symptom_medicines sm ON sm.symptom_id = s.id '
+            'WHERE s.symptom = ? ORDER BY sm.position', (symptom,)
+        )
+        if not rows and not self._connections.query('SELECT 1 FROM symptoms WHERE symptom = ?', (symptom,)):
+            raise KeyError(symptom)
+        return [medicine for (medicine,) in rows]
+
+    def __iter__(self):
+        for (symptom,) in self._connections.query('SELECT symptom FROM symptoms ORDER BY id'):
+            yield symptom
+
+    def __len__(self) -> int:
+        return self._connections.query('SELECT count(*) FROM symptoms')[0][0]
+
+    def rank(self, symptoms: List[str], k: int = SYMPTOM_TOP_K) -> List[SymptomMatch]:
+        """Top k medicines for the symptoms, ranked like ``SymptomIndex.rank`` in one query"""
+        symptoms = list(dict.fromkeys(symptoms))
+        if not symptoms:
+            return []
+        rows = self._connections.query_in(
+            'SELECT sm.medicine_key, group_concat(s.symptom, char(31)) FROM symptoms s'
+            ' JOIN symptom_medicines sm ON sm.symptom_id = s.id JOIN medicines m ON m.key = sm.medicine_key'
+            ' WHERE s.symptom IN ({}) GROUP BY sm.medicine_key'
+            ' ORDER BY count(*) DESC, sum(sm.position), min(m.id) LIMIT ?',
+            symptoms, suffix=(k,)
+        )
+        order = {symptom: index for index, symptom in enumerate(symptoms)}
+        return [
+            SymptomMatch(medicine, tuple(sorted(covered.split('\x1f'), key=order.__getitem__)))
+            for medicine, covered in rows
+        ]
+
+class SQLiteNameIndex:
+    """Approximate name lookup over bigram postings stored in SQLite
+
+    Mirrors ``FuzzyNameIndex.lookup``: exact names win, otherwise candidates
+    sharing the most padded bigrams within the reachable length window are
+    scored with SequenceMatcher, all gathered in one indexed query.
+    """
+
+    def __init__(self, connections: _Connections, index_key: str,
+                 min_ratio: float = 0.6, max_candidates: int = 64):
+        self._connections = connections
+        self.index_key = index_key
+        self.min_ratio = min_ratio
+        self.max_candidates = max_candidates
+
+    def lookup(self, word: str) -> Optional[str]:
+        word = word.lower()
+        if not word:
+            return None
+        rows = self._connections.query(
+            'SELECT value FROM fuzzy_entries WHERE index_key = ? AND name = ? ORDER BY id LIMIT 1',
+            (self.index_key, word)
+        )
+        if rows:
+            return rows[0][0]
+
+        factor = self.min_ratio / (2 - self.min_ratio)
+        low, high = int(len(word) * factor) + 1, int(len(word) / factor) if factor else len(word)
+        rows = self._connections.query_in(
+            'SELECT e.name, e.value FROM fuzzy_entries e JOIN ('
+            '  SELECT entry_id, count(*) AS shared FROM fuzzy_grams'
+            '  WHERE index_key = ? AND length BETWEEN ? AND ? AND gram IN ({})'
+            '  GROUP BY entry_id ORDER BY shared DESC, entry_id LIMIT ?'
+            ') c ON c.entry_id = e.id ORDER BY e.id',
+            sorted(FuzzyNameIndex._grams(word)),
+            prefix=(self.index_key, low, high), suffix=(self.max_candidates,)
+        )
+        return best_fuzzy_match(word, rows, self.min_ratio)
+
+class SQLiteInteractionGraph:
+    """Interaction lookups with the ``InteractionGraph`` interface, read from SQLite"""
+
+    def __init__(self, connections: _Connections, interaction_count: int):
+        self._connections = connections
+        self._names = SQLiteNameIndex(connections, INTERACTION_INDEX_KEY, min_ratio=INTERACTION_MATCH_RATIO)
+        self.interaction_count = interaction_count
+
+    def resolve(self, name: str) -> Optional[str]:
+        name = ' '.join(name.lower().split())
+        rows = self._connections.query('SELECT node FROM interaction_aliases WHERE alias = ?', (name,))
+        return rows[0][0] if rows else self._names.lookup(name)
+
+    def find(self, nodes: List[str]) -> List[Interaction]:
+        position: Dict[str, int] = {}
+        for node in nodes:
+            position.setdefault(node, len(position))
+        if not position:
+            return []
+        rows = self._connections.query_in(
+            'SELECT node, other, interaction_id, first, second, source, description'
+            ' FROM interaction_edges WHERE node IN ({})', list(position)
+        )
+        found = [
+            (position[node], position[other], interaction_id, Interaction((first, second), source, description))
+            for node, other, interaction_id, first, second, source, description in rows
+            if position.get(other, -1) > position[node]
+        ]
+        found.sort(key=lambda item: item[:3])
+        return [item[3] for item in found]
+
+class SQLiteKeywordMatcher:
+    """Keyword matcher with the ``KeywordAutomaton.scan`` interface
+
+    Every keyword is stored with its first ``HEAD_LENGTH`` characters. A scan
+    looks up the distinct substrings of the query at each position in one
+    indexed query and keeps the candidates that occur in full, so hits have
+    the same substring semantics as the in-memory automaton.
+    """
+
+    def __init__(self, connections: _Connections):
+        self._connections = connections
+        self._max_length = connections.query('SELECT MAX(LENGTH(phrase)) FROM keywords')[0][0] or 0
+
+    def feed(self, state: Optional[str], text: str, offset: int = 0) -> Tuple[str, List[KeywordHit]]:
+        """``KeywordAutomaton.feed``: the state is the scanned text a keyword ending in later text may start in"""
+        tail = state or ''
+        window = tail + text
+        shift = offset - len(tail)
+        hits = [KeywordHit(hit.category, hit.keyword, hit.value, hit.rank, hit.start + shift, hit.end + shift)
+                for hit in self.scan(window) if hit.end > len(tail)]
+        return window[max(0, len(window) - self._max_length + 1):], hits
+
+    def scan(self, text: str) -> List[KeywordHit]:
+        heads = {text[i:i + size] for i in range(len(text)) for size in range(1, HEAD_LENGTH + 1)}
+        if not heads:
+            return []
+        rows = self._connections.query_in(
+            'SELECT DISTINCT phrase, category, value, rank FROM keywords WHERE head IN ({})', sorted(heads)
+        )
+        hits = []
+        for phrase, category, value, rank in rows:
+            start = text.find(phrase)
+            while start >= 0:
+                hits.append(KeywordHit(category, phrase, value, rank, start, start + len(phrase)))
+                start = text.find(phrase, start + 1)
+        hits.sort(key=lambda hit: (hit.end, hit.start))
+        return hits
+
+class SQLiteKnowledgeBase:
+    """Knowledge base engine serving the catalog from a local SQLite file
+
+    Exposes the same attributes as ``MedicalKnowledgeBase`` (``medicines``,
+    ``symptoms_to_medicines``, ``danger_keywords``, ``version`` and the
+    derived indexes) without loading the catalog into the worker.
+    """
+
+    # Records are queried on each access, so nothing is rendered per record up front
+    records_on_demand = True
+
+    def __init__(self, source: str):
+        self.source = source
+        self._connections = _Connections(source)
+        self.medicines = SQLiteCatalog(self._connections)
+        self.symptoms_to_medicines = SQLiteSymptomIndex(self._connections)
+        self.symptom_index = self.symptoms_to_medicines
+        self.catalog_index = SQLiteCatalogIndex(self._connections)
+        self._build_indexes()
+
+    def refresh(self):
+        """Re-read metadata after the database file was rebuilt"""
+        self._build_indexes()
+
+    def _build_indexes(self):
+        meta = dict(self._connections.query('SELECT key, value FROM meta'))
+        self.version = meta['version']
+        self.danger_keywords = [keyword for (keyword,) in self._connections.query(
+            'SELECT keyword FROM danger_keywords ORDER BY id'
+        )]
+        self.name_index = SQLiteNameIndex(self._connections, 'name')
+        self.phrase_indexes = {
+            size: SQLiteNameIndex(self._connections, _phrase_index_key(size), min_ratio=PHRASE_MATCH_RATIO)
+            for size in json.loads(meta['phrase_sizes'])
+        }
+        self.keywords = SQLiteKeywordMatcher(self._connections)
+        self.interactions = SQLiteInteractionGraph(self._connections, int(meta['interaction_count']))
+
+    def search(self, text: str, limit: int = 20) -> List[str]:
+        """Full-text search over names, uses and categories, best match first"""
+        terms = _TOKEN_PATTERN.findall(text.lower())
+        if not terms:
+            return []
+        match = ' OR '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        rows = self._connections.query(
+            'SELECT m.key FROM medicine_fts JOIN medicines m ON m.id = medicine_fts.rowid '
+            'WHERE medicine_fts MATCH ? ORDER BY medicine_fts.rank LIMIT ?', (match, limit)
+        )
+        return [key for (key,) in rows]
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    source, target = sys.argv[1], sys.argv[2]
+    with open(source, encoding='utf-8') as f:
+        report = build_database(json.load(f), target)
+    print(f"🗄️  Wrote {target}: {report['medicines']} medicines, "
+          f"{report['keywords']} keywords, {report['fuzzy_entries']} fuzzy entries")
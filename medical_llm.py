@@ -0,0 +1,190 @@
+"""
+Language model client for answers the knowledge base cannot give
+Pooled HTTP, per-call deadlines, single-flight coalescing and a circuit breaker
+
+The client speaks the OpenAI chat completions protocol, so any compatible
+endpoint (or a local stub in tests) can serve it. Every failure mode ends in
+``None``, letting the caller keep its canned answer.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Stop calling an upstream after consecutive failures
+
+    Opens after ``failure_threshold`` failed or slow calls in a row. While
+    open every call is refused; after ``reset_timeout`` seconds a single
+    trial call is let through, closing the breaker if it succeeds and
+    re-opening it otherwise.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half_open' if self._trial else 'open'
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or self._clock() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, success: bool):
+        """Report the outcome of a call that allow() let through"""
+        with self._lock:
+            self._trial = False
+            if success:
+                self._failures, self._opened_at = 0, None
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+
+class LLMClient:
+    """Chat completion client that never holds a caller past its deadline
+
+    Identical questions asked while one is in flight share its upstream
+    call. At most ``max_concurrent`` calls run at once, and at most as many
+    threads block in ask(); beyond that, and while the circuit is open,
+    questions are refused immediately. Keep it below the server's worker
+    threads so a hanging upstream cannot occupy all of them. Calls taking
+    longer than ``timeout`` count as failures for the breaker.
+    """
+
+    def __init__(self, url: str, api_key: str = '', model: str = 'gpt-3.5-turbo',
+                 system_prompt: str = '', timeout: float = 2.0, max_concurrent: int = 4,
+                 max_tokens: int = 300, breaker: Optional[CircuitBreaker] = None):
+        self.url = url
+        self.model = model
+        self.system_prompt = system_prompt
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.max_tokens = max_tokens
+        self.breaker = breaker or CircuitBreaker()
+
+        # Imported here so processes without the fallback start faster
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='medical-llm')
+        self._lock = threading.Lock()
+        self._waiting = threading.BoundedSemaphore(max_concurrent)
+        self._in_flight: Dict[str, Future] = {}
+        self.stats = {'calls': 0, 'failures': 0, 'coalesced': 0, 'timeouts': 0,
+                      'short_circuited': 0, 'rejected': 0}
+
+    def submit(self, question: str) -> Optional[Future]:
+        """Future for the answer to question, or None when no call can be made"""
+        key = ' '.join(question.lower().split())
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return future
+            if len(self._in_flight) >= self.max_concurrent:
+                self.stats['rejected'] += 1
+                return None
+            if not self.breaker.allow():
+                self.stats['short_circuited'] += 1
+                return None
+            future = self._in_flight[key] = Future()
+            self.stats['calls'] += 1
+        self._executor.submit(self._run, key, question, future)
+        return future
+
+    def ask(self, question: str) -> Optional[str]:
+        """Answer question within the deadline, or None"""
+        if not self._waiting.acquire(blocking=False):
+            with self._lock:
+                self.stats['rejected'] += 1
+            return None
+        try:
+            future = self.submit(question)
+            if future is None:
+                return None
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.record_timeout()
+            return None
+        except Exception:
+            return None
+        finally:
+            self._waiting.release()
+
+    def record_timeout(self):
+        """Count a caller that stopped waiting at its deadline"""
+        with self._lock:
+            self.stats['timeouts'] += 1
+
+    def _run(self, key: str, question: str, future: Future):
+        future.set_running_or_notify_cancel()
+        start = time.perf_counter()
+        try:
+            answer = self._complete(question)
+        except Exception as e:
+            logger.warning(f"Language model call failed: {str(e)}")
+            with self._lock:
+                self.stats['failures'] += 1
+                del self._in_flight[key]
+            self.breaker.record(False)
+            future.set_exception(e)
+            return
+
+        with self._lock:
+            del self._in_flight[key]
+        self.breaker.record(time.perf_counter() - start <= self.timeout)
+        future.set_result(answer)
+
+    def _complete(self, question: str) -> str:
+        messages = [{'role': 'user', 'content': question}]
+        if self.system_prompt:
+            messages.insert(0, {'role': 'system', 'content': self.system_prompt})
+        response = self.session.post(self.url, timeout=self.timeout, json={
+            'model': self.model,
+            'messages': messages,
+            'max_tokens': self.max_tokens,
+            'temperature': 0.2
+        })
+        response.raise_for_status()
+        answer = response.json()['choices'][0]['message']['content'].strip()
+        if not answer:
+            raise ValueError('Empty completion')
+        return answer
+
+    def status(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats, in_flight=len(self._in_flight))
+        stats['circuit'] = self.breaker.state
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,245 @@
+"""
+Similarity cache for answers to near-duplicate questions
+Hashed character n-gram similarity over a typo-tolerant word index
+
+Questions are reduced to the set of hashed character trigrams of their
+content words, and the cosine of two such sets scores their similarity.
+Because one differing drug name barely moves the similarity of a long
+question, a stored question must also use the same content words, allowing
+only single-edit typos of words of five or more letters. The index finds
+those neighbours directly: every word is posted under itself and, when
+long enough, each of its single-character deletions, one of which any
+one-edit typo of it shares.
+
+Callers whose scopes already tell question types apart can pass the words
+naming those types as ``ignored_words`` too, so "crocin uses" and "what does
+crocin treat" reduce to the same content words.
+"""
+
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+
+_WORD_PATTERN = re.compile(r"[\w']+")
+
+# Function words and auxiliaries carry no meaning for matching questions to answers
+STOP_WORDS = frozenset([
+    'a', 'about', 'am', 'an', 'and', 'any', 'are', 'at', 'be', 'been', 'by', 'can', 'could', 'did', 'do',
+    'does', 'for', 'had', 'has', 'have', 'how', 'i', 'in', 'is', 'it', 'its', 'may', 'me', 'might', 'must',
+    'my', 'of', 'on', 'please', 'shall', 'should', 'tell', 'that', 'the', 'there', 'this', 'to', 'was',
+    'were', 'what', "what's", 'whats', 'will', 'with', 'would', 'you'
+])
+
+# Shorter words must match exactly; one edit turns them into other words
+MIN_TYPO_LENGTH = 5
+
+def content_words(text: str, ignored_words: FrozenSet[str] = STOP_WORDS) -> FrozenSet[str]:
+    """Lowercased words of text other than stop words"""
+    return frozenset(word for word in _WORD_PATTERN.findall(text.lower()) if word not in ignored_words)
+
+def ngram_features(words: Iterable[str], n: int = 3) -> FrozenSet[int]:
+    """Hashed character n-grams of a set of words"""
+    features = set()
+    for word in words:
+        padded = f' {word} '
+        for i in range(max(1, len(padded) - n + 1)):
+            features.add(zlib.crc32(padded[i:i + n].encode('utf-8')))
+    return frozenset(features)
+
+def cosine_similarity(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    """Cosine similarity of two feature sets as binary vectors"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Whether b is a one-character substitution, insertion, deletion or transposition of a"""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or a[i:i + 2] == b[i + 1:i:-1] and a[i + 2:] == b[i + 2:]
+
+def words_agree(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    """Whether two word sets differ only by single-edit typos of words of five or more letters"""
+    only_a, only_b = a - b, list(b - a)
+    if len(only_a) != len(only_b):
+        return False
+    for word in only_a:
+        for i, other in enumerate(only_b):
+            if min(len(word), len(other)) >= MIN_TYPO_LENGTH and _within_one_edit(word, other):
+                del only_b[i]
+                break
+        else:
+            return False
+    return True
+
+def word_keys(word: str) -> Tuple[str, ...]:
+    """Index keys shared by a word and every typo words_agree accepts for it"""
+    if len(word) < MIN_TYPO_LENGTH:
+        return (word,)
+    return (word,) + tuple(word[:i] + word[i + 1:] for i in range(len(word)))
+
+class _Entry:
+    __slots__ = ('words', 'features', 'scope', 'keys', 'value', 'expires_at')
+
+    def __init__(self, words, features, scope, keys, value, expires_at):
+        self.words = words
+        self.features = features
+        self.scope = scope
+        self.keys = keys
+        self.value = value
+        self.expires_at = expires_at
+
+class SemanticCache:
+    """Thread-safe answer cache matching questions by n-gram similarity
+
+    A lookup hits when a stored question with the same ``scope`` has cosine
+    similarity of at least ``threshold`` and agreeing content words. Scopes
+    keep answers apart that similar wording must not share, and
+    ``ignored_words`` (the stop words by default) are left out of matching.
+    The cache holds at most ``maxsize`` entries, evicting the least recently
+    used, and entries optionally expire ``ttl`` seconds after they were stored.
+    """
+
+    def __init__(self, maxsize: int, threshold: float = 0.7, ttl: Optional[float] = None,
+                 ignored_words: FrozenSet[str] = STOP_WORDS):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.ignored_words = ignored_words
+        self._entries: 'OrderedDict[int, _Entry]' = OrderedDict()
+        self._exact: Dict[Tuple[FrozenSet[str], Hashable], int] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, text: str, scope: Hashable = None, default=None):
+        """Return the answer stored for the most similar question, if similar enough"""
+        if self.maxsize <= 0:
+            return default
+        words = content_words(text, self.ignored_words)
+        with self._lock:
+            entry_id = self._exact.get((words, scope))
+        if entry_id is None:
+            features = ngram_features(words)
+            keys = [word_keys(word) for word in words]
+        now = time.monotonic()
+
+        with self._lock:
+            if entry_id is None:
+                best, best_similarity = None, self.threshold
+                for candidate in self._candidates(keys):
+                    entry = self._entries[candidate]
+                    if entry.scope != scope:
+                        continue
+                    similarity = cosine_similarity(features, entry.features)
+                    if similarity >= best_similarity and words_agree(words, entry.words):
+                        best, best_similarity = candidate, similarity
+                entry_id = best
+                similar = True
+            else:
+                similar = False
+
+            entry = self._entries.get(entry_id) if entry_id is not None else None
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                self._remove(entry_id)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            self.similar_hits += similar
+            return entry.value
+
+    def _candidates(self, keys: List[Tuple[str, ...]]) -> Set[int]:
+        """Stored questions holding a word like each of the question's words"""
+        if not keys:
+            return set()
+        postings = self._postings
+        matches = [[postings[key] for key in word if key in postings] for word in keys]
+        # Start from the rarest word and keep the entries that also match the others
+        matches.sort(key=lambda found: sum(map(len, found)))
+        candidates = set().union(*matches[0])
+        for found in matches[1:]:
+            if not candidates:
+                break
+            candidates = {item for item in candidates if any(item in posting for posting in found)}
+        return candidates
+
+    def put(self, text: str, value, scope: Hashable = None):
+        """Store the answer to a question, evicting the least recently used when full"""
+        if self.maxsize <= 0:
+            return
+        words = content_words(text, self.ignored_words)
+        if not words:
+            return
+        features = ngram_features(words)
+        keys = frozenset(key for word in words for key in word_keys(word))
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            previous = self._exact.get((words, scope))
+            if previous is not None:
+                self._remove(previous)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(words, features, scope, keys, value, expires_at)
+            self._exact[(words, scope)] = entry_id
+            for key in keys:
+                self._postings.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        del self._exact[(entry.words, entry.scope)]
+        for key in entry.keys:
+            posting = self._postings[key]
+            posting.discard(entry_id)
+            if not posting:
+                del self._postings[key]
+
+    def clear(self):
+        """Drop every cached entry, keeping the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+            self._postings.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Snapshot of size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
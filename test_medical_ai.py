@@ -53,6 +53,21 @@ class TestMedicalQueryProcessor:
             analysis = query_processor.analyze_query(query)
             assert len(analysis.safety_flags) > 0
     
+    def test_danger_and_symptom_words_are_not_corrected(self):
+        """Test that exact danger and symptom words never become medicine names"""
+        analysis = query_processor.analyze_query("my son is choking")
+        assert analysis.safety_flags == ['choking']
+        assert analysis.medicine is None
+        assert 'choking' in analysis.cleaned_text
+        
+        alerts = []
+        session = query_processor.session(on_danger=alerts.append)
+        for word in "my son is choking".split():
+            session.append(word)
+        assert alerts == ['choking']
+        
+        assert 'fever' in query_processor.analyze_query("bad fever").symptoms
+    
     def test_symptom_extraction(self):
         """Test that symptoms are correctly extracted"""
         query = "I have a headache and fever, what should I take?"
@@ -73,6 +88,215 @@ class TestMedicalQueryProcessor:
             analysis = query_processor.analyze_query(query)
             assert analysis.query_type == expected_type
 
+    def test_normalized_query_tokens(self):
+        """Test that the normalized query exposes lowercased tokens"""
+        from medical_ai_backend import NormalizedQuery
+
+        normalized = NormalizedQuery.from_text("Hay Fever, again?")
+        assert normalized.text == 'hay fever, again?'
+        assert normalized.tokens == ['hay', 'fever', 'again']
+        assert NormalizedQuery.from_tokens(normalized.tokens).text == 'hay fever again'
+
+    def test_analysis_uses_cleaned_normalized_text(self):
+        """Test that analysis stages see the cleaned, corrected text"""
+        normalized = query_processor.normalize_query("Um, is Tylenol OK for a headache, you know?")
+        assert normalized.text == "is paracetamol ok for a headache"
+        assert {hit.value for hit in normalized.hits} >= {'paracetamol', 'headache'}
+
+    def test_phrase_correction(self):
+        """Test that garbled multi-word phrases are corrected as a unit"""
+        test_cases = [
+            ("I have hey fever", "hay fever", 'symptoms'),
+            ("acid reflex at night", "acid reflux", 'symptoms'),
+            ("my blood sugger is high", "blood sugar", 'symptoms'),
+            ("I think it's a hart attack", "heart attack", 'safety_flags')
+        ]
+
+        for query, phrase, field in test_cases:
+            analysis = query_processor.analyze_query(query)
+            assert phrase in analysis.cleaned_text
+            assert phrase in getattr(analysis, field)
+
+    def test_phrase_correction_keeps_neighbouring_words(self):
+        """Test that phrase matching does not rewrite ordinary word pairs"""
+        analysis = query_processor.analyze_query("the pain is bad")
+        assert analysis.cleaned_text == "the pain is bad"
+        assert analysis.safety_flags == []
+
+class TestQueryTypeClassifier:
+    """Test the compiled query type classifier"""
+
+    def test_ranks_all_types_with_scores(self):
+        """Test that every matching type is scored and the strongest wins"""
+        ranked = query_processor.classifier.classify_batch(["Is it safe to take this dose with food?"])[0]
+        assert ranked[0] == ('dosage', 3)
+        assert dict(ranked) == {'dosage': 3, 'warnings': 2, 'interactions': 1}
+
+    def test_batch_classification(self):
+        """Test classifying many queries at once"""
+        queries = [
+            "What are the side effects of ibuprofen?",
+            "How much paracetamol can I take?",
+            "Tell me about omeprazole"
+        ]
+        ranked = query_processor.classifier.classify_batch(queries)
+        assert [types[0][0] for types in ranked] == ['side_effects', 'dosage', 'general']
+
+    def test_keywords_are_not_spell_corrected(self):
+        """Test that query keywords survive medicine name correction"""
+        analysis = query_processor.analyze_query("what is the dose of crocin")
+        assert analysis.cleaned_text == "what is the dose of paracetamol"
+        assert analysis.query_type == 'dosage'
+
+class TestCorrectionCache:
+    """Test the bounded spelling-correction cache"""
+
+    def test_repeat_tokens_hit_the_cache(self):
+        """Test that repeated words are served from the cache"""
+        from medical_ai_backend import MedicalQueryProcessor
+
+        processor = MedicalQueryProcessor(knowledge_base, correction_cache_size=64)
+        processor.clean_query("tylenol for the headache")
+        first = processor.correction_cache.stats()
+        processor.clean_query("Tylenol for the headache")
+        second = processor.correction_cache.stats()
+
+        assert first['misses'] > 0
+        assert second['misses'] == first['misses']
+        assert second['hits'] == first['hits'] + first['misses']
+        assert processor._find_best_medicine_match('tylenol') == 'paracetamol'
+
+    def test_cache_evicts_least_recently_used(self):
+        """Test that the cache stays within its size limit"""
+        from medical_ai_backend import LRUCache
+
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', None)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+
+        assert cache.get('b', 'missing') == 'missing'
+        assert cache.get('a') == 1
+        assert cache.stats()['evictions'] == 1
+        assert len(cache) == 2
+
+    def test_metrics_endpoint(self, client):
+        """Test that cache statistics are exposed over the API"""
+        response = client.get('/api/metrics')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert {'hits', 'misses', 'evictions', 'hit_rate'} <= set(data['correction_cache'])
+
+class TestFuzzyNameIndex:
+    """Test the prebuilt approximate medicine name index"""
+
+    def test_index_agrees_with_linear_scan(self):
+        """Test that the index returns the same best match as scanning every name"""
+        from difflib import SequenceMatcher
+
+        def linear_match(word):
+            best_match, best_ratio = None, 0.6
+            for medicine, data in knowledge_base.medicines.items():
+                for name in data['names']:
+                    ratio = SequenceMatcher(None, word, name).ratio()
+                    if ratio > best_ratio:
+                        best_ratio, best_match = ratio, medicine
+            return best_match
+
+        words = ['tylenl', 'advill', 'ibuprofin', 'zyrtek', 'omeprazol', 'glucofage',
+                 'asprin', 'crocine', 'headache', 'the', 'reaction', 'xyz123medicine']
+        for word in words:
+            assert knowledge_base.name_index.lookup(word) == linear_match(word)
+
+    def test_index_handles_large_catalog(self):
+        """Test lookups against a catalog of thousands of names"""
+        from medical_ai_backend import FuzzyNameIndex
+
+        entries = [(f"brand{i:05d}", f"medicine{i}") for i in range(5000)]
+        entries.append(('zyrtec', 'cetirizine'))
+        index = FuzzyNameIndex(entries)
+
+        assert len(index) == 5001
+        assert index.lookup('zyrtek') == 'cetirizine'
+        assert index.lookup('BRAND01234') == 'medicine1234'
+        assert index.lookup('qqqq') is None
+
+class TestKeywordAutomaton:
+    """Test the single-pass keyword matcher"""
+
+    def test_scan_reports_category_and_position(self):
+        """Test that overlapping keywords are all reported with their offsets"""
+        text = "severe chest pain after tylenol"
+        hits = knowledge_base.keywords.scan(text)
+        found = {(hit.category, hit.value, hit.start, hit.end) for hit in hits}
+
+        assert ('danger', 'chest pain', 7, 17) in found
+        assert ('danger', 'severe pain', 0, 11) not in found
+        assert ('symptom', 'pain', 13, 17) in found
+        assert ('medicine', 'paracetamol', 24, 31) in found
+        for hit in hits:
+            assert text[hit.start:hit.end] == hit.keyword
+
+    def test_hits_are_ranked_in_catalog_order(self):
+        """Test that extracted entities keep the knowledge base ordering"""
+        normalized = query_processor.normalize_query("zyrtec or advil for fever and headache")
+        assert query_processor._extract_medicine(normalized) == 'ibuprofen'
+        assert query_processor._extract_symptoms(normalized) == ['headache', 'fever']
+
+    def test_large_vocabulary(self):
+        """Test matching with thousands of keywords"""
+        from medical_ai_backend import KeywordAutomaton
+
+        entries = [(f"symptom{i}x", 'symptom', f"symptom{i}x", i) for i in range(3000)]
+        automaton = KeywordAutomaton(entries)
+        hits = automaton.scan("i have symptom42x and symptom2999x")
+        assert [hit.value for hit in hits] == ['symptom42x', 'symptom2999x']
+
+class TestAnalysisSession:
+    """Test incremental analysis of partial transcripts"""
+
+    QUERIES = [
+        "um, what is, like, paracetamol used for, you know?", "I think I took an overdose of aspirin",
+        "chest pian and diffculty breathing", "what are the side effects of ibuprofen",
+        "how much metformin should I take", "can I take crocinn together with asprin",
+        "what helps with headache and fever", "you know you know you", "what\u2019s the dose of cetrizine",
+        "is it safe to take omeprazole with food", "side effects", "hello"
+    ]
+
+    def test_matches_full_analysis(self):
+        """Test that the analysis after every word equals analyzing the transcript so far"""
+        for query in self.QUERIES:
+            words = query.split()
+            session = query_processor.session()
+            for i, word in enumerate(words):
+                session.append(word)
+                assert session.analyze() == query_processor.analyze_query(' '.join(words[:i + 1]))
+
+            chunked = query_processor.session()
+            for i in range(0, len(words), 3):
+                chunked.append(' '.join(words[i:i + 3]))
+            assert chunked.analyze() == query_processor.analyze_query(' '.join(words))
+
+    def test_danger_callback_fires_on_the_word(self):
+        """Test that danger keywords alert once, as soon as their last word arrives"""
+        alerts, seen = [], []
+        session = query_processor.session(on_danger=lambda keyword: alerts.append((keyword, len(seen))))
+        for word in "I think I took an overdose of my pills and now chest pian overdose".split():
+            seen.append(word)
+            session.append(word)
+        assert alerts == [('overdose', 6), ('chest pain', 13)]
+        assert session.analyze().safety_flags == ['overdose', 'chest pain']
+
+    def test_automaton_feed_matches_scan(self):
+        """Test that a scan fed in pieces reports the hits of one scan"""
+        text = "severe chest pain after tylenol and a seizure"
+        expected = knowledge_base.keywords.scan(text)
+        for split in range(len(text) + 1):
+            state, hits = knowledge_base.keywords.feed(None, text[:split])
+            state, more = knowledge_base.keywords.feed(state, text[split:], split)
+            assert hits + more == expected
+
 class TestMedicalResponseGenerator:
     """Test medical response generation"""
     
@@ -180,6 +404,1116 @@ class TestMedicalResponseGenerator:
         assert "pharmacist" in response.text.lower()
         assert "healthcare provider" in response.text.lower()
 
+class TestSymptomIndex:
+    """Test ranked multi-symptom recommendations"""
+
+    def test_rank_prefers_broadest_coverage(self):
+        """Test that medicines treating the most symptoms come first"""
+        matches = knowledge_base.symptom_index.rank(['fever', 'headache', 'inflammation'])
+        assert matches[0].medicine == 'ibuprofen'
+        assert matches[0].symptoms == ('fever', 'headache', 'inflammation')
+        assert [match.medicine for match in matches] == ['ibuprofen', 'aspirin', 'paracetamol']
+
+    def test_rank_top_k_and_unknown_symptoms(self):
+        """Test that results are capped and unknown symptoms are ignored"""
+        from medical_ai_backend import SymptomIndex
+
+        symptoms = {f"symptom{i}": [f"medicine{j}" for j in range(i, i + 50)] for i in range(2000)}
+        index = SymptomIndex(symptoms, [f"medicine{j}" for j in range(3000)])
+        matches = index.rank(['symptom10', 'symptom20', 'symptom30', 'no such symptom'], k=5)
+        assert len(matches) == 5
+        assert matches[0].medicine == 'medicine30'
+        assert matches[0].symptoms == ('symptom10', 'symptom20', 'symptom30')
+        assert index.rank(['no such symptom']) == []
+
+    def test_symptom_response_lists_ranked_medicines(self):
+        """Test that multi-symptom answers lead with the best covering medicine"""
+        query = query_processor.analyze_query("I have fever, headache and inflammation")
+        response = response_generator.generate_response(query)
+        assert "**Best matches for your symptoms:**" in response.text
+        assert response.text.index('Ibuprofen') < response.text.index('Paracetamol')
+        assert "(for headache, fever, inflammation)" in response.text
+
+class TestInteractionGraph:
+    """Test the drug interaction graph and checker endpoint"""
+
+    def test_interactions_parsed_into_graph(self):
+        """Test that free-text interactions become structured edges"""
+        from medical_ai_backend import Interaction
+
+        graph = knowledge_base.interactions
+        assert graph.interaction_count == sum(
+            len(data['interactions']) for data in knowledge_base.medicines.values()
+        )
+        assert graph.find(['ibuprofen', 'warfarin']) == [
+            Interaction(('ibuprofen', 'warfarin'), 'ibuprofen', 'increased bleeding risk')
+        ]
+        # Edges are undirected
+        assert graph.find(['warfarin', 'ibuprofen']) == graph.find(['ibuprofen', 'warfarin'])
+
+    def test_resolve_brand_names_and_misspellings(self):
+        """Test that brand names resolve and unrelated drugs are not guessed"""
+        graph = knowledge_base.interactions
+        assert graph.resolve('Crocin') == 'paracetamol'
+        assert graph.resolve('Warfrin') == 'warfarin'
+        assert graph.resolve('tramadol') is None
+
+    def test_all_pairs_in_long_medication_list(self):
+        """Test that every pair among many medications is checked"""
+        from medical_ai_backend import InteractionGraph
+
+        medicines = {
+            f"drug{i}": {'names': [f"drug{i}"], 'interactions': [f"Drug{j}: effect {i}-{j}" for j in range(i)]}
+            for i in range(30)
+        }
+        graph = InteractionGraph(medicines)
+        found = graph.find([f"drug{i}" for i in range(25)])
+        assert len(found) == 25 * 24 // 2
+        assert len({frozenset(interaction.medicines) for interaction in found}) == len(found)
+
+    def test_interactions_endpoint(self, client):
+        """Test that the endpoint reports pairwise interactions and unknown names"""
+        response = client.post('/api/interactions', data=json.dumps({
+            'medications': ['Crocin', 'Advil', 'warfarin', 'vitamin d', 'alcohol']
+        }), content_type='application/json')
+        assert response.status_code == 200
+
+        data = json.loads(response.data)
+        pairs = [sorted(interaction['medications']) for interaction in data['interactions']]
+        assert ['paracetamol', 'warfarin'] in pairs
+        assert ['alcohol', 'paracetamol'] in pairs
+        assert ['ibuprofen', 'warfarin'] in pairs
+        assert data['count'] == len(data['interactions'])
+        assert data['unrecognized'] == ['vitamin d']
+        assert data['medications'][1] == {'input': 'Advil', 'resolved': 'ibuprofen'}
+
+    def test_interactions_endpoint_validation(self, client):
+        """Test that missing, invalid or oversized lists are rejected"""
+        import medical_ai_backend
+
+        for payload in ({}, {'medications': []}, {'medications': 'aspirin'}, {'medications': ['aspirin', '']}):
+            response = client.post('/api/interactions', data=json.dumps(payload), content_type='application/json')
+            assert response.status_code == 400
+        too_many = ['aspirin'] * (medical_ai_backend.MAX_MEDICATIONS + 1)
+        response = client.post('/api/interactions', data=json.dumps({'medications': too_many}),
+                               content_type='application/json')
+        assert response.status_code == 400
+
+class TestResponseCache:
+    """Test caching of rendered responses"""
+
+    def test_repeat_analysis_is_served_from_cache(self):
+        """Test that identical analyses skip rendering"""
+        from medical_ai_backend import MedicalResponseGenerator
+
+        generator = MedicalResponseGenerator(knowledge_base, cache_size=8)
+        query = query_processor.analyze_query("What is the dosage for paracetamol?")
+        first = generator.generate_response(query)
+        second = generator.generate_response(query_processor.analyze_query("paracetamol dosage?"))
+
+        assert second is first
+        assert generator.response_cache.stats()['hits'] == 1
+
+    def test_cache_entries_expire(self):
+        """Test that entries older than the TTL are not served"""
+        import time
+        from medical_ai_backend import LRUCache
+
+        cache = LRUCache(4, ttl=0.01)
+        cache.put('key', 'value')
+        assert cache.get('key') == 'value'
+        time.sleep(0.02)
+        assert cache.get('key') is None
+        assert cache.stats()['expirations'] == 1
+
+    def test_cache_invalidated_when_knowledge_base_changes(self):
+        """Test that catalog edits are reflected immediately"""
+        from medical_ai_backend import MedicalKnowledgeBase, MedicalResponseGenerator, MedicineRecord
+
+        kb = MedicalKnowledgeBase()
+        generator = MedicalResponseGenerator(kb)
+        query = query_processor.analyze_query("What is cetirizine used for?")
+        assert 'Motion sickness' not in generator.generate_response(query).text
+
+        version = kb.version
+        entry = kb.medicines['cetirizine'].to_dict()
+        entry['uses'].append('Motion sickness')
+        kb.medicines['cetirizine'] = MedicineRecord(entry)
+        kb.refresh()
+
+        assert kb.version != version
+        assert 'Motion sickness' in generator.generate_response(query).text
+
+class TestResponseTemplates:
+    """Test pre-rendered medicine response bodies"""
+
+    def test_templates_match_on_demand_rendering(self):
+        """Test that precompiled answers are identical to rendering on demand"""
+        from medical_ai_backend import MedicalQuery, MedicalResponseGenerator
+
+        precompiled = MedicalResponseGenerator(knowledge_base, cache_size=0)
+        on_demand = MedicalResponseGenerator(knowledge_base, cache_size=0, precompile=False)
+        for medicine in knowledge_base.medicines:
+            for query_type in MedicalResponseGenerator.MEDICINE_QUERY_TYPES:
+                query = MedicalQuery("", "", "medicine_info", medicine, [], query_type, 0.9, [])
+                assert precompiled.generate_response(query) == on_demand.generate_response(query)
+
+    def test_template_report(self):
+        """Test that the startup cost of templates is reported"""
+        report = response_generator.template_report
+        assert report['enabled'] is True
+        assert report['templates'] == len(knowledge_base.medicines) * 6
+        assert report['bytes'] > 0
+
+class TestCompactCatalog:
+    """Test the immutable, interned catalog representation"""
+
+    def test_records_are_immutable_and_compact(self):
+        """Test that records use slots and tuples and reject modification"""
+        record = knowledge_base.medicines['paracetamol']
+        assert not hasattr(record, '__dict__')
+        assert isinstance(record['names'], tuple)
+        assert record['names'][0] == 'paracetamol'
+        assert record.get('missing_field') is None
+        with pytest.raises(AttributeError):
+            record.category = 'Changed'
+        with pytest.raises(TypeError):
+            record['dosage']['adult'] = 'any amount'
+
+    def test_strings_are_shared_across_records(self):
+        """Test that equal text in different entries is one interned object"""
+        import sys
+
+        categories = [record['category'] for record in knowledge_base.medicines.values()]
+        assert all(category is sys.intern(category) for category in categories)
+        symptom_medicines = knowledge_base.symptoms_to_medicines['pain']
+        assert symptom_medicines[0] is next(key for key in knowledge_base.medicines if key == symptom_medicines[0])
+
+    def test_record_round_trip(self):
+        """Test that records convert back to the JSON entries and pickle cleanly"""
+        import pickle
+        from medical_ai_backend import MedicineRecord
+
+        with open(knowledge_base.source, encoding='utf-8') as f:
+            entry = json.load(f)['medicines']['ibuprofen']
+        record = MedicineRecord(entry)
+        assert record.to_dict() == entry
+        assert pickle.loads(pickle.dumps(record)).to_dict() == entry
+        with pytest.raises(ValueError):
+            MedicineRecord(dict(entry, price='10'))
+
+class TestKnowledgeBaseSnapshot:
+    """Test the external catalog and its compiled binary snapshot"""
+
+    def test_snapshot_round_trip(self, tmp_path):
+        """Test that a snapshot decodes to the same catalog in the same order"""
+        from medical_kb_snapshot import KnowledgeBaseSnapshot, build_snapshot
+
+        path = str(tmp_path / 'catalog.mkb')
+        build_snapshot({
+            'medicines': knowledge_base.medicines,
+            'symptoms_to_medicines': knowledge_base.symptoms_to_medicines,
+            'danger_keywords': knowledge_base.danger_keywords
+        }, path)
+        snapshot = KnowledgeBaseSnapshot(path)
+
+        assert snapshot.version == knowledge_base.version
+        assert list(snapshot.medicines) == list(knowledge_base.medicines)
+        assert snapshot.medicines['aspirin'] == knowledge_base.medicines['aspirin'].to_dict()
+        assert 'xyz123medicine' not in snapshot.medicines
+        assert snapshot.danger_keywords == list(knowledge_base.danger_keywords)
+        snapshot.close()
+
+    def test_knowledge_base_loads_from_snapshot(self, tmp_path):
+        """Test that analysis behaves identically on a snapshot-backed catalog"""
+        from medical_ai_backend import MedicalKnowledgeBase, MedicalQueryProcessor
+        from medical_kb_snapshot import build_snapshot
+
+        path = str(tmp_path / 'catalog.mkb')
+        with open(knowledge_base.source, encoding='utf-8') as f:
+            build_snapshot(json.load(f), path)
+        kb = MedicalKnowledgeBase(path)
+        assert not set(MedicalKnowledgeBase.INDEXES) & set(vars(kb))
+
+        analysis = MedicalQueryProcessor(kb).analyze_query("What are the side effects of advil?")
+        assert analysis == query_processor.analyze_query("What are the side effects of advil?")
+        assert kb.version == knowledge_base.version
+        assert 'keywords' in vars(kb) and 'catalog_index' not in vars(kb)
+        kb.ensure_indexes()
+        assert kb.catalog_index.count() == len(knowledge_base.medicines)
+
+    def test_rebuild_keeps_open_snapshots_readable(self, tmp_path):
+        """Test that rebuilding a snapshot does not rewrite the file mapped by open readers"""
+        from medical_kb_snapshot import KnowledgeBaseSnapshot, build_snapshot
+
+        path = str(tmp_path / 'catalog.mkb')
+        with open(knowledge_base.source, encoding='utf-8') as f:
+            catalog = json.load(f)
+        build_snapshot(catalog, path)
+        snapshot = KnowledgeBaseSnapshot(path)
+
+        build_snapshot({**catalog, 'medicines': {'aspirin': catalog['medicines']['aspirin']}}, path)
+        assert list(snapshot.medicines) == list(knowledge_base.medicines)
+        assert snapshot.medicines['ibuprofen'] == knowledge_base.medicines['ibuprofen'].to_dict()
+        snapshot.close()
+        rebuilt = KnowledgeBaseSnapshot(path)
+        assert list(rebuilt.medicines) == ['aspirin']
+        rebuilt.close()
+
+class TestSQLiteKnowledgeBase:
+    """Test the SQLite/FTS5 knowledge base engine"""
+
+    @pytest.fixture
+    def sqlite_kb(self, tmp_path):
+        from medical_ai_backend import load_knowledge_base
+        from medical_kb_sqlite import build_database
+
+        path = str(tmp_path / 'catalog.sqlite')
+        with open(knowledge_base.source, encoding='utf-8') as f:
+            build_database(json.load(f), path)
+        return load_knowledge_base(path)
+
+    def test_catalog_matches_json(self, sqlite_kb):
+        """Test that the database serves the same catalog in the same order"""
+        assert sqlite_kb.version == knowledge_base.version
+        assert list(sqlite_kb.medicines) == list(knowledge_base.medicines)
+        assert sqlite_kb.medicines['ibuprofen'] == knowledge_base.medicines['ibuprofen'].to_dict()
+        assert 'xyz123medicine' not in sqlite_kb.medicines
+        assert {symptom: tuple(medicines) for symptom, medicines in sqlite_kb.symptoms_to_medicines.items()} \
+            == knowledge_base.symptoms_to_medicines
+        assert sqlite_kb.danger_keywords == list(knowledge_base.danger_keywords)
+
+    def test_analysis_matches_in_memory_engine(self, sqlite_kb):
+        """Test that corrections, keywords and responses match the in-memory engine"""
+        from medical_ai_backend import MedicalQueryProcessor, MedicalResponseGenerator
+
+        processor = MedicalQueryProcessor(sqlite_kb)
+        generator = MedicalResponseGenerator(sqlite_kb)
+        for query in ["What is paracetmol used for?", "I have headaches and a fever",
+                      "chest pian and diffculty breathing", "can I take crocinn with asprin",
+                      "fever, headache and inflammation"]:
+            analysis = processor.analyze_query(query)
+            assert analysis == query_processor.analyze_query(query)
+            assert generator.generate_response(analysis) == response_generator.generate_response(analysis)
+
+            session = processor.session()
+            for word in query.split():
+                session.append(word)
+            assert session.analyze() == analysis
+
+    def test_rebuild_keeps_open_database_readable(self, sqlite_kb):
+        """Test that rebuilding the database never exposes a partly built file to readers"""
+        import os
+        from medical_kb_sqlite import SQLiteKnowledgeBase, build_database
+
+        with open(knowledge_base.source, encoding='utf-8') as f:
+            catalog = json.load(f)
+        build_database({**catalog, 'medicines': {'aspirin': catalog['medicines']['aspirin']}}, sqlite_kb.source)
+        assert not os.path.exists(sqlite_kb.source + '.tmp')
+        assert sqlite_kb.search('hives antihistamines')[0] == 'cetirizine'
+        assert list(SQLiteKnowledgeBase(sqlite_kb.source).medicines) == ['aspirin']
+
+    def test_full_text_search(self, sqlite_kb):
+        """Test that catalog search ranks medicines by their names and uses"""
+        results = sqlite_kb.search('hives antihistamines')
+        assert results[0] == 'cetirizine'
+        assert sqlite_kb.search('') == []
+
+    def test_serving_state_renders_on_demand(self, sqlite_kb):
+        """Test that workers serving the database do not pre-render the catalog"""
+        from medical_ai_backend import ServingState
+
+        state = ServingState.load(sqlite_kb.source)
+        assert state.response_generator.template_report['templates'] == 0
+        analysis = state.query_processor.analyze_query("What is paracetmol used for?")
+        assert state.response_generator.generate_response(analysis) == response_generator.generate_response(analysis)
+
+    def test_interactions_match_in_memory_graph(self, sqlite_kb):
+        """Test that interaction lookups agree with the in-memory graph"""
+        medications = ['paracetamol', 'warfarin', 'ibuprofen', 'aspirin', 'alcohol', 'metformin', 'omeprazole']
+        assert sqlite_kb.interactions.find(medications) == knowledge_base.interactions.find(medications)
+        assert sqlite_kb.interactions.resolve('Warfrin') == 'warfarin'
+
+    def test_symptom_ranking_matches_in_memory_index(self, sqlite_kb):
+        """Test that SQL symptom ranking agrees with the inverted index"""
+        for symptoms in (['fever', 'headache', 'inflammation'], ['allergy', 'pain'], ['heartburn'], []):
+            assert sqlite_kb.symptom_index.rank(symptoms, 3) == knowledge_base.symptom_index.rank(symptoms, 3)
+
+    def test_build_does_not_load_configured_knowledge_base(self, tmp_path):
+        """Test that building a database works while the backend is configured to serve it"""
+        import os
+        import subprocess
+        import sys
+
+        path = str(tmp_path / 'catalog.sqlite')
+        env = dict(os.environ, MEDICAL_AI_KNOWLEDGE_BASE=path)
+        subprocess.run([sys.executable, 'medical_kb_sqlite.py', knowledge_base.source, path],
+                       env=env, capture_output=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        code = "import sys, medical_kb_sqlite; print('medical_ai_backend' in sys.modules)"
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        assert output.split() == ['False']
+        assert os.path.getsize(path) > 0
+
+class TestHotReload:
+    """Test background reloads of the knowledge base"""
+
+    @pytest.fixture
+    def catalog_path(self, tmp_path):
+        path = tmp_path / 'catalog.json'
+        with open(knowledge_base.source, encoding='utf-8') as f:
+            path.write_text(f.read(), encoding='utf-8')
+        return path
+
+    @staticmethod
+    def _rename_medicine(path, old, new):
+        catalog = json.loads(path.read_text(encoding='utf-8'))
+        catalog['medicines'][new] = catalog['medicines'].pop(old)
+        path.write_text(json.dumps(catalog), encoding='utf-8')
+
+    def test_reload_swaps_state_atomically(self, catalog_path):
+        """Test that a reload publishes a new state and leaves the old one intact"""
+        from medical_ai_backend import KnowledgeBaseReloader
+
+        reloader = KnowledgeBaseReloader(str(catalog_path))
+        previous = reloader.state
+        self._rename_medicine(catalog_path, 'aspirin', 'ecosprin')
+
+        assert reloader.reload(wait=True)
+        assert reloader.state is not previous
+        assert reloader.state.knowledge_base.version != previous.knowledge_base.version
+        assert 'ecosprin' in reloader.state.knowledge_base.medicines
+        # A request holding the previous state keeps answering from it
+        assert 'aspirin' in previous.knowledge_base.medicines
+        assert previous.query_processor.analyze_query("what is aspirin").medicine == 'aspirin'
+        assert reloader.status()['reloads'] == 1
+
+    @pytest.mark.skipif(not hasattr(__import__('os'), 'fork'), reason="needs os.fork")
+    def test_watcher_runs_in_forked_workers(self, catalog_path):
+        """Test that a process forked after watch() polls the catalog on its own"""
+        import os
+        import time
+        from medical_ai_backend import KnowledgeBaseReloader
+
+        reloader = KnowledgeBaseReloader(str(catalog_path))
+        reloader.watch(0.02)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                ok = False
+                try:
+                    self._rename_medicine(catalog_path, 'aspirin', 'ecosprin')
+                    deadline = time.monotonic() + 10
+                    while reloader.reloads == 0 and time.monotonic() < deadline:
+                        time.sleep(0.02)
+                    ok = reloader.status()['watching'] and 'ecosprin' in reloader.state.knowledge_base.medicines
+                finally:
+                    os._exit(0 if ok else 1)
+            _, status = os.waitpid(pid, 0)
+            assert os.WEXITSTATUS(status) == 0
+        finally:
+            reloader.stop()
+
+    def test_failed_reload_keeps_serving(self, catalog_path):
+        """Test that a broken catalog update leaves the current state in place"""
+        from medical_ai_backend import KnowledgeBaseReloader
+
+        reloader = KnowledgeBaseReloader(str(catalog_path))
+        previous = reloader.state
+        catalog_path.write_text('{"medicines": ', encoding='utf-8')
+
+        reloader.reload(wait=True)
+        assert reloader.state is previous
+        assert reloader.status()['last_error']
+
+    def test_admin_reload_endpoint(self, client, catalog_path, monkeypatch):
+        """Test that the admin endpoint requires the token and reloads the catalog"""
+        import medical_ai_backend
+        from medical_ai_backend import KnowledgeBaseReloader
+
+        monkeypatch.setattr(medical_ai_backend, 'serving', KnowledgeBaseReloader(str(catalog_path)))
+        monkeypatch.setattr(medical_ai_backend, 'ADMIN_TOKEN', 'secret')
+        assert client.post('/api/admin/reload', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+
+        self._rename_medicine(catalog_path, 'aspirin', 'ecosprin')
+        response = client.post('/api/admin/reload', data=json.dumps({'wait': True}),
+                               content_type='application/json', headers={'X-Admin-Token': 'secret'})
+        assert response.status_code == 200
+        assert json.loads(response.data)['reloads'] == 1
+
+        medicines = json.loads(client.get('/api/medicines').data)['medicines']
+        assert 'ecosprin' in [medicine['name'] for medicine in medicines]
+
+class TestPrebuiltState:
+    """Test serving state prebuilt for fast cold starts"""
+
+    def test_prebuilt_state_round_trip(self, tmp_path):
+        """Test that a prebuilt state answers like a built one and is ignored once stale"""
+        from medical_ai_backend import KnowledgeBaseReloader, save_serving_state
+        from medical_kb_snapshot import build_snapshot
+
+        json_path = tmp_path / 'catalog.json'
+        with open(knowledge_base.source, encoding='utf-8') as f:
+            json_path.write_text(f.read(), encoding='utf-8')
+        mkb_path = str(tmp_path / 'catalog.mkb')
+        build_snapshot(json.loads(json_path.read_text(encoding='utf-8')), mkb_path)
+
+        for source in (str(json_path), mkb_path):
+            built = save_serving_state(source=source)
+            reloader = KnowledgeBaseReloader(source)
+            assert reloader.prebuilt
+            state = reloader.state
+            assert state.knowledge_base.version == built.knowledge_base.version
+            query = state.query_processor.analyze_query("ibuprofen dosage, I also take aspirin")
+            assert query == built.query_processor.analyze_query("ibuprofen dosage, I also take aspirin")
+            assert state.response_generator.generate_response(query) == built.response_generator.generate_response(query)
+            assert 'aspirin' in state.knowledge_base.medicines
+
+        json_path.write_text(json_path.read_text(encoding='utf-8') + ' ', encoding='utf-8')
+        reloader = KnowledgeBaseReloader(str(json_path))
+        assert not reloader.prebuilt
+        assert reloader.state.knowledge_base.version == knowledge_base.version
+
+        assert save_serving_state(source=str(json_path), state=reloader.state) is reloader.state
+        assert KnowledgeBaseReloader(str(json_path)).prebuilt
+
+    def test_startup_defers_optional_imports(self):
+        """Test that importing the backend skips modules only optional features use"""
+        import subprocess
+        import sys
+
+        code = ("import sys, json, medical_ai_backend as m; "
+                "print(json.dumps([sorted(m.STARTUP_TIMINGS), [n for n in ('openai', 'requests') if n in sys.modules]]))")
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        timings, loaded = json.loads(output.strip().splitlines()[-1])
+        assert timings == ['imports', 'serving_state', 'total']
+        assert loaded == []
+
+class TestVersionedBodies:
+    """Test pre-serialized bodies with ETag revalidation"""
+
+    def test_medicines_etag_and_not_modified(self, client):
+        """Test that a matching If-None-Match gets an empty 304"""
+        response = client.get('/api/medicines?limit=2')
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        assert etag.strip('"').startswith(knowledge_base.version)
+
+        revalidated = client.get('/api/medicines?limit=2', headers={'If-None-Match': etag})
+        assert revalidated.status_code == 304
+        assert revalidated.data == b''
+        # Different parameters are a different representation
+        assert client.get('/api/medicines?limit=3', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_bodies_serialized_once_per_version(self, client):
+        """Test that repeat requests are served from the body cache"""
+        from medical_ai_backend import body_cache
+
+        first = client.get('/api/medicines?fields=name,category&limit=5')
+        hits = body_cache.stats()['hits']
+        second = client.get('/api/medicines?fields=name,category&limit=5')
+        assert second.data == first.data
+        assert body_cache.stats()['hits'] == hits + 1
+
+    def test_etag_changes_with_knowledge_base(self, client, tmp_path, monkeypatch):
+        """Test that a reloaded catalog invalidates cached bodies and ETags"""
+        import medical_ai_backend
+        from medical_ai_backend import KnowledgeBaseReloader
+
+        path = tmp_path / 'catalog.json'
+        with open(knowledge_base.source, encoding='utf-8') as f:
+            catalog = json.load(f)
+        path.write_text(json.dumps(catalog), encoding='utf-8')
+        reloader = KnowledgeBaseReloader(str(path))
+        monkeypatch.setattr(medical_ai_backend, 'serving', reloader)
+
+        etag = client.get('/api/medicines').headers['ETag']
+        catalog['medicines']['aspirin']['category'] = 'Salicylate'
+        path.write_text(json.dumps(catalog), encoding='utf-8')
+        reloader.reload(wait=True)
+
+        response = client.get('/api/medicines', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert 'Salicylate' in response.data.decode('utf-8')
+
+    def test_reload_during_request_keeps_page_and_etag_consistent(self, client, tmp_path, monkeypatch):
+        """Test that a page built from one catalog is never cached under the next version"""
+        import medical_ai_backend
+        from medical_ai_backend import CatalogIndex, KnowledgeBaseReloader
+
+        path = tmp_path / 'catalog.json'
+        with open(knowledge_base.source, encoding='utf-8') as f:
+            catalog = json.load(f)
+        path.write_text(json.dumps(catalog), encoding='utf-8')
+        reloader = KnowledgeBaseReloader(str(path))
+        monkeypatch.setattr(medical_ai_backend, 'serving', reloader)
+        old_version = reloader.state.knowledge_base.version
+
+        catalog['medicines']['aspirin']['category'] = 'Salicylate'
+        path.write_text(json.dumps(catalog), encoding='utf-8')
+        entries = CatalogIndex.entries
+        def reload_then_list(index, *args):
+            monkeypatch.setattr(CatalogIndex, 'entries', entries)
+            reloader.reload(wait=True)
+            return entries(index, *args)
+        monkeypatch.setattr(CatalogIndex, 'entries', reload_then_list)
+
+        raced = client.get('/api/medicines?limit=1000')
+        assert raced.headers['ETag'].strip('"').startswith(old_version)
+        assert 'Salicylate' not in raced.data.decode('utf-8')
+        current = client.get('/api/medicines?limit=1000')
+        assert current.headers['ETag'] != raced.headers['ETag']
+        assert 'Salicylate' in current.data.decode('utf-8')
+
+    def test_general_info_and_general_answers(self, client):
+        """Test that the general answer is served statically and spliced into query results"""
+        response = client.get('/api/general-info')
+        assert response.status_code == 200
+        assert client.get('/api/general-info', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+        general = json.loads(response.data)['response']
+
+        result = client.post('/api/medical-query', data=json.dumps({'query': 'hello there'}),
+                             content_type='application/json')
+        data = json.loads(result.data)
+        assert data['response'] == general
+        assert data['analysis']['intent'] == 'general_medical'
+        assert 'timestamp' in data
+
+class TestJSONSerialization:
+    """Test the fast JSON layer and pre-encoded fragments"""
+
+    def test_backends_agree(self):
+        """Test that the fast encoder and the stdlib fallback encode the same documents"""
+        from medical_json import dumps, dumps_stdlib
+
+        data = {
+            'medicine': knowledge_base.medicines['paracetamol'],
+            'text': '⚠️ Take with food • 500mg',
+            'nested': [{'b': 1, 'a': 0.25}, None, True],
+            'empty': {}
+        }
+        assert json.loads(dumps(data)) == json.loads(dumps_stdlib(data))
+        assert json.loads(dumps(data))['medicine'] == knowledge_base.medicines['paracetamol'].to_dict()
+        # The fallback keeps jsonify's exact output
+        plain = json.loads(dumps(data))
+        assert dumps_stdlib(data) == json.dumps(plain, sort_keys=True, separators=(',', ':')).encode('ascii')
+
+    def test_pre_encoded_fragments_are_spliced(self):
+        """Test that pre-encoded values serialize exactly like the plain value"""
+        import pickle
+        from medical_json import PreEncoded, dumps, dumps_stdlib
+
+        fragment = PreEncoded({'text': 'Constant "quoted" text', 'items': [1, 2]})
+        data = {'first': fragment, 'second': [fragment], 'other': 'value'}
+        plain = {'first': fragment.value, 'second': [fragment.value], 'other': 'value'}
+        assert dumps(data) == dumps(plain)
+        assert dumps_stdlib(data) == dumps_stdlib(plain)
+        # Process-mode batches pickle results that hold fragments
+        assert dumps(pickle.loads(pickle.dumps(data))) == dumps(plain)
+        # A string spelling out the marker is encoded as text, not replaced
+        spoof = {'first': fragment, 'user': fragment._marker}
+        assert json.loads(dumps_stdlib(spoof)) == {'first': fragment.value, 'user': fragment._marker}
+
+    def test_routes_use_the_serialization_layer(self, client, monkeypatch):
+        """Test that responses decode the same with either encoder"""
+        import medical_json
+        from medical_ai_backend import STANDARD_DISCLAIMER
+
+        request_body = json.dumps({'queries': ['paracetamol dosage', 'what helps with headache']})
+        fast = client.post('/api/medical-query/batch', data=request_body, content_type='application/json')
+        monkeypatch.setattr(medical_json, 'dumps', medical_json.dumps_stdlib)
+        fallback = client.post('/api/medical-query/batch', data=request_body, content_type='application/json')
+
+        assert fast.data.endswith(b'\n') and fallback.data.endswith(b'\n')
+        assert fallback.data.isascii()
+        fast_results = json.loads(fast.data)['results']
+        assert fast_results == json.loads(fallback.data)['results']
+        assert fast_results[0]['response']['disclaimer'] == STANDARD_DISCLAIMER
+
+class TestASGIApp:
+    """Test the ASGI serving mode"""
+
+    @staticmethod
+    async def _request(asgi_app, method, path, body=b'', headers=(), query_string=b'', delay=0.0):
+        """Drive one HTTP request through an ASGI app, optionally with a slow client"""
+        import asyncio
+
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+        async def receive():
+            if delay:
+                await asyncio.sleep(delay)
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        response = {'body': b''}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = {name.decode(): value.decode() for name, value in message['headers']}
+            else:
+                response['body'] += message.get('body', b'')
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query_string,
+                 'headers': list(headers), 'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80)}
+        await asgi_app(scope, receive, send)
+        return response
+
+    def test_medical_query_matches_flask(self, client):
+        """Test that the async route answers exactly like the Flask route"""
+        import asyncio
+        from medical_ai_asgi import MedicalASGIApp
+
+        asgi_app = MedicalASGIApp(threads=2)
+        for query_text in ('What is paracetamol used for?', 'what helps with headache', 'I took an overdose', 'hello'):
+            body = json.dumps({'query': query_text}).encode('utf-8')
+            expected = json.loads(client.post('/api/medical-query', data=body, content_type='application/json').data)
+            response = asyncio.run(self._request(asgi_app, 'POST', '/api/medical-query', body))
+            assert response['status'] == 200
+            assert response['headers']['access-control-allow-origin'] == '*'
+            data = json.loads(response['body'])
+            del data['timestamp'], expected['timestamp']
+            assert data == expected
+
+        missing = asyncio.run(self._request(asgi_app, 'POST', '/api/medical-query', b'{}'))
+        assert missing['status'] == 400
+        invalid = asyncio.run(self._request(asgi_app, 'POST', '/api/medical-query', b'not json'))
+        assert invalid['status'] == 500
+        assert json.loads(invalid['body'])['response']['type'] == 'error'
+
+    def test_other_routes_run_the_flask_views(self):
+        """Test that delegated routes keep query strings, headers, ETags and CORS"""
+        import asyncio
+        from medical_ai_asgi import MedicalASGIApp
+
+        asgi_app = MedicalASGIApp(threads=2)
+        origin = [(b'origin', b'https://mediquick.example')]
+        page = asyncio.run(self._request(asgi_app, 'GET', '/api/medicines', headers=origin, query_string=b'limit=2'))
+        assert page['status'] == 200
+        assert json.loads(page['body'])['count'] == 2
+        assert page['headers']['access-control-allow-origin'] == 'https://mediquick.example'
+
+        etag = [(b'if-none-match', page['headers']['etag'].encode())]
+        assert asyncio.run(self._request(asgi_app, 'GET', '/api/medicines', headers=etag,
+                                         query_string=b'limit=2'))['status'] == 304
+
+        lines = asyncio.run(self._request(asgi_app, 'GET', '/api/medicines', query_string=b'format=jsonl&fields=name'))
+        assert [json.loads(line)['name'] for line in lines['body'].splitlines()] == list(knowledge_base.medicines)
+
+        batch = asyncio.run(self._request(asgi_app, 'POST', '/api/medical-query/batch',
+                                          json.dumps({'queries': ['aspirin dosage']}).encode(),
+                                          headers=[(b'content-type', b'application/json')]))
+        assert json.loads(batch['body'])['count'] == 1
+
+    def test_slow_clients_do_not_hold_threads(self):
+        """Test that many concurrent slow requests complete without a thread each"""
+        import asyncio
+        import time
+        from medical_ai_asgi import MedicalASGIApp
+
+        asgi_app = MedicalASGIApp(threads=2)
+        body = json.dumps({'query': 'ibuprofen side effects'}).encode('utf-8')
+
+        async def run_all():
+            requests = [self._request(asgi_app, 'POST', '/api/medical-query', body, delay=0.2) for _ in range(500)]
+            return await asyncio.gather(*requests)
+
+        start = time.perf_counter()
+        responses = asyncio.run(run_all())
+        # Sequentially, or with one thread per request on two threads, this would take 50+ seconds
+        assert time.perf_counter() - start < 10
+        assert {response['status'] for response in responses} == {200}
+
+class TestForwardRequest:
+    """Test serving the app from another WSGI app, as the Cloud Functions entry point does"""
+
+    @pytest.fixture
+    def runtime(self):
+        """Client for an outer Flask app passing every request to forward_request, like functions_framework"""
+        from flask import Flask, request
+        from medical_ai_backend import forward_request
+
+        runtime = Flask('functions_framework')
+        methods = ['GET', 'POST', 'OPTIONS']
+        runtime.add_url_rule('/', 'run', lambda: forward_request(request), methods=methods)
+        runtime.add_url_rule('/<path:path>', 'run_path', lambda path: forward_request(request), methods=methods)
+        return runtime.test_client()
+
+    def test_routes_answer_as_served_directly(self, client, runtime):
+        """Test that bodies, query strings, headers, ETags, streams and CORS reach the app intact"""
+        origin = {'Origin': 'https://mediquick.example'}
+        body = json.dumps({'query': 'What is paracetamol used for?'})
+        expected = json.loads(client.post('/api/medical-query', data=body, content_type='application/json').data)
+        response = runtime.post('/api/medical-query', data=body, content_type='application/json', headers=origin)
+        assert response.status_code == 200
+        assert response.headers['Access-Control-Allow-Origin'] == 'https://mediquick.example'
+        data = response.get_json()
+        del data['timestamp'], expected['timestamp']
+        assert data == expected
+
+        page = runtime.get('/api/medicines?limit=2')
+        assert page.get_json()['count'] == 2
+        assert runtime.get('/api/medicines?limit=2', headers={'If-None-Match': page.headers['ETag']}).status_code == 304
+        lines = runtime.get('/api/medicines?format=jsonl&fields=name').data.splitlines()
+        assert [json.loads(line)['name'] for line in lines] == list(knowledge_base.medicines)
+
+        preflight = runtime.options('/api/medical-query', headers=dict(origin, **{'Access-Control-Request-Method': 'POST'}))
+        assert preflight.headers['Access-Control-Allow-Origin'] == 'https://mediquick.example'
+
+    def test_errors_are_handled_by_the_app(self, runtime, monkeypatch):
+        """Test that missing routes and failing views get the app's responses with CORS headers"""
+        assert runtime.get('/api/unknown').status_code == 404
+        assert runtime.post('/api/medical-query', data='{}', content_type='application/json').status_code == 400
+
+        def fail():
+            raise RuntimeError('boom')
+
+        monkeypatch.setitem(app.view_functions, 'health_check', fail)
+        monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', False)
+        response = runtime.get('/api/health')
+        assert response.status_code == 500
+        assert response.headers['Access-Control-Allow-Origin'] == '*'
+
+class TestStreamingQuery:
+    """Test the JSON lines variant of /api/medical-query"""
+
+    @staticmethod
+    def _lines(body):
+        events = [json.loads(line) for line in body.splitlines()]
+        for event in events:
+            event.pop('timestamp', None)
+        return events
+
+    def test_analysis_then_sections_then_warnings_and_disclaimer(self, client):
+        """Test that the stream carries the same answer as the JSON response, section by section"""
+        from medical_ai_backend import response_sections
+
+        for query_text in ('aspirin dosage', 'I took an overdose', 'what helps with headache', 'hello'):
+            body = json.dumps({'query': query_text})
+            expected = json.loads(client.post('/api/medical-query', data=body, content_type='application/json').data)
+            response = client.post('/api/medical-query?format=jsonl', data=body, content_type='application/json')
+            assert response.status_code == 200
+            assert response.mimetype == 'application/x-ndjson'
+            events = self._lines(response.data)
+
+            assert events[0] == {'event': 'analysis', 'analysis': expected['analysis']}
+            sections = [event['text'] for event in events[1:-2]]
+            assert {event['event'] for event in events[1:-2]} == {'section'}
+            assert sections == response_sections(expected['response']['text'])
+            assert events[-2] == {'event': 'warnings', 'type': expected['response']['type'],
+                                  'confidence': expected['response']['confidence'],
+                                  'warnings': expected['response']['warnings']}
+            assert events[-1] == {'event': 'disclaimer', 'disclaimer': expected['response']['disclaimer']}
+
+        emergency = client.post('/api/medical-query?format=jsonl', data=json.dumps({'query': 'I took an overdose'}),
+                                content_type='application/json')
+        assert 'EMERGENCY' in self._lines(emergency.data)[1]['text']
+        assert client.post('/api/medical-query?format=jsonl', data='{}', content_type='application/json').status_code == 400
+
+    def test_response_sections(self):
+        """Test that sections split at blank lines without indentation"""
+        from medical_ai_backend import response_sections
+
+        assert response_sections('**Aspirin**\n\n**Uses:**\n• Pain\n\n⚠️ Note') == ['**Aspirin**', '**Uses:**\n• Pain', '⚠️ Note']
+        assert response_sections('\n        First line\n        \n        Second\n        ') == ['First line', 'Second']
+        assert response_sections('') == []
+
+    def test_failures_after_the_analysis_end_the_stream_with_an_error(self, client, monkeypatch):
+        """Test that an error generating the response is reported as the last line"""
+        from medical_ai_backend import response_generator
+
+        def fail(query):
+            raise RuntimeError('boom')
+
+        monkeypatch.setattr(response_generator, 'generate_response', fail)
+        events = self._lines(client.post('/api/medical-query?format=jsonl', data=json.dumps({'query': 'aspirin dosage'}),
+                                         content_type='application/json').data)
+        assert [event['event'] for event in events] == ['analysis', 'error']
+        assert events[1]['response']['type'] == 'error'
+
+    def test_asgi_stream_matches_flask(self, client):
+        """Test that the ASGI app streams the same lines, one body message each"""
+        import asyncio
+        from medical_ai_asgi import MedicalASGIApp
+
+        asgi_app = MedicalASGIApp(threads=2)
+        body = json.dumps({'query': 'metformin side effects'}).encode()
+        expected = client.post('/api/medical-query?format=jsonl', data=body, content_type='application/json').data
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/api/medical-query', 'query_string': b'format=jsonl',
+                 'headers': [], 'server': ('testserver', 80)}
+        asyncio.run(asgi_app(scope, receive, send))
+        assert messages[0]['status'] == 200
+        assert (b'content-type', b'application/x-ndjson') in messages[0]['headers']
+        chunks = [message['body'] for message in messages[1:] if message['body']]
+        assert len(chunks) == len(expected.splitlines())
+        assert self._lines(b''.join(chunks)) == self._lines(expected)
+
+        missing = asyncio.run(TestASGIApp._request(asgi_app, 'POST', '/api/medical-query', b'{}',
+                                                   query_string=b'format=jsonl'))
+        assert missing['status'] == 400
+
+class TestLLMFallback:
+    """Test the language model fallback against a local stub server"""
+
+    @pytest.fixture
+    def llm_stub(self, monkeypatch):
+        """Chat completions stub whose delay, status and answer tests can change"""
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        import medical_ai_backend
+        from medical_semantic_cache import SemanticCache
+
+        monkeypatch.setattr(medical_ai_backend, 'semantic_cache', SemanticCache(64))
+
+        stub = {'delay': 0.0, 'status': 200, 'answer': 'Tramadol is an opioid pain medicine.', 'requests': 0}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub['requests'] += 1
+                request_body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub['question'] = request_body['messages'][-1]['content']
+                time.sleep(stub['delay'])
+                body = json.dumps({'choices': [{'message': {'role': 'assistant', 'content': stub['answer']}}]}).encode()
+                try:
+                    self.send_response(stub['status'])
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up at its deadline
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+        stub['url'] = f'http://127.0.0.1:{server.server_port}/v1/chat/completions'
+        yield stub
+        server.shutdown()
+        server.server_close()
+
+    def test_unknown_questions_use_the_model(self, client, llm_stub, monkeypatch):
+        """Test that only questions the knowledge base cannot answer go upstream"""
+        import medical_ai_backend
+        from medical_llm import LLMClient
+
+        monkeypatch.setattr(medical_ai_backend, 'llm_client', LLMClient(llm_stub['url'], timeout=2.0))
+        response = client.post('/api/medical-query', data=json.dumps({'query': 'tell me about ozempic side effects'}),
+                               content_type='application/json')
+        data = json.loads(response.data)
+        assert data['response']['type'] == 'llm_answer'
+        assert data['response']['text'] == llm_stub['answer']
+        assert llm_stub['question'] == 'tell me about ozempic side effects'
+
+        import asyncio
+        from medical_ai_asgi import MedicalASGIApp
+
+        asgi_response = asyncio.run(TestASGIApp._request(MedicalASGIApp(threads=2), 'POST', '/api/medical-query',
+                                                         json.dumps({'query': 'what is xyzzol used for'}).encode()))
+        assert json.loads(asgi_response['body'])['response']['text'] == llm_stub['answer']
+
+        for query_text in ('paracetamol dosage', 'what helps with headache', 'I took an overdose'):
+            client.post('/api/medical-query', data=json.dumps({'query': query_text}), content_type='application/json')
+        assert llm_stub['requests'] == 2
+
+    def test_stream_sends_the_analysis_before_the_model_answers(self, llm_stub, monkeypatch):
+        """Test that a streamed answer starts before a slow model call finishes"""
+        import asyncio
+        import time
+        import medical_ai_backend
+        from medical_ai_asgi import MedicalASGIApp
+        from medical_llm import LLMClient
+
+        monkeypatch.setattr(medical_ai_backend, 'llm_client', LLMClient(llm_stub['url'], timeout=2.0))
+        llm_stub['delay'] = 0.3
+        received = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': json.dumps({'query': 'what is xyzzol used for'}).encode()}
+
+        async def send(message):
+            if message.get('body'):
+                received.append((time.perf_counter(), json.loads(message['body'])))
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/api/medical-query', 'query_string': b'format=jsonl',
+                 'headers': [], 'server': ('testserver', 80)}
+        start = time.perf_counter()
+        asyncio.run(MedicalASGIApp(threads=2)(scope, receive, send))
+        assert received[0][1]['event'] == 'analysis'
+        assert received[0][0] - start < 0.2
+        assert received[1][1] == {'event': 'section', 'text': llm_stub['answer']}
+        assert received[1][0] - start >= 0.3
+
+    def test_identical_questions_share_one_call(self, llm_stub):
+        """Test single-flight coalescing of concurrent identical questions"""
+        from concurrent.futures import ThreadPoolExecutor
+        from medical_llm import LLMClient
+
+        llm_stub['delay'] = 0.3
+        llm_client = LLMClient(llm_stub['url'], timeout=2.0, max_concurrent=10)
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            answers = list(executor.map(llm_client.ask, ['What is Ozempic?'] * 5 + ['what is  ozempic?'] * 5))
+        assert answers == [llm_stub['answer']] * 10
+        assert llm_stub['requests'] == 1
+        assert llm_client.status()['coalesced'] == 9
+
+    def test_waiting_threads_are_bounded(self, llm_stub):
+        """Test that callers beyond max_concurrent are refused instead of blocking"""
+        from concurrent.futures import ThreadPoolExecutor
+        from medical_llm import LLMClient
+
+        llm_stub['delay'] = 0.3
+        llm_client = LLMClient(llm_stub['url'], timeout=2.0, max_concurrent=2)
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            answers = list(executor.map(llm_client.ask, [f'question {i}' for i in range(6)]))
+        assert answers.count(llm_stub['answer']) == 2
+        assert answers.count(None) == 4
+        assert llm_client.status()['rejected'] == 4
+
+    def test_deadline_and_circuit_breaker(self, llm_stub):
+        """Test that slow upstreams are cut off, then skipped until they recover"""
+        import time
+        from medical_llm import CircuitBreaker, LLMClient
+
+        llm_stub['delay'] = 0.5
+        llm_client = LLMClient(llm_stub['url'], timeout=0.1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=1.0))
+        for question in ('first question', 'second question'):
+            start = time.perf_counter()
+            assert llm_client.ask(question) is None
+            assert time.perf_counter() - start < 0.4
+        time.sleep(0.1)  # the timed-out calls report to the breaker
+        assert llm_client.breaker.state == 'open'
+
+        start = time.perf_counter()
+        assert llm_client.ask('third question') is None
+        assert time.perf_counter() - start < 0.05
+        assert llm_stub['requests'] == 2
+        assert llm_client.status()['short_circuited'] == 1
+
+        # After the reset timeout one trial call goes through and closes the breaker
+        llm_stub['delay'] = 0.0
+        time.sleep(1.0)
+        assert llm_client.ask('fourth question') == llm_stub['answer']
+        assert llm_client.breaker.state == 'closed'
+
+    def test_failed_upstream_keeps_canned_answer(self, client, llm_stub, monkeypatch):
+        """Test that an erroring upstream falls back to the canned response"""
+        import medical_ai_backend
+        from medical_llm import LLMClient
+
+        llm_stub['status'] = 503
+        monkeypatch.setattr(medical_ai_backend, 'llm_client', LLMClient(llm_stub['url'], timeout=1.0))
+        response = client.post('/api/medical-query', data=json.dumps({'query': 'hello'}), content_type='application/json')
+        assert response.status_code == 200
+        assert json.loads(response.data)['response']['type'] == 'general'
+        assert client.get('/api/metrics').get_json()['llm_fallback']['failures'] == 1
+
+    def test_reworded_questions_reuse_answers(self, client, llm_stub, monkeypatch):
+        """Test that rewordings and typos of an answered question skip the upstream"""
+        import medical_ai_backend
+        from medical_llm import LLMClient
+
+        monkeypatch.setattr(medical_ai_backend, 'llm_client', LLMClient(llm_stub['url'], timeout=2.0))
+        for query_text in ('what are the side effects of ozempic', 'Ozempic side effects?',
+                           'side effects of ozempik please', 'what are the side effects of wegovy'):
+            response = client.post('/api/medical-query', data=json.dumps({'query': query_text}),
+                                   content_type='application/json')
+            assert json.loads(response.data)['response']['text'] == llm_stub['answer']
+        assert llm_stub['requests'] == 2
+        assert llm_stub['question'] == 'what are the side effects of wegovy'
+
+        stats = client.get('/api/metrics').get_json()['semantic_cache']
+        assert stats['hits'] == 2 and stats['similar_hits'] == 1 and stats['size'] == 2
+
+class TestSemanticCache:
+    """Test the similarity cache for language model answers"""
+
+    def test_paraphrases_and_typos_hit(self):
+        """Test that word order, function words and single typos still match"""
+        from medical_semantic_cache import SemanticCache
+
+        cache = SemanticCache(16)
+        cache.put('what are the side effects of ozempic', 'answer')
+        assert cache.get('side effects of ozempic') == 'answer'
+        assert cache.get('ozempic side effect') == 'answer'
+        assert cache.get('what are the side effects of ozempik') == 'answer'
+        assert cache.get('what is ozempic') is None
+        assert cache.stats()['similar_hits'] == 2
+
+    def test_rewordings_of_the_question_type_hit(self, monkeypatch):
+        """Test that rewordings sharing an answer scope hit despite different type keywords"""
+        import medical_ai_backend
+        from medical_ai_backend import SEMANTIC_CACHE_IGNORED_WORDS, cached_llm_answer, remember_llm_answer
+        from medical_semantic_cache import SemanticCache
+
+        monkeypatch.setattr(medical_ai_backend, 'semantic_cache', SemanticCache(64, ignored_words=SEMANTIC_CACHE_IGNORED_WORDS))
+        remember_llm_answer(query_processor.analyze_query("what's crocin for"), 'crocin uses')
+        remember_llm_answer(query_processor.analyze_query('ozempic side effects'), 'ozempic side effects')
+        assert cached_llm_answer(query_processor.analyze_query('crocin uses')) == 'crocin uses'
+        assert cached_llm_answer(query_processor.analyze_query('what does crocin treat')) == 'crocin uses'
+        assert cached_llm_answer(query_processor.analyze_query('does ozempic have side effects')) == 'ozempic side effects'
+        # Other drugs and other question types still miss
+        assert cached_llm_answer(query_processor.analyze_query('wegovy side effects')) is None
+        assert cached_llm_answer(query_processor.analyze_query('ozempic dosage')) is None
+
+    def test_different_terms_never_share(self):
+        """Test that questions naming other drugs or words miss despite high similarity"""
+        from medical_semantic_cache import SemanticCache, content_words, cosine_similarity, ngram_features
+
+        cache = SemanticCache(16, threshold=0.5)
+        long_question = 'side effects of prednisone when pregnant and breastfeeding'
+        cache.put(long_question, 'prednisone answer')
+        cache.put('what is cetirizine', 'cetirizine answer')
+        cache.put('dosage of tramadol', 'tramadol answer')
+        similar = long_question.replace('prednisone', 'prednisolone')
+        assert cosine_similarity(ngram_features(content_words(long_question)),
+                                 ngram_features(content_words(similar))) > 0.8
+        assert cache.get(similar) is None
+        assert cache.get('what is levocetirizine') is None
+        assert cache.get('dosage of toradol') is None
+        assert cache.get('dose of tramadol') is None
+
+    def test_scopes_are_separate(self):
+        """Test that an answer is only reused within the scope it was stored in"""
+        from medical_semantic_cache import SemanticCache
+
+        cache = SemanticCache(16)
+        cache.put('is ozempic safe', 'warnings', scope=('general_medical', None, 'warnings'))
+        assert cache.get('is ozempic safe', scope=('general_medical', None, 'dosage')) is None
+        assert cache.get('ozempic is safe?', scope=('general_medical', None, 'warnings')) == 'warnings'
+
+    def test_capacity_and_expiry(self):
+        """Test LRU eviction at maxsize and expiry after the TTL"""
+        import time
+        from medical_semantic_cache import SemanticCache
+
+        cache = SemanticCache(2)
+        cache.put('about ozempic', 1)
+        cache.put('about wegovy', 2)
+        assert cache.get('about ozempic') == 1
+        cache.put('about mounjaro', 3)
+        assert len(cache) == 2 and cache.stats()['evictions'] == 1
+        assert cache.get('about wegovy') is None
+        assert cache.get('about ozempik') == 1
+
+        cache = SemanticCache(4, ttl=0.05)
+        cache.put('about ozempic', 1)
+        time.sleep(0.1)
+        assert cache.get('about ozempic') is None
+        assert cache.stats()['expirations'] == 1 and len(cache) == 0
+
 class TestAPIEndpoints:
     """Test API endpoints"""
     
@@ -191,6 +1525,42 @@ class TestAPIEndpoints:
         assert data['status'] == 'healthy'
         assert 'timestamp' in data
     
+    def test_medicines_pagination(self, client):
+        """Test that following cursors visits every medicine exactly once"""
+        names, cursor = [], None
+        while True:
+            url = '/api/medicines?limit=4' + (f'&cursor={cursor}' if cursor else '')
+            data = json.loads(client.get(url).data)
+            assert data['total'] == len(knowledge_base.medicines)
+            names.extend(medicine['name'] for medicine in data['medicines'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        assert names == list(knowledge_base.medicines)
+
+    def test_medicines_fields_and_category(self, client):
+        """Test that projection returns only the requested fields within a category"""
+        response = client.get('/api/medicines?category=antihistamine%20(h1%20receptor%20antagonist)&fields=name,dosage')
+        data = json.loads(response.data)
+        assert data['total'] == 1
+        assert data['medicines'] == [{
+            'name': 'cetirizine',
+            'dosage': dict(knowledge_base.medicines['cetirizine']['dosage'])
+        }]
+
+    def test_medicines_jsonl_export(self, client):
+        """Test that the JSON lines export streams one medicine per line"""
+        response = client.get('/api/medicines?format=jsonl&fields=name,uses')
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        assert [line['name'] for line in lines] == list(knowledge_base.medicines)
+        assert lines[0]['uses'] == list(knowledge_base.medicines[lines[0]['name']]['uses'])
+
+    def test_medicines_invalid_parameters(self, client):
+        """Test that bad cursors, limits and fields are rejected"""
+        for query in ('cursor=bm90LWEta2V5', 'cursor=%%%', 'limit=0', 'limit=ten', 'fields=name,price'):
+            assert client.get(f'/api/medicines?{query}').status_code == 400
+
     def test_medicines_endpoint(self, client):
         """Test medicines list endpoint"""
         response = client.get('/api/medicines')
@@ -272,6 +1642,38 @@ class TestAPIEndpoints:
         data = json.loads(response.data)
         assert 'error' in data
 
+    def test_batch_endpoint_preserves_order(self, client):
+        """Test that batch results come back in request order"""
+        queries = ['What is paracetamol used for?', 'I took an overdose', 'Side effects of zyrtec']
+        response = client.post('/api/medical-query/batch',
+                             data=json.dumps({'queries': queries}),
+                             content_type='application/json')
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['count'] == 3
+        assert [result['analysis']['medicine'] for result in data['results']] == ['paracetamol', None, 'cetirizine']
+        assert data['results'][1]['response']['type'] == 'emergency'
+
+    def test_batch_endpoint_reports_item_errors(self, client):
+        """Test that invalid items fail individually without failing the batch"""
+        response = client.post('/api/medical-query/batch',
+                             data=json.dumps({'queries': ['What is aspirin used for?', '', 42]}),
+                             content_type='application/json')
+
+        assert response.status_code == 200
+        results = json.loads(response.data)['results']
+        assert 'response' in results[0]
+        assert results[1] == {'error': 'No query provided'}
+        assert results[2] == {'error': 'No query provided'}
+
+    def test_batch_endpoint_rejects_missing_queries(self, client):
+        """Test that a batch without a query list is rejected"""
+        response = client.post('/api/medical-query/batch',
+                             data=json.dumps({'query': 'What is aspirin used for?'}),
+                             content_type='application/json')
+        assert response.status_code == 400
+
 class TestSafetyFeatures:
     """Test safety and ethical features"""
     